@@ -1,5 +1,6 @@
 __all__ = [
-    'bc', 'runcfg', 'bcon', 'exprlib', 'options', 'cmaq', 'report', 'models'
+    'bc', 'runcfg', 'bcon', 'exprlib', 'options', 'cmaq', 'report', 'models',
+    'instrument', 'stats', 'manifest'
 ]
 
 import os
@@ -16,6 +17,9 @@ from . import options
 from . import cmaq
 from . import report
 from . import models
+from . import instrument
+from . import stats
+from . import manifest
 
 
 __doc__ = """
@@ -27,6 +31,11 @@ Contents
 * bcon : module with functions for making boundary condition files
 * cmaq : module for making files CMAQ ready
 * report : module with convenience functions for reporting
+* instrument : module with StageLog to record time, memory and I/O by stage
+* stats : module with one-pass, mergeable statistics (RunningStats)
+* manifest : module with atomic outputs and the run manifest used to resume
+* benchmarks : package that times bc stages on synthetic inputs (not
+  imported by default; python -m aqmbc.benchmarks)
 * defnpath : string path to all definition files available in examples.
 * runcfg : Function to run aqmbc from configuration files
 
@@ -112,13 +121,16 @@ def loadcfg(cfgobjs, cfgtype='path'):
         'common': {
             'overwrite': False, 'verbose': '0', 'PWD': os.getcwd(),
             'vgtop': '5000', 'vglvls': vglvlstxt, 'vinterp': 'linear',
-            'expressions': '[]', 'griddesc': 'GRIDDESC', 'minvalue': '1e-30'
+            'expressions': '[]', 'griddesc': 'GRIDDESC', 'minvalue': '1e-30',
+            'workers': '1', 'weightcache': '', 'mapdir': '', 'tchunk': '',
+            'exprengine': 'eval', 'stagecsv': '', 'manifest': '',
+            'perimeter': False
         },
         'REPORT': {
             'summaryspcs': '[]', 'vprofspcs': '[]', 'standardfigs': 'Y',
             'summary': 'bcon_summary.csv', 'vprofmean': 'bcon_mean.nc4',
             'vprofmin': 'bcon_min.nc4', 'vprofmax': 'bcon_max.nc4',
-            'debug': '0'
+            'cachedir': '', 'debug': '0'
         },
         'BCON': {
             'freq': 'd', 'output': 'BCON_%Y-%m-%d.nc', 'timeindependent': False
@@ -152,8 +164,144 @@ def loadcfg(cfgobjs, cfgtype='path'):
     return config
 
 
+_workermetafs = {}
+
+
+def _initworker(metafs, weightcache=None, exprcache=None):
+    """
+    Store metadata files in the worker process so that each task only needs
+    to send a short key instead of the full GRIDDESC-derived file. Also,
+    configure the vertical weights cache (see models.util.setweightcache)
+    and share parsed expressions (see exprlib.setexprcache).
+    """
+    _workermetafs.update(metafs)
+    models.util.setweightcache(weightcache)
+    exprlib.setexprcache(exprcache)
+
+
+def _bctask(label, metakey, opts):
+    """
+    Run bc for one date inside a worker (or in process) and return a status
+    record instead of raising so that one bad date does not stop the run.
+
+    Arguments
+    ---------
+    label : str
+        Label for reporting (e.g., BCON 2022-01-01)
+    metakey : str
+        Key of the metadata file (bcon or icon) stored by _initworker
+    opts : dict
+        Keyword arguments for bc (without metaf)
+
+    Returns
+    -------
+    result : dict
+        label, outpath, status (cached, ok or failed), message and stages
+        (records from instrument.StageLog)
+    """
+    outpath = opts['outpath']
+    result = dict(label=label, outpath=outpath, status='ok', message='')
+    if not opts['clobber'] and os.path.exists(outpath):
+        result['status'] = 'cached'
+    stagelog = instrument.StageLog(
+        verbose=opts.get('verbose', 1), label=label, inpath=opts['inpath'],
+        outpath=outpath
+    )
+    try:
+        out = bc(metaf=_workermetafs[metakey], stagelog=stagelog, **opts)
+        # workers run many dates; do not keep each output open
+        if out is not None:
+            out.close()
+    except Exception as e:
+        result['status'] = 'failed'
+        result['message'] = f'{type(e).__name__}: {e}'
+
+    result['stages'] = stagelog.records
+    return result
+
+
+def _runtasks(
+    tasks, metafs, workers=1, weightcache=None, exprcache=None, callback=None
+):
+    """
+    Arguments
+    ---------
+    tasks : list
+        List of (label, metakey, opts) tuples passed to _bctask
+    metafs : dict
+        Metadata files keyed by metakey
+    workers : int
+        Number of processes. If 1 or less, tasks are run in this process.
+    weightcache : str or None
+        Folder for vertical interpolation weights shared by all workers.
+    exprcache : dict or None
+        Parsed expressions shared by all workers (see exprlib.getexprcache)
+    callback : function or None
+        If provided, called with each result as it is collected (e.g., to
+        update the run manifest before later tasks finish).
+
+    Returns
+    -------
+    results : list
+        _bctask results in the same order as tasks
+    """
+    if callback is None:
+        def callback(result):
+            pass
+
+    if workers is None or workers <= 1 or len(tasks) <= 1:
+        _initworker(metafs, weightcache, exprcache)
+        results = []
+        for task in tasks:
+            results.append(_bctask(*task))
+            callback(results[-1])
+        return results
+
+    from concurrent.futures import ProcessPoolExecutor
+    workers = min(workers, len(tasks))
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_initworker,
+        initargs=(metafs, weightcache, exprcache)
+    ) as executor:
+        futures = [executor.submit(_bctask, *task) for task in tasks]
+        results = []
+        for task, future in zip(tasks, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # worker died (e.g., killed for memory)
+                results.append(dict(
+                    label=task[0], outpath=task[2]['outpath'],
+                    status='failed', message=f'{type(e).__name__}: {e}',
+                    stages=[]
+                ))
+            callback(results[-1])
+
+    return results
+
+
+def _taskconfig(metaf, opts):
+    """
+    Options of one bc task that define its output (see manifest.confighash):
+    the bc keywords, the content of the expressions and the metadata
+    (grid and levels). Paths and options that only change speed are skipped.
+    """
+    skip = (
+        'inpath', 'outpath', 'clobber', 'history', 'verbose', 'speedup',
+        'mapdir', 'tchunk', 'exprengine', 'perimeter'
+    )
+    taskconfig = {k: v for k, v in opts.items() if k not in skip}
+    taskconfig['exprpaths'] = exprlib.loadexprs(opts['exprpaths']).key
+    taskconfig['metaf'] = {
+        k: np.asarray(v).tolist() for k, v in metaf.getncatts().items()
+        if k not in ('CDATE', 'CTIME', 'WDATE', 'WTIME')
+    }
+    return taskconfig
+
+
 def runcfg(
-    cfgobjs, cfgtype='path', warningfilter='ignore', dryrun=False, speedup=None
+    cfgobjs, cfgtype='path', warningfilter='ignore', dryrun=False, speedup=None,
+    workers=None
 ):
     """
     Arguments
@@ -168,10 +316,29 @@ def runcfg(
         If True, return config after testing parsing.
     speedup : bool or None
         If True, use more memory but run faster. If None, heursitcally decide.
+    workers : int or None
+        Number of processes used to make BCON/ICON dates in parallel. If None,
+        use workers from the common section of the configuration (default 1).
 
     Returns
     -------
-    None
+    results : list
+        One record per date with label, outpath, status (cached, ok, failed),
+        message and stages. If any date failed, a RuntimeError is raised
+        after all dates have been attempted.
+
+    Notes
+    -----
+    If stagecsv is set in the common section, the stage records of all
+    dates (label, inpath, outpath, stage, chunk, wall, cpu, maxrss_delta,
+    read_bytes, write_bytes) are saved there as csv.
+
+    If manifest is set in the common section, a record of each output
+    (input fingerprint, config hash, output checksum and status; see
+    aqmbc.manifest) is saved there as each date finishes. On later runs, an
+    existing output is only reused if its record is current; outputs whose
+    inputs or options changed, or that were modified, are remade. Outputs
+    without a record are reused as before.
     """
     import json
     warnings.simplefilter(warningfilter)
@@ -188,6 +355,20 @@ def runcfg(
     bctimeindependent = config.get('BCON', 'timeindependent')
     overwrite = config.getboolean('common', 'overwrite')
     interpopt = config.get('common', 'vinterp')
+    if workers is None:
+        workers = config.getint('common', 'workers')
+    weightcache = config.get('common', 'weightcache').strip()
+    if weightcache == '':
+        weightcache = None
+    mapdir = config.get('common', 'mapdir').strip()
+    if mapdir == '':
+        mapdir = None
+    tchunk = config.get('common', 'tchunk').strip()
+    tchunk = None if tchunk == '' else int(tchunk)
+    exprengine = config.get('common', 'exprengine').strip()
+    perimeter = config.getboolean('common', 'perimeter')
+    stagecsv = config.get('common', 'stagecsv').strip()
+    manifestpath = config.get('common', 'manifest').strip()
 
     gdnam = config.get('common', 'gdnam')
     minvalue = eval(config.get('common', 'minvalue'))
@@ -213,31 +394,37 @@ def runcfg(
     if dryrun:
         return config
 
-    bmetaf = pnc.pncopen(
+    tmp = io.StringIO()
+    config.write(tmp)
+    tmp.seek(0, 0)
+    history = tmp.read()
+    # metadata files are built once and shared with workers at startup
+    metafs = {}
+    metafs['bcon'] = pnc.pncopen(
         config.get('common', 'GRIDDESC'),
         format='griddesc', GDNAM=gdnam, FTYPE=2,
         VGLVLS=vglvls, VGTOP=vgtop
     )
+    tasks = []
     for bdate in bdates:
         inpath = bdate.strftime(intmpl)
         outpath = bdate.strftime(bctmpl)
         outdir = os.path.dirname(outpath)
         os.makedirs(outdir, exist_ok=True)
         opts = dict(
-            inpath=inpath, outpath=outpath, metaf=bmetaf,
+            inpath=inpath, outpath=outpath,
             tslice=tslice, vmethod=interpopt,
             exprpaths=exprpaths, clobber=overwrite,
             dimkeys=dimkeys, format_kw=infmt, speedup=speedup,
-            minvalue=minvalue, timeindependent=bctimeindependent
+            minvalue=minvalue, timeindependent=bctimeindependent,
+            mapdir=mapdir, tchunk=tchunk, exprengine=exprengine,
+            perimeter=perimeter
         )
-        tmp = io.StringIO()
-        config.write(tmp)
-        tmp.seek(0, 0)
-        opts['history'] = tmp.read()
+        opts['history'] = history
         print(opts['history'])
-        bc(**opts)
+        tasks.append((f'BCON {bdate:%Y-%m-%dT%H}', 'bcon', opts))
 
-    imetaf = pnc.pncopen(
+    metafs['icon'] = pnc.pncopen(
         config.get('common', 'griddesc'),
         format='griddesc', GDNAM=gdnam, FTYPE=1,
         VGLVLS=vglvls, VGTOP=vgtop
@@ -250,15 +437,60 @@ def runcfg(
         outdir = os.path.dirname(outpath)
         os.makedirs(outdir, exist_ok=True)
         opts = dict(
-            inpath=inpath, outpath=outpath, metaf=imetaf,
+            inpath=inpath, outpath=outpath,
             tslice=tslice, vmethod=interpopt,
             exprpaths=exprpaths, clobber=overwrite,
             dimkeys=dimkeys, format_kw=infmt, speedup=speedup,
-            timeindependent=ictimeindependent
+            timeindependent=ictimeindependent, mapdir=mapdir,
+            exprengine=exprengine
         )
-
-        tmp = io.StringIO()
-        config.write(tmp)
-        tmp.seek(0, 0)
-        opts['history'] = tmp.read()
-        bc(**opts)
+        opts['history'] = history
+        tasks.append((f'ICON {idate:%Y-%m-%dT%H}', 'icon', opts))
+
+    # parse expressions once for all dates and workers
+    exprlib.loadexprs(exprpaths)
+    callback = None
+    if manifestpath != '':
+        records = manifest.readmanifest(manifestpath)
+        taskconfigs = {}
+        for label, metakey, opts in tasks:
+            outpath = opts['outpath']
+            taskconfig = _taskconfig(metafs[metakey], opts)
+            taskconfigs[outpath] = (opts['inpath'], taskconfig)
+            record = records.get(outpath)
+            if record is not None and not manifest.iscurrent(
+                record, opts['inpath'], taskconfig, outpath
+            ):
+                print(f'{label}: {outpath} is out of date; remaking')
+                opts['clobber'] = True
+
+        def updatemanifest(result):
+            inpath, taskconfig = taskconfigs[result['outpath']]
+            records[result['outpath']] = manifest.makerecord(
+                result['label'], inpath, taskconfig, result['outpath'],
+                result['status'], message=result['message'],
+                previous=records.get(result['outpath'])
+            )
+            manifest.writemanifest(manifestpath, records)
+
+        callback = updatemanifest
+
+    results = _runtasks(
+        tasks, metafs, workers=workers, weightcache=weightcache,
+        exprcache=exprlib.getexprcache(), callback=callback
+    )
+    print('Run summary:')
+    for result in results:
+        print('{label}: {status} {outpath} {message}'.format(**result))
+    if stagecsv != '':
+        stagedf = pd.DataFrame.from_records([
+            record for result in results for record in result['stages']
+        ])
+        stagedf.to_csv(stagecsv, index=False)
+        print(f'Stage records saved to {stagecsv}')
+    failed = [result['label'] for result in results
+              if result['status'] == 'failed']
+    if len(failed) > 0:
+        raise RuntimeError(f'{len(failed)} dates failed: {failed}')
+
+    return results
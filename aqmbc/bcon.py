@@ -2,10 +2,121 @@ import os
 import numpy as np
 import PseudoNetCDF as pnc
 import functools
+import itertools
 from collections import OrderedDict
+from .exprlib import loadexprs, compileexprpaths
+from .instrument import StageLog
+from .manifest import temppath
+from .stats import RunningStats, ProfileStats, writesidecar
 
+_cellmaps = {}
+_gridprops = (
+    'GDTYP', 'P_ALP', 'P_BET', 'P_GAM', 'XCENT', 'YCENT', 'XORIG', 'YORIG',
+    'XCELL', 'YCELL', 'NCOLS', 'NROWS', 'NTHIK'
+)
 
-def wndw(varfile, metaf, dimkeys, tslice, speedup=None, verbose=1):
+
+def cellmapkey(varfile, metaf, dimkeys):
+    """
+    Arguments
+    ---------
+    varfile : netcdf-like
+        input file
+    metaf : netcdf-like
+        file with longitude and latitude
+    dimkeys : dict
+        Dictionary mapping coordinates to ROW/COL.
+
+    Returns
+    -------
+    key : str
+        <GDNAM>_<FTYPE>_<hash> where hash is a fingerprint of the source grid
+        (horizontal coordinates and IOAPI grid properties) and of the target
+        longitude and latitude.
+    """
+    import hashlib
+    h = hashlib.sha1()
+    h.update(type(varfile).__name__.encode())
+    for f in (varfile, metaf):
+        for pk in _gridprops:
+            if pk in f.ncattrs():
+                h.update(f'{pk}={f.getncattr(pk)}'.encode())
+    for dk in ('COL', 'ROW'):
+        dimk = dimkeys[dk]
+        if dimk in varfile.dimensions:
+            h.update(f'{dimk}={len(varfile.dimensions[dimk])}'.encode())
+        if dimk in varfile.variables:
+            dimv = np.ma.getdata(varfile.variables[dimk][:])
+            h.update(np.ascontiguousarray(dimv, dtype='d'))
+    for vk in ('longitude', 'latitude'):
+        metav = np.ma.getdata(metaf.variables[vk][:])
+        h.update(np.ascontiguousarray(metav, dtype='d'))
+    gdnam = str(getattr(metaf, 'GDNAM', 'UNKNOWN')).strip()
+    ftype = getattr(metaf, 'FTYPE', 0)
+    return f'{gdnam}_{ftype}_{h.hexdigest()[:16]}'
+
+
+def getcellmap(varfile, metaf, dimkeys, mapdir=None, verbose=1):
+    """
+    Get the source i/j indices for each target cell. The mapping is computed
+    once per source grid and target grid (see cellmapkey) and reused from
+    memory or, if mapdir is provided, from <mapdir>/cellmap_<key>.npz.
+
+    Arguments
+    ---------
+    varfile : netcdf-like
+        input file
+    metaf : netcdf-like
+        file with longitude and latitude
+    dimkeys : dict
+        Dictionary mapping coordinates to ROW/COL.
+    mapdir : str or None
+        Folder to store and reuse cell maps between runs.
+    verbose : int
+        Level of verbosity
+
+    Returns
+    -------
+    i, j : arrays
+        i (lon or COL) and j (lat or ROW) with the shape of metaf longitude
+    """
+    lon = metaf.variables['longitude']
+    lat = metaf.variables['latitude']
+    key = cellmapkey(varfile, metaf, dimkeys)
+    if key in _cellmaps:
+        return _cellmaps[key]
+    mappath = None
+    if mapdir is not None:
+        mappath = os.path.join(mapdir, f'cellmap_{key}.npz')
+
+    if mappath is not None and os.path.exists(mappath):
+        if verbose > 0:
+            print(f'Using cell mapping {mappath}', flush=True)
+        with np.load(mappath) as mapf:
+            i = mapf['i']
+            j = mapf['j']
+    else:
+        i, j = varfile.ll2ij(
+            lon.ravel(), lat.ravel(), bounds='warn', clean='clip'
+        )
+        i = np.asarray(i).reshape(lon.shape)
+        j = np.asarray(j).reshape(lat.shape)
+        if mappath is not None:
+            if verbose > 0:
+                print(f'Saving cell mapping {mappath}', flush=True)
+            os.makedirs(mapdir, exist_ok=True)
+            tmppath = f'{mappath}.{os.getpid()}.tmp.npz'
+            np.savez(tmppath, i=i, j=j)
+            os.replace(tmppath, mappath)
+
+    _cellmaps[key] = i, j
+    return i, j
+
+
+def wndw(
+    varfile, metaf, dimkeys, tslice, speedup=None, verbose=1, mapdir=None,
+    perimeter=False
+):
     """
     Arguments
     ---------
@@ -13,6 +124,12 @@ def wndw(varfile, metaf, dimkeys, tslice, speedup=None, verbose=1):
         input file
     metafile : netcdf-like
         file with longitude and latitude
+    mapdir : str or None
+        Folder to store and reuse cell maps (see getcellmap)
+    perimeter : bool
+        If True, keep only the source cells used by metaf (see cellwndw)
+        instead of the rectangle that bounds them. varfile must have ROW and
+        COL dimensions.
 
     Returns
     -------
@@ -24,9 +141,7 @@ def wndw(varfile, metaf, dimkeys, tslice, speedup=None, verbose=1):
     lon = metaf.variables['longitude']
     lat = metaf.variables['latitude']
 
-    i, j = varfile.ll2ij(lon.ravel(), lat.ravel(), bounds='warn', clean='clip')
-    i = i.reshape(lon.shape)
-    j = j.reshape(lat.shape)
+    i, j = getcellmap(varfile, metaf, dimkeys, mapdir=mapdir, verbose=verbose)
     if verbose > 3:
         import pandas as pd
         dimstr = '_'.join(lon.dimensions)
@@ -43,6 +158,9 @@ def wndw(varfile, metaf, dimkeys, tslice, speedup=None, verbose=1):
         csvdf.index.name = 'ordinal'
         csvdf.to_csv(cellcsv)
 
+    if perimeter:
+        return cellwndw(varfile, i, j, dimkeys, tslice, verbose=verbose)
+
     # Create indices for windowed file
     # purely for speed
     imin, imax = i.min(), i.max()
@@ -57,8 +175,6 @@ def wndw(varfile, metaf, dimkeys, tslice, speedup=None, verbose=1):
         speedup = (ifrac < 0.5 or jfrac < 0.5)
     if speedup:
         # purely for speed, window the file
-        if verbose > 0:
-            print('window', flush=True)
         cslice = slice(imin, imax + 1)
         rslice = slice(jmin, jmax + 1)
         slices = {dimkeys['COL']: cslice, dimkeys['ROW']: rslice}
@@ -69,17 +185,195 @@ def wndw(varfile, metaf, dimkeys, tslice, speedup=None, verbose=1):
         jwndw = j - jmin
     else:
         if tslice is not None:
-            if verbose > 0:
-                print('window', flush=True)
             wndwf = varfile.slice(**{dimkeys['TSTEP']: tslice})
         else:
-            wndwf = varfile
+            tkey = dimkeys['TSTEP']
+            if tkey in varfile.dimensions:
+                # read once here; ijslice reads point-by-point
+                wndwf = varfile.slice(**{tkey: slice(None)})
+            else:
+                wndwf = varfile
         iwndw = i
         jwndw = j
 
     return wndwf, iwndw, jwndw
 
 
+def cellstrips(i, j, maxwaste=8., maxreads=None):
+    """
+    Group the unique source cells in i/j into rectangles (strips) that can
+    each be read with one slice.
+
+    Arguments
+    ---------
+    i, j : arrays
+        Source column and row of each target cell (see getcellmap)
+    maxwaste : float
+        A strip is extended to the next row (or a wider span of the same
+        row) only if it would hold no more than maxwaste cells per unique
+        cell.
+    maxreads : int or None
+        If provided, strips are then merged (the pair whose bounding
+        rectangle adds the fewest cells first) until there are no more than
+        maxreads.
+
+    Returns
+    -------
+    cells, inverse, strips : tuple
+        cells are unique (j, i) pairs (sorted by row, then column); inverse
+        is the position in cells of each target cell (shape of i); strips are
+        (rslice, cslice, cellidx) where cellidx are positions in cells.
+    """
+    pairs = np.stack([np.ravel(j), np.ravel(i)], axis=1)
+    cells, inverse = np.unique(pairs, axis=0, return_inverse=True)
+    inverse = inverse.reshape(np.shape(i))
+    # runs of adjacent columns in one row
+    runs = []
+    for ci, (cj, cc) in enumerate(cells):
+        if len(runs) > 0 and runs[-1][0] == cj and runs[-1][2] == cc:
+            runs[-1][2] = cc + 1
+            runs[-1][3].append(ci)
+        else:
+            runs.append([cj, cc, cc + 1, [ci]])
+    # strips are [row start, row end, col start, col end, cellidx]
+    strips = []
+    for rj, ri0, ri1, ridx in runs:
+        for strip in strips[::-1]:
+            if strip[1] not in (rj, rj + 1):
+                continue
+            si0 = min(strip[2], ri0)
+            si1 = max(strip[3], ri1)
+            ncell = (rj + 1 - strip[0]) * (si1 - si0)
+            if ncell <= maxwaste * (len(strip[4]) + len(ridx)):
+                strip[1:4] = rj + 1, si0, si1
+                strip[4].extend(ridx)
+                break
+        else:
+            strips.append([rj, rj + 1, ri0, ri1, list(ridx)])
+
+    def area(r0, r1, c0, c1, *args):
+        return (r1 - r0) * (c1 - c0)
+
+    while maxreads is not None and len(strips) > max(maxreads, 1):
+        best = None
+        for a in range(len(strips)):
+            for b in range(a + 1, len(strips)):
+                sa, sb = strips[a], strips[b]
+                box = [
+                    min(sa[0], sb[0]), max(sa[1], sb[1]),
+                    min(sa[2], sb[2]), max(sa[3], sb[3])
+                ]
+                added = area(*box) - area(*sa) - area(*sb)
+                if best is None or added < best[0]:
+                    best = (added, a, b, box)
+        added, a, b, box = best
+        merged = box + [strips[a][4] + strips[b][4]]
+        strips = [s for si, s in enumerate(strips) if si not in (a, b)]
+        strips.append(merged)
+
+    strips = [
+        (slice(r0, r1), slice(c0, c1), np.array(idx))
+        for r0, r1, c0, c1, idx in strips
+    ]
+    return cells, inverse, strips
+
+
+def cellwndw(
+    varfile, i, j, dimkeys, tslice=None, maxwaste=8., maxreads=1, verbose=1
+):
+    """
+    Keep only the unique source cells used by the target (e.g., BCON
+    perimeter). Each strip (see cellstrips) is windowed from varfile and the
+    cells are gathered along COL; ROW has one cell. Vertical interpolation
+    then scales with the number of unique cells instead of the area that
+    bounds them.
+
+    Each variable is read once per strip. In netCDF3 and contiguous netCDF4
+    files, reading part of a variable costs about as much as reading the
+    rectangle that bounds the perimeter, so strips are merged into one
+    window by default (maxreads=1) and as much is read as by wndw.
+
+    Arguments
+    ---------
+    varfile : netcdf-like
+        input file with ROW and COL dimensions (see dimkeys)
+    i, j : arrays
+        Source column and row of each target cell (see getcellmap)
+    dimkeys : dict
+        Dictionary mapping coordinates to ROW/COL/TSTEP.
+    tslice : slice or None
+        Optional time slice
+    maxwaste, maxreads : float, int or None
+        See cellstrips. Use more reads only if bytes read scale with the
+        cells requested (e.g., a remote OPeNDAP source).
+    verbose : int
+        Level of verbosity
+
+    Returns
+    -------
+    wndwf, iwndw, jwndw : tuple
+       wndwf has the unique cells along COL; variables with only ROW have
+       the value of the first cell.
+       iwndw are the indices for wndwf at metaf
+       jwndw are the indices for wndwf at metaf (all 0)
+    """
+    rkey = dimkeys['ROW']
+    ckey = dimkeys['COL']
+    tkey = dimkeys['TSTEP']
+    cells, inverse, strips = cellstrips(
+        i, j, maxwaste=maxwaste, maxreads=maxreads
+    )
+    ncell = cells.shape[0]
+    if verbose > 0:
+        print(f'Reading {ncell} cells in {len(strips)} strips', flush=True)
+    # gathered cells are in strip order; order puts them back in cells order
+    order = np.argsort(np.concatenate([idx for _, _, idx in strips]))
+
+    wndws = []
+    for rslice, cslice, sidx in strips:
+        slices = {rkey: rslice, ckey: cslice}
+        if tslice is not None and tkey in varfile.dimensions:
+            slices[tkey] = tslice
+        wndws.append(varfile.slice(verbose=verbose, **slices))
+
+    # in-memory file with the same type and metadata, but only one cell
+    wndwf = wndws[0].slice(**{rkey: slice(0, 1), ckey: slice(0, 1)})
+    wndwf.createDimension(ckey, ncell)
+    if 'NCOLS' in wndwf.ncattrs():
+        wndwf.NCOLS = ncell
+    for key, var in wndws[0].variables.items():
+        dims = var.dimensions
+        if rkey not in dims and ckey not in dims:
+            continue
+        if ckey in dims:
+            cax = dims.index(ckey)
+            parts = []
+            for (rslice, cslice, sidx), swndwf in zip(strips, wndws):
+                il = cells[sidx, 1] - cslice.start
+                vals = swndwf.variables[key][...]
+                if rkey in dims:
+                    rax = dims.index(rkey)
+                    jl = cells[sidx, 0] - rslice.start
+                    vals = np.moveaxis(vals, (rax, cax), (-2, -1))[..., jl, il]
+                else:
+                    vals = np.moveaxis(vals, cax, -1)[..., il]
+                parts.append(vals)
+            vals = np.ma.concatenate(parts, axis=-1)[..., order]
+            if rkey in dims:
+                vals = np.moveaxis(vals[..., None, :], (-2, -1), (rax, cax))
+            else:
+                vals = np.moveaxis(vals, -1, cax)
+        else:
+            rslice, cslice, sidx = strips[0]
+            jl = cells[sidx[:1], 0] - rslice.start
+            vals = np.take(var[...], jl, axis=dims.index(rkey))
+        outv = wndwf.copyVariable(var, key=key, withdata=False)
+        outv[...] = vals
+
+    jwndw = np.zeros_like(inverse)
+    return wndwf, inverse, jwndw
+
+
 def ijslice(infile, metaf, i, j, dimkeys, verbose=1):
     """
     Arguments
@@ -102,8 +396,6 @@ def ijslice(infile, metaf, i, j, dimkeys, verbose=1):
         Boundary or Initial Condition file matching horizontal coordinates of
         metaf supplied as input
     """
-    if verbose > 0:
-        print('slice', flush=True)
     if 'ROW' in metaf.dimensions:
         dims = ('ROW', 'COL')
     else:
@@ -114,7 +406,7 @@ def ijslice(infile, metaf, i, j, dimkeys, verbose=1):
     return bconf
 
 
-def kinterp(infile, metaf, vmethod, verbose=1):
+def kinterp(infile, metaf, vmethod, verbose=1, varkeys=None):
     """
     Arguments
     ---------
@@ -126,6 +418,9 @@ def kinterp(infile, metaf, vmethod, verbose=1):
         method for vertical inteprolation (conserve or linear)
     verbose : int
         Level of verbosity
+    varkeys : list or None
+        If provided and infile.interpSigma supports it, only varkeys are
+        interpolated (e.g., symbols in the expressions).
 
     Returns
     -------
@@ -152,17 +447,19 @@ def kinterp(infile, metaf, vmethod, verbose=1):
     if not lvinterp:
         bconvf = infile
     else:
-        if verbose > 0:
-            print('vint', flush=True)
+        kopts = {}
+        if varkeys is not None and _accepts(infile.interpSigma, 'varkeys'):
+            kopts['varkeys'] = varkeys
         bconvf = infile.interpSigma(vglvls=metaf.VGLVLS, vgtop=metaf.VGTOP,
-                                    verbose=verbose, interptype=vmethod)
+                                    verbose=verbose, interptype=vmethod,
+                                    **kopts)
         if not hasattr(bconvf, 'VGTYP'):
             bconvf.VGTYP = metaf.VGTYP
 
     return bconvf
 
 
-def translate(infile, exprpaths, verbose=1):
+def translate(infile, exprpaths, verbose=1, engine='eval', stream=False):
     """
     Arguments
     ---------
@@ -172,23 +469,40 @@ def translate(infile, exprpaths, verbose=1):
         paths to expr file
     verbose : int
         Level of verbosity
+    engine : str
+        'eval' uses infile.eval; 'compiled' uses exprlib.compileexpr, which
+        gives the same result with fewer temporary arrays.
+    stream : bool
+        If True, return (outf, values). With engine='compiled', outf has
+        only the variable definitions and values yields (key, variable) as
+        each is translated (see exprlib.compileexpr). Otherwise, values is
+        None and outf is complete.
 
     Returns
     -------
     outf : PseudoNetCDFFile
-        File output with speciation applied from exprpaths
+        File output with speciation applied from exprpaths (or outf, values
+        if stream)
     """
     # Translate species and/or units
+    values = None
     if len(exprpaths) == 0:
         outf = infile
     else:
-        if verbose > 0:
-            print('translate', flush=True)
-        exprstr = '\n'.join([
-            open(exprpath, 'r').read().strip() for exprpath in exprpaths
-        ])
-        outf = infile.eval(exprstr, inplace=False)
+        if engine == 'compiled':
+            func = compileexprpaths(exprpaths)
+            if stream:
+                outf, values = func(infile, stream=True)
+            else:
+                outf = func(infile)
+        elif engine == 'eval':
+            exprstr = loadexprs(exprpaths).text
+            outf = infile.eval(exprstr, inplace=False)
+        else:
+            raise KeyError(f'engine must be eval or compiled; got {engine}')
 
+    if stream:
+        return outf, values
     return outf
 
 
@@ -196,7 +510,9 @@ def bc(
     inpath, outpath, metaf,
     tslice=None, vmethod='conserve', exprpaths=None, clobber=False,
     dimkeys=None, format_kw=None, history='', speedup=None,
-    timeindependent=False, verbose=1, minvalue=None
+    timeindependent=False, verbose=1, minvalue=None, mapdir=None,
+    tchunk=None, exprengine='eval', stagelog=None, stagepath=None,
+    perimeter=False
 ):
     """
     Arguments
@@ -222,10 +538,32 @@ def bc(
         time-independent file.
     minvalue : scalar
         Passed to translate
+    mapdir : str or None
+        Folder to store and reuse horizontal cell maps (see getcellmap)
+    tchunk : int or None
+        If provided (and tslice is None), process tchunk times at a time and
+        append each chunk to outpath. Peak memory scales with tchunk instead
+        of the number of input times; the output is the same.
+    exprengine : str
+        Passed to translate as engine (eval or compiled). With compiled,
+        each species is written as soon as it is translated, so most of the
+        translate time is part of save (or append).
+    stagelog : instrument.StageLog or None
+        If provided, a record (wall, cpu, maxrss_delta, read_bytes and
+        write_bytes) is added for each stage: open, wndw, ijslice, kinterp,
+        translate, save, and (with tchunk) append and updatestats. If None,
+        a new StageLog is used.
+    stagepath : str or None
+        If provided, save stage records as csv (e.g., outpath + '.csv')
+    perimeter : bool
+        Passed to wndw. If True, only the source cells used by metaf (e.g.,
+        the BCON perimeter) are vertically interpolated (see cellwndw).
 
     Returns
     -------
-    None
+    out : netcdf-like or None
+        The saved output (open; the caller closes it) or None if outpath
+        was cached
 
     Notes
     -------
@@ -236,7 +574,6 @@ def bc(
         3. vertical interpolation
         4. species translation
     """
-    import symtable
     if format_kw is None:
         format_kw = dict(format='ioapi')
     if dimkeys is None:
@@ -248,85 +585,253 @@ def bc(
         return
     if verbose > 0:
         print('Converting', inpath, 'to', outpath)
+    if stagelog is None:
+        stagelog = StageLog(verbose=verbose, inpath=inpath, outpath=outpath)
+    with stagelog.stage('open'):
+        varfile, keepvars, dropvars = _bcopen(
+            inpath, format_kw, exprpaths, verbose=verbose
+        )
+
     if verbose > 0:
-        print('open', flush=True)
+        print('Keep', len(keepvars), keepvars)
+        print('Drop', len(dropvars), dropvars)
+
+    tslices = [tslice]
+    times = None
+    # statistics of each output variable merged across chunks
+    stats = {}
+    if tchunk is not None and tslice is None:
+        ntimes = len(varfile.dimensions[dimkeys['TSTEP']])
+        if ntimes > tchunk:
+            tslices = [
+                slice(t0, min(t0 + tchunk, ntimes))
+                for t0 in range(0, ntimes, tchunk)
+            ]
+            times = varfile.getTimes()
+
+    for ci, ctslice in enumerate(tslices):
+        if verbose > 0 and len(tslices) > 1:
+            print(f'chunk {ci + 1} of {len(tslices)}', flush=True)
+        wndwf, outf, values = _bcpipeline(
+            varfile, metaf, dimkeys, ctslice, vmethod=vmethod,
+            exprpaths=exprpaths, speedup=speedup, minvalue=minvalue,
+            mapdir=mapdir, exprengine=exprengine, verbose=verbose,
+            stagelog=stagelog, chunk=ci, perimeter=perimeter, stream=True
+        )
+        if ci == 0:
+            with stagelog.stage('save', chunk=ci):
+                out = _bcsave(
+                    wndwf, outf, inpath, outpath, metaf, dimkeys, exprpaths,
+                    history, timeindependent=timeindependent,
+                    verbose=verbose, times=times, stats=stats,
+                    commit=len(tslices) == 1, values=values
+                )
+        else:
+            with stagelog.stage('append', chunk=ci):
+                appendioapi(
+                    out, outf, ctslice.start, times, dimkeys,
+                    verbose=verbose, stats=stats, values=values
+                )
+
+    if len(tslices) > 1:
+        with stagelog.stage('updatestats'):
+            updatestats(out, verbose=verbose, stats=stats, outpath=outpath)
+
+    if stagepath is not None:
+        stagelog.to_csv(stagepath)
+
+    return out
+
+
+def _bcopen(inpath, format_kw, exprpaths, verbose=0):
+    """
+    Open inpath with only the variables used by exprpaths. See bc for
+    arguments.
+
+    Returns
+    -------
+    varfile, keepvars, dropvars : tuple
+        varfile is the opened input; keepvars and dropvars are the kept and
+        removed variables
+    """
+    varkeys = None
+    if exprpaths is not None and len(exprpaths) > 0:
+        varkeys = list(loadexprs(exprpaths).symbols)
+        reader = pnc.getreaderdict().get(format_kw.get('format'), None)
+        if _accepts(reader, 'varkeys'):
+            # reader only exposes variables used by the expressions
+            format_kw = dict(format_kw, varkeys=varkeys)
     infile = pnc.pncopen(inpath, **format_kw)
 
     dropvars = list(infile.variables)
-    if len(exprpaths) == 0:
+    if varkeys is None:
         varfile = infile
         keepvars = list(infile.variables)
     else:
-        exprstr = '\n'.join([
-            open(exprpath, 'r').read().strip() for exprpath in exprpaths
-        ])
-        stbl = symtable.symtable(exprstr, '<bcon>', 'exec')
-        keepvars = []
-        for sym in stbl.get_symbols():
-            symn = sym.get_name()
-            if symn in infile.variables:
-                keepvars.append(symn)
-        varfile = infile.subset(keepvars)
+        keepvars = [k for k in varkeys if k in infile.variables]
+        varfile = lazysubset(infile, keepvars, verbose=verbose)
 
     dropvars = [k for k in dropvars if k not in varfile.variables]
-    if verbose > 0:
-        print('Keep', len(keepvars), keepvars)
-        print('Drop', len(dropvars), dropvars)
+    return varfile, keepvars, dropvars
 
-    wndwf, i, j = wndw(
-        varfile, metaf, dimkeys, tslice,
-        speedup=speedup, verbose=verbose
-    )
 
+def _accepts(func, key):
+    """True if func (or class) has a key argument"""
+    import inspect
+    if func is None:
+        return False
     try:
-        checkk = [
-            k for k, v in wndwf.variables.items()
-            if (
-                k not in wndwf.dimensions
-                and k != 'TFLAG'
-                and len(v.shape) == 4
+        return key in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def lazysubset(infile, varkeys, verbose=0):
+    """
+    Like infile.subset(varkeys), but variables are not read. The variables
+    that are not in varkeys (or coordinates) are removed from infile.
+
+    Arguments
+    ---------
+    infile : netcdf-like
+        input file
+    varkeys : list
+        variables to keep
+    verbose : int
+        If > 0, report when infile cannot be subset in place.
+
+    Returns
+    -------
+    varfile : netcdf-like
+        infile with only varkeys and coordinates
+    """
+    try:
+        return infile.subsetVariables(list(varkeys), inplace=True)
+    except (AttributeError, KeyError, TypeError) as e:
+        # readers without subsetVariables or with read-only variables
+        if verbose > 0:
+            print(
+                f'Cannot subset {type(infile).__name__} in place'
+                f' ({type(e).__name__}: {e}); using subset', flush=True
             )
-        ][0]
-        inij = np.prod(wndwf.variables[checkk].shape[2:])
-        outij = metaf.variables['latitude'].size
-        kfirst = inij < outij
-    except Exception as e:
-        print(str(e), 'vertical interp first')
-        kfirst = True
+        return infile.subset(list(varkeys))
+
 
+def _bcpipeline(
+    varfile, metaf, dimkeys, tslice, vmethod='conserve', exprpaths=None,
+    speedup=None, minvalue=None, mapdir=None, exprengine='eval', verbose=1,
+    stagelog=None, chunk=0, perimeter=False, stream=False
+):
+    """
+    Window, horizontally extract, vertically interpolate, and translate
+    varfile for the times in tslice. See bc for arguments. Each step is
+    recorded in stagelog as a stage with chunk.
+
+    Returns
+    -------
+    wndwf, outf, values : tuple
+        wndwf is the windowed input and outf is the translated output. If
+        stream and the translation can be streamed (see translate), outf
+        has only the variable definitions and values yields (key, variable)
+        as each is translated; otherwise, values is None.
+    """
+    if stagelog is None:
+        stagelog = StageLog(verbose=verbose)
+    with stagelog.stage('wndw', chunk=chunk):
+        wndwf, i, j = wndw(
+            varfile, metaf, dimkeys, tslice,
+            speedup=speedup, verbose=verbose, mapdir=mapdir,
+            perimeter=perimeter
+        )
+
+    kfirst = _kfirst(wndwf, metaf)
+
+    varkeys = None
+    if exprpaths is not None and len(exprpaths) > 0:
+        varkeys = list(loadexprs(exprpaths).symbols)
     easyk = functools.partial(
-        kinterp, metaf=metaf, vmethod=vmethod, verbose=verbose
+        kinterp, metaf=metaf, vmethod=vmethod, verbose=verbose,
+        varkeys=varkeys
     )
     easyij = functools.partial(
         ijslice, metaf=metaf, i=i, j=j, dimkeys=dimkeys, verbose=verbose
     )
     easyx = functools.partial(
-        translate, exprpaths=exprpaths, verbose=verbose
+        translate, exprpaths=exprpaths, verbose=verbose, engine=exprengine,
+        stream=stream
     )
 
     if kfirst:
-        funcs = [easyk, easyij, easyx]
+        funcs = [('kinterp', easyk), ('ijslice', easyij)]
     else:
-        funcs = [easyij, easyk, easyx]
+        funcs = [('ijslice', easyij), ('kinterp', easyk)]
+    funcs.append(('translate', easyx))
 
     outf = wndwf
-    for func in funcs:
-        outf = func(outf)
+    values = None
+    for name, func in funcs:
+        with stagelog.stage(name, chunk=chunk):
+            outf = func(outf)
+            if name == 'translate' and stream:
+                outf, values = outf
 
     # Implement a minimum value
     if minvalue is not None:
-        for k in outf.variables:
-            if k not in ('TFLAG',):
-                v = outf.variables[k]
-                if v.dtype.char in ('f', 'd'):
-                    np.maximum(v, minvalue, out=v)
+        with stagelog.stage('minvalue', chunk=chunk):
+            for k in outf.variables:
+                _minvalue(k, outf.variables[k], minvalue)
+        if values is not None:
+            values = (
+                (k, _minvalue(k, v, minvalue)) for k, v in values
+            )
+
+    return wndwf, outf, values
+
 
+def _minvalue(key, var, minvalue):
+    """Set values of var (except TFLAG) below minvalue to minvalue"""
+    if key not in ('TFLAG',) and var.dtype.char in ('f', 'd'):
+        np.maximum(var, minvalue, out=var)
+    return var
+
+
+def _kfirst(wndwf, metaf):
+    """
+    Returns True if vertical interpolation should come before horizontal
+    extraction (i.e., wndwf has fewer columns than metaf).
+    """
+    try:
+        checkk = [
+            k for k, v in wndwf.variables.items()
+            if (
+                k not in wndwf.dimensions
+                and k != 'TFLAG'
+                and len(v.shape) == 4
+            )
+        ][0]
+        inij = np.prod(wndwf.variables[checkk].shape[2:])
+        outij = metaf.variables['latitude'].size
+        kfirst = inij < outij
+    except Exception as e:
+        print(str(e), 'vertical interp first')
+        kfirst = True
+
+    return kfirst
+
+
+def _bcsave(
+    wndwf, outf, inpath, outpath, metaf, dimkeys, exprpaths, history,
+    timeindependent=False, verbose=1, times=None, stats=None, commit=True,
+    values=None
+):
+    """
+    Add FILEDESC, description, and HISTORY to outf and save with saveioapi.
+    See bc for arguments.
+    """
     if exprpaths is None:
         outf.FILEDESC = 'Boundary conditions from {}'.format(inpath)
     else:
-        exprstr = ''.join([
-            open(exprpath, 'r').read() for exprpath in exprpaths
-        ])
+        exprstr = loadexprs(exprpaths).rawtext
         outf.FILEDESC = (
             'Boundary conditions from '
             + '{}\nwith definitions {}:'.format(inpath, exprpaths)
@@ -338,12 +843,14 @@ def bc(
     setattr(outf, 'HISTORY', history)
     return saveioapi(
         wndwf, outf, outpath, metaf, dimkeys,
-        timeindependent=timeindependent, verbose=verbose
+        timeindependent=timeindependent, verbose=verbose, times=times,
+        stats=stats, commit=commit, values=values
     )
 
 
 def saveioapi(
-    inf, outf, outpath, metaf, dimkeys, timeindependent=False, verbose=1
+    inf, outf, outpath, metaf, dimkeys, timeindependent=False, verbose=1,
+    times=None, stats=None, commit=True, values=None
 ):
     """
     Parameters
@@ -359,11 +866,36 @@ def saveioapi(
     timeindependent : bool
         If True and number of times is 1, the file will be stored as IOAPI
         time-independent
+    times : array-like or None
+        If None, use inf.getTimes(). Otherwise, times of the complete output
+        when outf has only the first times (see appendioapi).
+    stats : dict or None
+        If provided, filled with the statistics of each output variable
+        (see varstats) so that appendioapi and updatestats can merge later
+        times.
+    commit : bool
+        If True, outpath is complete when saveioapi returns. If False, the
+        output stays at a temporary path until updatestats (see appendioapi)
+        moves it to outpath.
+    values : iterable or None
+        If provided, yields (key, values) for the variables of outf in any
+        order (e.g., as each is translated; see translate with stream), and
+        outf only defines the variables.
 
     Results
     -------
     out : netcdf-like file
         file that was output
+
+    Notes
+    -----
+    The header is defined first (see _defineioapi), then each variable is
+    written once and released, so only one variable is copied at a time.
+    Statistics of each variable (count, mean, std, min, max and median) are
+    computed as it is written and stored as actual_* attributes. The
+    mergeable statistics, including a quantile sketch and the layer profile,
+    are saved in a sidecar (see stats.writesidecar). The file is written to
+    a temporary path and renamed, so outpath is never partial.
     """
     from datetime import timedelta
     # Prepare metadata
@@ -386,15 +918,13 @@ def saveioapi(
         )
     ]
 
+    if stats is None:
+        stats = {}
     for ok in outkeys:
         outv = outf.variables[ok]
         outv.long_name = ok.ljust(16)
         outv.var_desc = ok.ljust(80)
         outv.units = outv.units.ljust(16)
-        outv.actual_range = np.array([
-            outv.min(), outv.max()
-        ], dtype=outv.dtype)
-        outv.actual_median = np.median(outv)
 
     extrakeys = set(list(outf.variables)).difference(outkeys + ['TFLAG'])
     for ek in extrakeys:
@@ -416,7 +946,10 @@ def saveioapi(
         if dk not in outdims + ('VAR', 'DATE-TIME'):
             del outf.dimensions[dk]
     # Get the actual times of the data
-    time = inf.getTimes()
+    if times is None:
+        time = inf.getTimes()
+    else:
+        time = times
     p1h = timedelta(hours=1)
     if len(time) > 1:
         dt = np.diff(time).mean()
@@ -439,38 +972,298 @@ def saveioapi(
         if dth == 0:
             tflag[:, :, :] = 0
         else:
-            otime = time[0] + timedelta(hours=dth) * np.arange(len(time))
-            JDATE = np.array([t.strftime('%Y%j') for t in otime], dtype='i')
-            ITIME = np.array([t.strftime('%H%M%S') for t in otime], dtype='i')
-            tflag[:, :, 0] = JDATE[:, None]
-            tflag[:, :, 1] = ITIME[:, None]
+            tflag[:] = _tflagvalues(time, dth, tflag.shape)
         if isinstance(outf.variables, OrderedDict):
             outf.variables.move_to_end('TFLAG', last=False)
 
     outf.SDATE = int(time[0].strftime('%Y%j'))
     outf.STIME = int(time[0].strftime('%H%M%S'))
     # Save to outpath
-    if verbose > 0:
-        print('save', flush=True)
 
+    if times is None:
+        nt = len(outf.dimensions['TSTEP'])
+    else:
+        nt = len(times)
     gigs = (
-        np.prod([len(outf.dimensions[dk]) for dk in outdims]) *
-        outf.NVARS * 4 / 1024**3
+        np.prod([len(outf.dimensions[dk]) for dk in outdims[1:]]) *
+        nt * outf.NVARS * 4 / 1024**3
     )
     if gigs > 2:
         outformat = 'NETCDF3_64BIT_OFFSET'
     else:
         outformat = 'NETCDF3_CLASSIC'
 
-    wverbose = max(verbose - 1, 0)
-    out = outf.save(outpath, format=outformat, verbose=wverbose, outmode='w')
+    out = _defineioapi(outf, temppath(outpath), outformat, statkeys=outkeys)
+    if values is None:
+        values = _popvalues(outf, list(outf.variables))
+    else:
+        values = itertools.chain(_popvalues(outf, ['TFLAG']), values)
+    for key, vals in values:
+        if key not in out.variables:
+            # e.g., an intermediate that is not in outkeys
+            continue
+        if verbose > 1:
+            print('Writing', key, flush=True)
+        vals = vals[...]
+        outv = out.variables[key]
+        if key in outkeys:
+            stats[key] = varstats(vals, outv.units.strip())
+        if isinstance(vals, np.ma.MaskedArray):
+            vals = vals.filled(getattr(outv, '_FillValue', -9999))
+        outv[:] = vals
+        del vals
+    for key in outkeys:
+        _setstatsattrs(out.variables[key], stats[key])
 
-    if verbose > 0:
-        print('done', flush=True)
+    out.sync()
+    if commit:
+        _commitioapi(out, outpath, stats)
 
     return out
 
 
+def _defineioapi(outf, path, format, statkeys=()):
+    """
+    Create path with the dimensions, attributes and variables of outf
+    (like outf.save), but do not write values. TSTEP is always unlimited
+    (as in IOAPI), so appendioapi can add times and defining each variable
+    does not move the (empty) data of the others. Variables in statkeys get
+    placeholder actual_* attributes (see _setstatsattrs) so that the header
+    size is fixed and values are not moved when statistics are set.
+    Prefilling is turned off because every value is written.
+
+    Returns
+    -------
+    out : netCDF4.Dataset
+        Open file ready for values
+    """
+    import re
+    import netCDF4 as nc
+    private = re.compile(r'^_\w*(__\w*)?')
+    out = nc.Dataset(path, mode='w', format=format)
+    out.set_fill_off()
+    for dk, dim in outf.dimensions.items():
+        if dim.isunlimited() or dk == 'TSTEP':
+            out.createDimension(dk, None)
+        else:
+            out.createDimension(dk, len(dim))
+    out.setncatts({
+        pk: getattr(outf, pk) for pk in outf.ncattrs()
+        if private.match(pk) is None
+    })
+    for key, var in outf.variables.items():
+        fill_value = None
+        for fk in ['missing_value', 'fill_value', '_FillValue']:
+            if hasattr(var, fk):
+                fill_value = getattr(var, fk)
+                break
+        outv = out.createVariable(
+            key, var.dtype.char, var.dimensions, fill_value=fill_value
+        )
+        outv.setncatts({
+            pk: getattr(var, pk) for pk in var.ncattrs()
+            if private.match(pk) is None
+        })
+        if key in statkeys:
+            _setstatsattrs(outv, None)
+    out.sync()
+    return out
+
+
+def _popvalues(outf, keys):
+    """Yield (key, values) for keys, removing each from outf once used"""
+    for key in keys:
+        vals = outf.variables[key][...]
+        yield key, vals
+        # release each variable once written
+        del outf.variables[key], vals
+
+
+def _commitioapi(out, outpath, stats):
+    """
+    Sync out, move it from its temporary path to outpath and write the
+    sidecar (see stats.writesidecar). out remains open.
+    """
+    out.sync()
+    if out.filepath() != outpath:
+        os.replace(out.filepath(), outpath)
+    writesidecar(outpath, stats)
+
+
+def varstats(vals, units):
+    """
+    Arguments
+    ---------
+    vals : array-like
+        Values with dimensions (TSTEP, LAY, ...)
+    units : str
+        Units of vals
+
+    Returns
+    -------
+    record : dict
+        units, stats (stats.RunningStats) and profile (stats.ProfileStats
+        for LAY) as used by stats.writesidecar
+    """
+    return dict(
+        units=units, stats=RunningStats().update(vals),
+        profile=ProfileStats(axis=1).update(vals)
+    )
+
+
+def _setstatsattrs(outv, record):
+    """
+    Set actual_range, actual_median, actual_mean and actual_std (dtype of
+    outv) and actual_count (float64) from record (see varstats). If record
+    is None, zeros are set as placeholders.
+    Attribute types and sizes do not depend on the values, so the header
+    size does not change when they are updated (see updatestats).
+    """
+    vtype = np.dtype(outv.dtype).type
+    if record is None:
+        vmin = vmax = vmedian = vmean = vstd = vcount = 0
+    else:
+        rstats = record['stats']
+        vmin, vmax = rstats.min, rstats.max
+        vmedian, vmean, vstd = rstats.median, rstats.mean, rstats.std
+        vcount = rstats.count
+    outv.actual_range = np.array([vmin, vmax], dtype=outv.dtype)
+    outv.actual_median = vtype(vmedian)
+    outv.actual_mean = vtype(vmean)
+    outv.actual_std = vtype(vstd)
+    outv.actual_count = np.float64(vcount)
+
+
+def _tflagvalues(time, dth, shape, start=0):
+    """
+    Arguments
+    ---------
+    time : array-like
+        All times in the output
+    dth : int
+        Output time step in hours
+    shape : tuple
+        TFLAG shape (TSTEP, VAR, DATE-TIME)
+    start : int
+        Index of the first time step
+
+    Returns
+    -------
+    tflag : array
+        TFLAG values for times start to start + shape[0]
+    """
+    from datetime import timedelta
+    otime = time[0] + timedelta(hours=int(dth)) * np.arange(len(time))
+    otime = otime[start:start + shape[0]]
+    JDATE = np.array([t.strftime('%Y%j') for t in otime], dtype='i')
+    ITIME = np.array([t.strftime('%H%M%S') for t in otime], dtype='i')
+    tflag = np.zeros(shape, dtype='i')
+    tflag[:, :, 0] = JDATE[:, None]
+    tflag[:, :, 1] = ITIME[:, None]
+    return tflag
+
+
+def appendioapi(
+    out, outf, start, times, dimkeys, verbose=1, stats=None, values=None
+):
+    """
+    Write the times in outf to an open IOAPI file (out) created by saveioapi.
+
+    Parameters
+    ----------
+    out : netCDF4.Dataset
+        File returned by saveioapi
+    outf : netcdf-like file
+        file with more times for output
+    start : int
+        Index of the first time in outf within out
+    times : array-like
+        All times in out (as passed to saveioapi)
+    dimkeys : dict
+        translation dictionary for dimensions
+    stats : dict or None
+        If provided (see saveioapi), statistics of outf are merged into it.
+    values : iterable or None
+        If provided, yields (key, values) for the variables of outf (see
+        saveioapi).
+
+    Returns
+    -------
+    None
+    """
+    for outdk, indk in dimkeys.items():
+        if outdk not in outf.dimensions:
+            if indk in outf.dimensions:
+                outf.renameDimension(indk, outdk, inplace=True)
+
+    nt = len(outf.dimensions['TSTEP'])
+    tslice = slice(start, start + nt)
+    if values is None:
+        values = [
+            (key, outf.variables[key]) for key in out.variables
+            if key in outf.variables
+        ]
+    written = set()
+    for key, vals in values:
+        if key not in out.variables:
+            continue
+        vals = vals[:]
+        out.variables[key][tslice] = vals
+        written.add(key)
+        if stats is not None and key in stats:
+            newstats = varstats(vals, stats[key]['units'])
+            stats[key]['stats'].merge(newstats['stats'])
+            stats[key]['profile'].merge(newstats['profile'])
+        del vals
+    if 'TFLAG' in out.variables and 'TFLAG' not in written:
+        outv = out.variables['TFLAG']
+        dth = out.TSTEP // 10000
+        tflagshape = (nt,) + outv.shape[1:]
+        outv[tslice] = _tflagvalues(times, dth, tflagshape, start=start)
+    out.sync()
+
+
+def updatestats(out, verbose=1, stats=None, outpath=None):
+    """
+    Update actual_* attributes and the sidecar (see saveioapi) so that they
+    describe all data in out. Used after appendioapi.
+
+    Parameters
+    ----------
+    out : netCDF4.Dataset
+        Open (writeable) IOAPI file
+    stats : dict or None
+        Statistics merged by appendioapi. If None, statistics are calculated
+        from data in out, one time at a time.
+    outpath : str or None
+        If out was saved with commit=False (see saveioapi), the final path
+        to move it to. If None, out stays where it is.
+
+    Returns
+    -------
+    None
+    """
+    if stats is None:
+        stats = {}
+        for key, outv in out.variables.items():
+            if 'actual_range' not in outv.ncattrs():
+                continue
+            record = None
+            for ti in range(outv.shape[0]):
+                trecord = varstats(outv[ti:ti + 1], outv.units.strip())
+                if record is None:
+                    record = trecord
+                else:
+                    record['stats'].merge(trecord['stats'])
+                    record['profile'].merge(trecord['profile'])
+            stats[key] = record
+    for key, record in stats.items():
+        _setstatsattrs(out.variables[key], record)
+    if outpath is None:
+        outpath = out.filepath()
+    _commitioapi(out, outpath, stats)
+
+
 def formatparser(fmtstr):
     """
     Parameters
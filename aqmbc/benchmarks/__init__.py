@@ -0,0 +1,21 @@
+__all__ = ['run', 'sources', 'stages', 'synthetic', 'runner']
+__doc__ = """
+Benchmarks for aqmbc without network data
+
+Contents
+========
+
+* synthetic : module with generators for GEOS-Chem-like, WACCM-like, TCR-like
+  and CMAQ IOAPI inputs at configurable sizes.
+* runner : module that times each stage of bc on synthetic inputs.
+* run : function that returns (and optionally saves) results as JSON.
+
+Example
+=======
+
+python -m aqmbc.benchmarks --source waccm --size nlon=288 nlat=192 -o out.json
+"""
+
+from . import synthetic
+from . import runner
+from .runner import run, sources, stages
@@ -0,0 +1,67 @@
+if __name__ == '__main__':
+    import argparse
+    import contextlib
+    import json
+    import sys
+    from .runner import run, sources
+
+    parser = argparse.ArgumentParser(
+        prog='python -m aqmbc.benchmarks',
+        description=(
+            'Time bc stages (open, wndw, ijslice, kinterp, translate,'
+            + ' saveioapi), cmaqready and makestats on synthetic inputs.'
+        ),
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '-s', '--source', default=[], action='append',
+        choices=sorted(sources), help='Source(s) to time; default all'
+    )
+    parser.add_argument('-g', '--gdnam', default='36US3')
+    parser.add_argument('-b', '--bctype', default='bcon')
+    parser.add_argument('--vgnam', default='EPA_35L')
+    parser.add_argument('-r', '--repeat', default=3, type=int)
+    parser.add_argument(
+        '--size', default=[], nargs='*',
+        help='Generator keywords as key=value (e.g., nlon=144 nlat=96)'
+    )
+    parser.add_argument('--exprengine', default='eval')
+    parser.add_argument(
+        '-w', '--workdir', default=None,
+        help='Keep inputs and outputs here; default is a temporary folder'
+    )
+    parser.add_argument('-v', '--verbose', default=0, action='count')
+    parser.add_argument(
+        '-o', '--outpath', default=None,
+        help='Save results as JSON; default prints to stdout'
+    )
+    parser.epilog = """
+Example
+    $ python -m aqmbc.benchmarks -s geoschem -s waccm -o v0.4.2.json
+"""
+
+    args = parser.parse_args()
+    size = {}
+    for kv in args.size:
+        k, v = kv.split('=', 1)
+        size[k] = v if k == 'date' else int(v)
+
+    results = []
+    # progress and expression messages go to stderr; stdout is only JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        for source in args.source or sorted(sources):
+            workdir = args.workdir
+            if workdir is not None:
+                workdir = f'{workdir}/{source}'
+            results.append(run(
+                source=source, gdnam=args.gdnam, bctype=args.bctype,
+                vgnam=args.vgnam, size=size, repeat=args.repeat,
+                workdir=workdir, exprengine=args.exprengine,
+                verbose=args.verbose
+            ))
+
+    if args.outpath is None:
+        print(json.dumps(results, indent=2))
+    else:
+        with open(args.outpath, 'w') as outf:
+            json.dump(results, outf, indent=2)
@@ -0,0 +1,255 @@
+__all__ = ['run', 'sources', 'stages']
+__doc__ = """
+Time each bc stage (open, wndw, ijslice, kinterp, translate, saveioapi) and
+the post-processing (cmaqready, makestats) on synthetic inputs. Results are
+JSON-serializable so they can be saved and compared across versions.
+"""
+import os
+from collections import OrderedDict
+from . import synthetic
+from ..instrument import StageLog
+
+stages = (
+    'open', 'wndw', 'ijslice', 'kinterp', 'translate', 'saveioapi',
+    'cmaqready', 'makestats'
+)
+
+# generator, reader format, dimkeys, expressions, vmethod, and suffix
+sources = {
+    'geoschem': dict(
+        generator='geoschem', format='gcnc', dims='gc', vmethod='linear',
+        exprs=(
+            'gc', ['gcnc_airmolden.expr', 'gc14_to_cb6r5.expr',
+                   'gc14_to_cb6mp.expr', 'gc14_to_ae7.expr']
+        ), suffix='.nc'
+    ),
+    'waccm': dict(
+        generator='waccm', format='waccm', dims='waccm', vmethod='conserve',
+        exprs=(
+            'waccm', ['waccm_met.expr', 'waccm_cb6.expr', 'waccm_ae7.expr']
+        ), suffix='.nc'
+    ),
+    'tcr': dict(
+        generator='tcr', format='tcr', dims='tcr', vmethod='conserve',
+        exprs=('tcr', ['tcr_cb6.expr', 'tcr_ae7.expr']), suffix='.txt'
+    ),
+    'cmaq': dict(
+        generator='ioapi', format='ioapi', dims=None, vmethod='conserve',
+        exprs=None, suffix='.nc'
+    ),
+}
+
+
+def _versions():
+    import sys
+    import numpy as np
+    import PseudoNetCDF as pnc
+    from .. import __version__
+    return OrderedDict([
+        ('aqmbc', __version__), ('PseudoNetCDF', pnc.__version__),
+        ('numpy', np.__version__), ('python', sys.version.split()[0]),
+    ])
+
+
+def _nbytes(path):
+    """Size of path or, for a path list (tcr), of the files it lists."""
+    if path.endswith('.txt'):
+        return sum([
+            os.path.getsize(p) for p in open(path, 'r').read().split()
+        ])
+    return os.path.getsize(path)
+
+
+def _shiftdays(inpath, outpath, days):
+    """
+    Copy an IOAPI file and shift TFLAG and SDATE by days. The statistics
+    sidecar (see stats.writesidecar) is rewritten for the copy so that
+    makestats reads it as it does for bc outputs.
+    """
+    import shutil
+    import netCDF4
+    import pandas as pd
+    from ..stats import readsidecar, writesidecar
+
+    records = readsidecar(inpath)
+    shutil.copyfile(inpath, outpath)
+    with netCDF4.Dataset(outpath, 'r+') as ncf:
+        tflag = ncf.variables['TFLAG']
+        jdays = tflag[:, :, 0]
+        dates = pd.to_datetime(
+            jdays.ravel().astype('i').astype(str), format='%Y%j'
+        ) + pd.to_timedelta(days, unit='d')
+        tflag[:, :, 0] = dates.strftime('%Y%j').astype('i').values.reshape(
+            jdays.shape
+        )
+        sdate = pd.to_datetime(str(ncf.SDATE), format='%Y%j')
+        sdate += pd.to_timedelta(days, unit='d')
+        ncf.SDATE = int(sdate.strftime('%Y%j'))
+    if records is not None:
+        writesidecar(outpath, records)
+
+
+def run(
+    source='geoschem', gdnam='36US3', bctype='bcon', vgnam='EPA_35L',
+    size=None, repeat=3, workdir=None, outpath=None, exprengine='eval',
+    verbose=0
+):
+    """
+    Arguments
+    ---------
+    source : str
+        Key of sources (geoschem, waccm, tcr, or cmaq)
+    gdnam : str
+        Output grid name in the GRIDDESC distributed with aqmbc
+    bctype : str
+        bcon or icon
+    vgnam : str
+        Output vertical grid (see options.vglvls)
+    size : dict or None
+        Keywords for the synthetic generator (e.g., nlon, nlat, nlev,
+        ntimes). If None, generator defaults.
+    repeat : int
+        Number of times to run all stages. The first repeat includes
+        in-memory cache misses (e.g., cell mapping and vertical weights).
+    workdir : str or None
+        Folder for inputs and outputs. If None, a temporary folder is used
+        and removed.
+    outpath : str or None
+        If provided, save results as JSON to outpath.
+    exprengine : str
+        Passed to bcon.translate as engine (eval or compiled). As in bc,
+        compiled species are written as they are translated, so most of
+        their translate time is in saveioapi.
+    verbose : int
+        Level of verbosity
+
+    Returns
+    -------
+    results : dict
+        Settings, versions, sizes (bytes), stage order, and for each stage
+        the wall times (s) of every repeat, min and median, the min cpu (s),
+        max maxrss_delta and the last read_bytes and write_bytes (see
+        instrument.StageLog).
+    """
+    import json
+    import tempfile
+    import warnings
+    from os.path import join, dirname
+    import numpy as np
+    import pandas as pd
+    from .. import bcon, cmaq, options, report
+    from ..exprlib import exprpaths as getexprpaths
+
+    opts = sources[source]
+    generator = getattr(synthetic, opts['generator'])
+    if opts['exprs'] is None:
+        exprpaths = []
+        varkeys = None
+    else:
+        exprpaths = list(getexprpaths(opts['exprs'][1], opts['exprs'][0]))
+        varkeys = synthetic.exprinputs(exprpaths)
+    if opts['dims'] is None:
+        dimkeys = {'TSTEP': 'TSTEP', 'LAY': 'LAY', 'ROW': 'ROW', 'COL': 'COL'}
+    else:
+        dimkeys = options.dims[opts['dims']]
+    if size is None:
+        size = {}
+    gdpath = join(dirname(dirname(__file__)), 'examples', 'GRIDDESC')
+    metaf = options.getmetaf(bctype, gdnam, vgnam, gdpath=gdpath)
+    date = pd.to_datetime(size.get('date', '2022-01-01'))
+
+    tmpdir = None
+    if workdir is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        workdir = tmpdir.name
+    os.makedirs(workdir, exist_ok=True)
+
+    inpath = join(workdir, source + opts['suffix'])
+    genkw = dict(size)
+    if varkeys is not None:
+        genkw.setdefault('varkeys', varkeys)
+    if verbose > 0:
+        print(f'Generating {inpath}', flush=True)
+    generator(inpath, **genkw)
+
+    log = StageLog(verbose=verbose)
+    outbytes = None
+    bcpat = join(workdir, f'{source}_{bctype}_%Y%m%d.nc')
+    bcpath = date.strftime(bcpat)
+    readypath = join(workdir, f'{source}_{bctype}_ready.nc')
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for ri in range(repeat):
+            if verbose > 0:
+                print(f'Repeat {ri + 1} of {repeat}', flush=True)
+            # measure the code used by bc
+            log.info['repeat'] = ri
+            with log.stage('open'):
+                varfile = bcon._bcopen(
+                    inpath, {'format': opts['format']}, exprpaths
+                )[0]
+            wndwf, outf, values = bcon._bcpipeline(
+                varfile, metaf, dimkeys, None, vmethod=opts['vmethod'],
+                exprpaths=exprpaths, exprengine=exprengine, verbose=0,
+                stagelog=log, stream=True
+            )
+            with log.stage('saveioapi'):
+                out = bcon._bcsave(
+                    wndwf, outf, inpath, bcpath, metaf, dimkeys, exprpaths,
+                    'benchmark', verbose=0, values=values
+                )
+                out.close()
+            outbytes = os.path.getsize(bcpath)
+
+            # neighboring days for cmaqready are copies (not timed)
+            dd = pd.to_timedelta('1d')
+            for days in [-1, 1]:
+                _shiftdays(bcpath, (date + days * dd).strftime(bcpat), days)
+            if os.path.exists(readypath):
+                os.remove(readypath)
+            with log.stage('cmaqready'):
+                cmaq.cmaqready(date, bcpat, outpath=readypath)
+
+            statpaths = [
+                (date + days * dd).strftime(bcpat) for days in [-1, 0, 1]
+            ]
+            with log.stage('makestats'):
+                report.makestats(statpaths)
+
+    results = OrderedDict()
+    results['versions'] = _versions()
+    results['source'] = source
+    results['format'] = opts['format']
+    results['gdnam'] = gdnam
+    results['bctype'] = bctype
+    results['vgnam'] = vgnam
+    results['vmethod'] = opts['vmethod']
+    results['exprengine'] = exprengine
+    results['size'] = {k: v for k, v in size.items()}
+    results['repeat'] = repeat
+    results['inbytes'] = _nbytes(inpath)
+    results['outbytes'] = outbytes
+    results['order'] = [
+        r['stage'] for r in log.records if r['repeat'] == repeat - 1
+    ]
+    results['stages'] = OrderedDict()
+    for key in stages:
+        recs = [r for r in log.records if r['stage'] == key]
+        walls = [r['wall'] for r in recs]
+        results['stages'][key] = OrderedDict([
+            ('min', min(walls)), ('median', float(np.median(walls))),
+            ('times', walls), ('cpu', min([r['cpu'] for r in recs])),
+            ('maxrss_delta', max([r['maxrss_delta'] for r in recs])),
+            ('read_bytes', recs[-1]['read_bytes']),
+            ('write_bytes', recs[-1]['write_bytes']),
+        ])
+    results['total'] = sum([v['min'] for v in results['stages'].values()])
+
+    if tmpdir is not None:
+        tmpdir.cleanup()
+
+    if outpath is not None:
+        with open(outpath, 'w') as outf:
+            json.dump(results, outf, indent=2)
+
+    return results
@@ -0,0 +1,353 @@
+__all__ = ['geoschem', 'waccm', 'tcr', 'ioapi', 'exprinputs']
+__doc__ = """
+Synthetic inputs that look like each supported source so that bc stages can
+be timed without network data. Values are random, but positive and in
+plausible units, so translations and statistics exercise the same code
+paths as real data.
+"""
+import numpy as np
+
+
+def exprinputs(exprpaths):
+    """
+    Arguments
+    ---------
+    exprpaths : list
+        paths to expr files
+
+    Returns
+    -------
+    varkeys : list
+        sorted names read by the expressions that are not assigned before
+        and are not builtins or np (i.e., variables the source must provide)
+    """
+    import ast
+    import builtins
+    from ..exprlib import loadexprs
+
+    exprs = loadexprs(exprpaths)
+    assigned = set(dir(builtins)) | set(['np'])
+    needed = []
+    for stmt in ast.parse(exprs.text).body:
+        for node in ast.walk(stmt.value if hasattr(stmt, 'value') else stmt):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+                if node.id not in assigned:
+                    needed.append(node.id)
+        for target in getattr(stmt, 'targets', []):
+            if isinstance(target, ast.Name):
+                assigned.add(target.id)
+    return sorted(set(needed))
+
+
+def _fields(varkeys, shape, seed=0, low=1e-10, high=1e-7):
+    """
+    Yield (key, values) with random positive values. One random field is
+    scaled per variable so that many variables are cheap to make.
+    """
+    rng = np.random.default_rng(seed)
+    base = rng.uniform(0.5, 1.5, size=shape).astype('f')
+    scales = np.exp(rng.uniform(np.log(low), np.log(high), size=len(varkeys)))
+    for key, scale in zip(varkeys, scales):
+        yield key, base * np.float32(scale)
+
+
+def geoschem(
+    path, varkeys=None, nlon=72, nlat=46, nlev=47, ntimes=4,
+    date='2022-01-01', seed=0
+):
+    """
+    Write a GEOS-Chem NetCDF diagnostic (format gcnc) with SpeciesBC_*,
+    Met_PMIDDRY and Met_T on a global grid with hybrid levels.
+
+    Arguments
+    ---------
+    path : str
+        Output path
+    varkeys : list or None
+        Variables to write. If None, inputs needed by exprlib.gc14.
+    nlon, nlat, nlev, ntimes : int
+        Dimension sizes (defaults are a 4x5 degree global grid)
+    date : str
+        Start date; times are evenly spaced over one day
+    seed : int
+        Random seed
+
+    Returns
+    -------
+    path : str
+        Path that was written
+    """
+    import netCDF4
+    from ..exprlib import gc14
+
+    if varkeys is None:
+        varkeys = exprinputs(gc14)
+    pedges = np.linspace(1013.25, 0.01, nlev + 1)
+    pmid = (pedges[:-1] + pedges[1:]) / 2
+    with netCDF4.Dataset(path, 'w', format='NETCDF4_CLASSIC') as nf:
+        for dk, dl in [
+            ('time', ntimes), ('lev', nlev), ('ilev', nlev + 1),
+            ('lat', nlat), ('lon', nlon)
+        ]:
+            nf.createDimension(dk, dl)
+        timev = nf.createVariable('time', 'd', ('time',))
+        timev.units = f'minutes since {date} 00:00:00'
+        timev.calendar = 'gregorian'
+        timev[:] = np.arange(ntimes) * 1440 / ntimes
+        latv = nf.createVariable('lat', 'd', ('lat',))
+        latv.units = 'degrees_north'
+        latv[:] = np.linspace(-90, 90, nlat)
+        lonv = nf.createVariable('lon', 'd', ('lon',))
+        lonv.units = 'degrees_east'
+        lonv[:] = np.arange(nlon) * 360 / nlon - 180
+        nf.createVariable('P0', 'd', ())[...] = 1013.25
+        for key, dim, vals in [
+            ('lev', 'lev', pmid / 1013.25), ('ilev', 'ilev', pedges / 1013.25),
+            ('hyam', 'lev', pmid * 0), ('hybm', 'lev', pmid / 1013.25),
+            ('hyai', 'ilev', pedges * 0), ('hybi', 'ilev', pedges / 1013.25),
+        ]:
+            nf.createVariable(key, 'd', (dim,))[:] = vals
+        dims = ('time', 'lev', 'lat', 'lon')
+        shape = (ntimes, nlev, nlat, nlon)
+        spckeys = [k for k in varkeys if k not in ('Met_PMIDDRY', 'Met_T')]
+        for key, vals in _fields(spckeys, shape, seed=seed):
+            var = nf.createVariable(key, 'f', dims)
+            var.units = 'mol mol-1 dry'
+            var.long_name = key
+            var[:] = vals
+        if 'Met_PMIDDRY' in varkeys:
+            var = nf.createVariable('Met_PMIDDRY', 'f', dims)
+            var.units = 'hPa'
+            var.long_name = 'Met_PMIDDRY'
+            var[:] = np.broadcast_to(pmid[None, :, None, None], shape)
+        if 'Met_T' in varkeys:
+            var = nf.createVariable('Met_T', 'f', dims)
+            var.units = 'K'
+            var.long_name = 'Met_T'
+            var[:] = np.broadcast_to(
+                np.interp(pmid, [0, 250, 1013.25], [210, 220, 288])[
+                    None, :, None, None
+                ], shape
+            )
+    return path
+
+
+def waccm(
+    path, varkeys=None, nlon=144, nlat=96, nlev=88, ntimes=4,
+    date='2022-01-01', seed=0
+):
+    """
+    Write a WACCM-like file (format waccm) with hybrid coordinates ordered
+    top-to-surface and longitude on 0-360.
+
+    Arguments
+    ---------
+    path : str
+        Output path
+    varkeys : list or None
+        Variables to write. If None, inputs of waccm_o3so4.expr.
+    nlon, nlat, nlev, ntimes : int
+        Dimension sizes
+    date : str
+        Start date; times are evenly spaced over one day
+    seed : int
+        Random seed
+
+    Returns
+    -------
+    path : str
+        Path that was written
+    """
+    import netCDF4
+    import pandas as pd
+    from ..exprlib import exprpaths
+
+    if varkeys is None:
+        varkeys = exprinputs(exprpaths(['waccm_o3so4.expr'], prefix='waccm'))
+    p0 = 100000.
+    # top-to-surface edges as a fraction of surface pressure
+    etai = np.linspace(5e-6, 1, nlev + 1)
+    hybi = np.where(etai > 0.1, (etai - 0.1) / 0.9, 0)
+    hyai = etai - hybi
+    hybm = (hybi[:-1] + hybi[1:]) / 2
+    hyam = (hyai[:-1] + hyai[1:]) / 2
+    times = pd.date_range(date, periods=ntimes, freq=f'{24 // ntimes}h')
+    with netCDF4.Dataset(path, 'w', format='NETCDF4_CLASSIC') as nf:
+        for dk, dl in [
+            ('time', ntimes), ('lev', nlev), ('ilev', nlev + 1),
+            ('lat', nlat), ('lon', nlon)
+        ]:
+            nf.createDimension(dk, dl)
+        timev = nf.createVariable('time', 'd', ('time',))
+        timev.units = f'days since {date} 00:00:00'
+        timev.calendar = 'gregorian'
+        timev[:] = np.arange(ntimes) / ntimes
+        nf.createVariable('date', 'i', ('time',))[:] = times.strftime(
+            '%Y%m%d'
+        ).astype('i')
+        nf.createVariable('datesec', 'i', ('time',))[:] = (
+            times.hour * 3600
+        )
+        latv = nf.createVariable('lat', 'd', ('lat',))
+        latv.units = 'degrees_north'
+        latv[:] = np.linspace(-90, 90, nlat)
+        lonv = nf.createVariable('lon', 'd', ('lon',))
+        lonv.units = 'degrees_east'
+        lonv[:] = np.arange(nlon) * 360 / nlon
+        nf.createVariable('P0', 'd', ())[...] = p0
+        for key, dim, vals in [
+            ('lev', 'lev', (hyam + hybm) * 1000),
+            ('ilev', 'ilev', (hyai + hybi) * 1000),
+            ('hyam', 'lev', hyam), ('hybm', 'lev', hybm),
+            ('hyai', 'ilev', hyai), ('hybi', 'ilev', hybi),
+        ]:
+            nf.createVariable(key, 'd', (dim,))[:] = vals
+        psv = nf.createVariable('PS', 'f', ('time', 'lat', 'lon'))
+        psv.units = 'Pa'
+        psv[:] = 101325.
+        dims = ('time', 'lev', 'lat', 'lon')
+        shape = (ntimes, nlev, nlat, nlon)
+        pmid = (hyam * p0 + hybm * 101325.)[None, :, None, None]
+        special = {
+            'M_dens': (pmid / 1.380649e-23 / 250. / 1e6, 'molecules/cm3'),
+            'Q': (np.full(shape, 0.005), 'kg/kg'),
+            'Z3': ((np.log(101325 / pmid) * 7000.), 'm'),
+        }
+        spckeys = [k for k in varkeys if k not in special]
+        for key, vals in _fields(spckeys, shape, seed=seed):
+            var = nf.createVariable(key, 'f', dims)
+            var.units = 'mol/mol'
+            var[:] = vals
+        for key, (vals, units) in special.items():
+            if key in varkeys:
+                var = nf.createVariable(key, 'f', dims)
+                var.units = units
+                var[:] = np.broadcast_to(vals, shape)
+    return path
+
+
+def tcr(
+    path, varkeys=None, nlon=144, nlat=73, nlev=27, ntimes=1,
+    date='2022-01-01', seed=0
+):
+    """
+    Write TCR-like per-species files on fixed pressure levels and a text
+    file listing them (the input expected by format tcr).
+
+    Arguments
+    ---------
+    path : str
+        Output path of the text file; species files are written next to it
+    varkeys : list or None
+        Species to write (aerosol_* are written as aerosol with long_name).
+        If None, inputs of tcr_o3so4.expr.
+    nlon, nlat, nlev, ntimes : int
+        Dimension sizes
+    date : str
+        Start date
+    seed : int
+        Random seed
+
+    Returns
+    -------
+    path : str
+        Path of the text file that lists species files
+    """
+    import os
+    import netCDF4
+    from ..exprlib import exprpaths
+
+    if varkeys is None:
+        varkeys = exprinputs(exprpaths(['tcr_o3so4.expr'], prefix='tcr'))
+    levs = np.linspace(1000, 50, nlev)
+    shape = (ntimes, nlev, nlat, nlon)
+    dims = ('time', 'lev', 'lat', 'lon')
+    paths = []
+    root = os.path.splitext(path)[0]
+    for key, vals in _fields(varkeys, shape, seed=seed):
+        spcpath = f'{root}_{key}.nc'
+        with netCDF4.Dataset(spcpath, 'w', format='NETCDF4_CLASSIC') as nf:
+            for dk, dl in zip(dims, shape):
+                nf.createDimension(dk, dl)
+            timev = nf.createVariable('time', 'd', ('time',))
+            timev.units = f'hours since {date} 00:00:00'
+            timev[:] = np.arange(ntimes) * 24 / ntimes
+            nf.createVariable('lev', 'd', ('lev',))[:] = levs
+            nf.createVariable('lat', 'd', ('lat',))[:] = np.linspace(
+                -90, 90, nlat
+            )
+            nf.createVariable('lon', 'd', ('lon',))[:] = (
+                np.arange(nlon) * 360 / nlon
+            )
+            if key.startswith('aerosol_'):
+                var = nf.createVariable('aerosol', 'f', dims)
+                var.long_name = f'aerosol {key[8:]} mass mixing ratio'
+                var.units = 'kg/kg'
+            else:
+                var = nf.createVariable(key, 'f', dims)
+                var.long_name = key
+                var.units = 'ppbv'
+            var.missing_value = np.float32(-999.)
+            var[:] = vals * 1e6
+        paths.append(spcpath)
+
+    with open(path, 'w') as pathf:
+        pathf.write('\n'.join(paths))
+
+    return path
+
+
+def ioapi(
+    path, varkeys=None, gdnam='108NHEMI2', vgnam='EPA_35L', ntimes=24,
+    date='2022-01-01', gdpath=None, seed=0
+):
+    """
+    Write a CMAQ IOAPI CONC-like file (format ioapi) for a grid in GRIDDESC
+    (e.g., hemispheric CMAQ as a source for a regional domain).
+
+    Arguments
+    ---------
+    path : str
+        Output path
+    varkeys : list or None
+        Variables to write. If None, O3, ASO4I and ASO4J.
+    gdnam : str
+        Grid name in gdpath
+    vgnam : str
+        Name of vertical grid in options.vglvls
+    ntimes : int
+        Number of hourly times
+    date : str
+        Start date
+    gdpath : str or None
+        GRIDDESC path. If None, the GRIDDESC distributed with aqmbc.
+    seed : int
+        Random seed
+
+    Returns
+    -------
+    path : str
+        Path that was written
+    """
+    from os.path import join, dirname
+    import pandas as pd
+    import PseudoNetCDF as pnc
+    from ..options import vglvls
+
+    if varkeys is None:
+        varkeys = ['O3', 'ASO4I', 'ASO4J']
+    if gdpath is None:
+        gdpath = join(dirname(dirname(__file__)), 'examples', 'GRIDDESC')
+    date = pd.to_datetime(date)
+    units = {k: 'ppmV' if k[:1] != 'A' else 'micrograms/m**3' for k in varkeys}
+    f = pnc.pncopen(
+        gdpath, format='griddesc', GDNAM=gdnam, FTYPE=1, VGLVLS=vglvls[vgnam],
+        SDATE=int(date.strftime('%Y%j')), STIME=0, TSTEP=10000,
+        nsteps=ntimes, var_kwds=units
+    )
+    f.updatetflag(overwrite=True)
+    shape = f.variables[varkeys[0]].shape
+    for key, vals in _fields(varkeys, shape, seed=seed, low=1e-3, high=1):
+        f.variables[key][:] = vals
+    f.save(path, verbose=0).close()
+    return path
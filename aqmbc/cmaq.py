@@ -1,4 +1,4 @@
-__all__ = ['cmaqready']
+__all__ = ['cmaqready', 'cmaqready_range', 'mmapioapi', 'timeweights']
 
 
 def timeindependent(ncf):
@@ -24,16 +24,314 @@ def timeindependent(ncf):
     ncf.TSTEP = tflag[0, 0, 0]
 
 
-def batch_timeindependent(inpaths, verbose=0):
-    """Apply timeindependent to many files on disk"""
-    import netCDF4 as nc
+def batch_timeindependent(inpaths, verbose=0, workers=1, fsync=False):
+    """
+    Apply timeindependent to many files on disk. NetCDF3 classic files are
+    patched in place: only the TFLAG values and the SDATE, STIME and TSTEP
+    attribute values are overwritten, so the file is never rewritten. Other
+    files (e.g., NetCDF4) are edited with netCDF4. A fresh statistics sidecar
+    (see aqmbc.stats.writesidecar) stays fresh.
+
+    Arguments
+    ---------
+    inpaths : list or str
+        Paths to make time-independent
+    verbose : int
+        Level of verbosity
+    workers : int
+        Number of threads used to edit files concurrently
+    fsync : bool
+        If True, flush each file to disk (os.fsync) before returning.
+
+    Returns
+    -------
+    None
+    """
+    from concurrent.futures import ThreadPoolExecutor
     if isinstance(inpaths, str):
         inpaths = [inpaths]
-    for inpath in inpaths:
-        if verbose:
-            print(inpath)
-        ncf = nc.Dataset(inpath, mode='r+')
-        timeindependent(ncf)
+    if workers is None or workers <= 1:
+        for inpath in inpaths:
+            _timeindependentpath(inpath, verbose=verbose, fsync=fsync)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                _timeindependentpath, inpath, verbose=verbose, fsync=fsync
+            )
+            for inpath in inpaths
+        ]
+        for future in futures:
+            future.result()
+
+
+def _timeindependentpath(inpath, verbose=0, fsync=False):
+    """Make one file on disk time-independent (see batch_timeindependent)"""
+    import os
+    import netCDF4 as nc
+    from .stats import readsidecar, writesidecar
+
+    if verbose:
+        print(inpath)
+    records = readsidecar(inpath)
+    with open(inpath, mode='r+b') as ncf:
+        patched = _nc3timeindependent(ncf)
+        if patched and fsync:
+            ncf.flush()
+            os.fsync(ncf.fileno())
+    if not patched:
+        with nc.Dataset(inpath, mode='r+') as ncf:
+            timeindependent(ncf)
+        if fsync:
+            with open(inpath, mode='rb') as ncf:
+                os.fsync(ncf.fileno())
+    if records is not None:
+        writesidecar(inpath, records)
+
+
+def _nc3timeindependent(ncf):
+    """
+    Zero TFLAG, SDATE, STIME and TSTEP in a NetCDF3 classic file object
+    opened with mode 'r+b'. Returns False (unchanged) if ncf is not NetCDF3
+    classic or has no integer TFLAG, SDATE, STIME and TSTEP to edit.
+    """
+    import os
+    import numpy as np
+
+    try:
+        hdr = _nc3header(ncf)
+    except ValueError:
+        return False
+    tflag = hdr['variables'].get('TFLAG')
+    atts = [hdr['attributes'].get(key) for key in ['SDATE', 'STIME', 'TSTEP']]
+    if (
+        tflag is None or tflag['type'] not in (4, 10)
+        or any(att is None or att['type'] not in (4, 10) for att in atts)
+    ):
+        return False
+    if tflag['record']:
+        ntimes = _nc3numrecs(hdr, os.fstat(ncf.fileno()).st_size)
+    else:
+        ntimes = tflag['shape'][0]
+    if ntimes > 1:
+        raise ValueError('Files with 2+ times cannot be time-independent')
+    for att in atts:
+        ncf.seek(att['offset'])
+        ncf.write(np.zeros(att['size'], dtype=_nc3types[att['type']]).tobytes())
+    if ntimes == 1:
+        nflag = int(np.prod(tflag['shape'][1:]))
+        ncf.seek(tflag['begin'])
+        ncf.write(np.zeros(nflag, dtype=_nc3types[tflag['type']]).tobytes())
+    return True
+
+
+def mmapioapi(path):
+    """
+    Open a NetCDF3 classic (e.g., IOAPI) file as memory-mapped NumPy views.
+    Nothing is read or copied until values are used, and values keep the
+    file's big-endian byte order (NumPy converts them as they are used).
+
+    Arguments
+    ---------
+    path : str
+        Path to a NetCDF3 classic file (CDF-1, CDF-2 or CDF-5)
+
+    Returns
+    -------
+    ds : xarray.Dataset
+        Like xr.open_dataset(path, decode_cf=False), but each variable's
+        values are a read-only view of the file.
+
+    Notes
+    -----
+    Raises ValueError if path is not NetCDF3 classic (e.g., NetCDF4).
+    """
+    import numpy as np
+    import xarray as xr
+
+    with open(path, mode='rb') as inf:
+        hdr = _nc3header(inf)
+        attrs = _nc3attrs(inf, hdr['attributes'])
+        vattrs = {
+            key: _nc3attrs(inf, var['attributes'])
+            for key, var in hdr['variables'].items()
+        }
+    buf = np.memmap(path, dtype='u1', mode='r')
+    numrecs = _nc3numrecs(hdr, buf.size)
+    data_vars = {}
+    for key, var in hdr['variables'].items():
+        dtype = np.dtype(_nc3types[var['type']])
+        if var['record']:
+            shape = (max(numrecs, 0),) + var['shape'][1:]
+            strides = (hdr['recsize'],) + _cstrides(shape[1:], dtype.itemsize)
+        else:
+            shape = var['shape']
+            strides = _cstrides(shape, dtype.itemsize)
+        vals = np.ndarray(
+            shape, dtype=dtype, buffer=buf, offset=var['begin'],
+            strides=strides
+        )
+        data_vars[key] = xr.Variable(
+            var['dimensions'], vals, attrs=vattrs[key]
+        )
+    return xr.Dataset(data_vars, attrs=attrs)
+
+
+def _nc3numrecs(hdr, filesize):
+    """
+    Number of records in a NetCDF3 classic file (see _nc3header). For
+    streaming files (numrecs is -1), records fill the rest of the file.
+    """
+    numrecs = hdr['numrecs']
+    if numrecs < 0:
+        recbegins = [
+            v['begin'] for v in hdr['variables'].values() if v['record']
+        ]
+        if len(recbegins) == 0 or hdr['recsize'] <= 0:
+            return 0
+        numrecs = (filesize - min(recbegins)) // hdr['recsize']
+    return numrecs
+
+
+def _openioapi(path):
+    """Open path with mmapioapi or, if not NetCDF3, with xarray"""
+    import xarray as xr
+    try:
+        return mmapioapi(path)
+    except ValueError:
+        return xr.open_dataset(path, decode_cf=False)
+
+
+def _cstrides(shape, itemsize):
+    """Strides of a C-ordered array"""
+    strides = []
+    for n in shape[::-1]:
+        strides.insert(0, itemsize)
+        itemsize *= n
+    return tuple(strides)
+
+
+def _nc3attrs(ncf, atts):
+    """Values of attributes from _nc3header (str for char attributes)"""
+    import numpy as np
+    out = {}
+    for key, att in atts.items():
+        ncf.seek(att['offset'])
+        dtype = np.dtype(_nc3types[att['type']])
+        raw = ncf.read(att['size'] * dtype.itemsize)
+        if att['type'] == 2:
+            out[key] = raw.decode('utf-8', errors='replace').rstrip('\x00')
+            continue
+        vals = np.frombuffer(raw, dtype=dtype).astype(dtype.newbyteorder('='))
+        out[key] = vals[0] if vals.size == 1 else vals
+    return out
+
+
+_nc3types = {
+    1: '>i1', 2: 'S1', 3: '>i2', 4: '>i4', 5: '>f4', 6: '>f8',
+    7: '>u1', 8: '>u2', 9: '>u4', 10: '>i8', 11: '>u8'
+}
+
+
+def _nc3header(ncf):
+    """
+    Parse the header of a NetCDF3 classic (CDF-1, CDF-2 or CDF-5) file.
+
+    Arguments
+    ---------
+    ncf : file
+        Binary file object positioned anywhere
+
+    Returns
+    -------
+    hdr : dict
+        version, numrecs (and its offset numrecs_offset), recsize,
+        dimensions (name: length; 0 is unlimited), attributes and variables.
+        Each attribute has type (nc_type), size (number of values) and
+        offset (of the values). Each variable has dimensions, shape (the
+        record dimension is 0), record (bool), type, begin (offset of the
+        first value), vsize and attributes.
+    """
+    import numpy as np
+
+    ncf.seek(0)
+    magic = ncf.read(4)
+    if magic[:3] != b'CDF' or magic[3] not in (1, 2, 5):
+        raise ValueError('Not a NetCDF3 classic file')
+    version = magic[3]
+    sizefmt = '>i8' if version == 5 else '>i4'
+    offfmt = '>i4' if version == 1 else '>i8'
+
+    def read(fmt):
+        dt = np.dtype(fmt)
+        return int(np.frombuffer(ncf.read(dt.itemsize), dtype=dt)[0])
+
+    def readname():
+        n = read(sizefmt)
+        name = ncf.read(n).decode('utf-8')
+        ncf.seek(-n % 4, 1)
+        return name
+
+    def readlist(tag):
+        listtag = read('>i4')
+        n = read(sizefmt)
+        if listtag not in (0, tag):
+            raise ValueError(f'Unexpected NetCDF3 tag {listtag}')
+        return n
+
+    def readatts():
+        atts = {}
+        for i in range(readlist(12)):
+            name = readname()
+            nctype = read('>i4')
+            if nctype not in _nc3types:
+                raise ValueError(f'Unknown NetCDF3 type {nctype}')
+            size = read(sizefmt)
+            nbytes = size * np.dtype(_nc3types[nctype]).itemsize
+            atts[name] = dict(type=nctype, size=size, offset=ncf.tell())
+            ncf.seek(nbytes + (-nbytes % 4), 1)
+        return atts
+
+    numrecs_offset = ncf.tell()
+    numrecs = read(sizefmt)
+    dims = []
+    for i in range(readlist(10)):
+        name = readname()
+        dims.append((name, read(sizefmt)))
+    atts = readatts()
+    variables = {}
+    recsize = 0
+    for i in range(readlist(11)):
+        name = readname()
+        dimids = [read(sizefmt) for j in range(read(sizefmt))]
+        vatts = readatts()
+        nctype = read('>i4')
+        if nctype not in _nc3types:
+            raise ValueError(f'Unknown NetCDF3 type {nctype}')
+        vsize = read(sizefmt)
+        begin = read(offfmt)
+        vdims = tuple(dims[di][0] for di in dimids)
+        shape = tuple(dims[di][1] for di in dimids)
+        record = len(shape) > 0 and shape[0] == 0
+        if record:
+            recsize += vsize
+        variables[name] = dict(
+            dimensions=vdims, shape=shape, record=record, type=nctype,
+            vsize=vsize, begin=begin, attributes=vatts
+        )
+    nrecvars = sum(v['record'] for v in variables.values())
+    if nrecvars == 1:
+        # a single record variable is not padded
+        recvar = [v for v in variables.values() if v['record']][0]
+        recsize = int(np.prod(recvar['shape'][1:], dtype='i8')) * np.dtype(
+            _nc3types[recvar['type']]
+        ).itemsize
+    return dict(
+        version=version, numrecs=numrecs, numrecs_offset=numrecs_offset,
+        recsize=recsize, dimensions=dict(dims), attributes=atts,
+        variables=variables
+    )
 
 
 def cmaqready(date, inpaths, outpath=None, verbose=0, minvalue=1e-30):
@@ -59,21 +357,24 @@ def cmaqready(date, inpaths, outpath=None, verbose=0, minvalue=1e-30):
     -------
     outpath : str or dataset
         Output file or path.
+
+    Notes
+    -----
+    Interpolation weights are computed once (see timeweights) and applied to
+    each variable in one operation, reading only the input times that are
+    used. Output times outside the inputs copy the nearest output time within
+    the inputs.
     """
-    import warnings
     import pandas as pd
-    import xarray as xr
-    import numpy as np
     import os
+    from .manifest import atomicwrite
 
-    clim = 60 * 80
     if outpath is not None and os.path.exists(outpath):
         print(f'Keeping {outpath}; remove to remake')
         return
 
     date = pd.to_datetime(date)
     dd = pd.to_timedelta('1d')
-    outtimes = pd.date_range(date, date + dd, freq='1h')
     if isinstance(inpaths, str):
         inpat = inpaths
         indates = [date - dd, date, date + dd]
@@ -84,13 +385,133 @@ def cmaqready(date, inpaths, outpath=None, verbose=0, minvalue=1e-30):
             if verbose > 0:
                 print(f'Could not find {missingpaths}')
 
-    infiles = [xr.open_dataset(p, decode_cf=False) for p in inpaths]
-    tmpds = xr.concat(infiles, dim='TSTEP')
-    yyyyjjj = tmpds['TFLAG'][:, 0, 0].values
-    hhmmss = tmpds['TFLAG'][:, 0, 1].values
-    intime = pd.to_datetime([
-        f'{yj}T{tj:06d}' for yj, tj in zip(yyyyjjj, hhmmss)
-    ], format='%Y%jT%H%M%S')
+    infiles = [_openioapi(p) for p in inpaths]
+    outds = _cmaqready(date, infiles, minvalue=minvalue)
+    for f in infiles:
+        f.close()
+    if outpath is not None:
+        # a stopped run never leaves a partial outpath
+        with atomicwrite(outpath) as tmppath:
+            outds.to_netcdf(tmppath)
+        return outpath
+    else:
+        return outds
+
+
+def cmaqready_range(
+    start, end, inpat, outpat, verbose=0, minvalue=1e-30, workers=1
+):
+    """
+    Apply cmaqready to every date from start to end. A three-day window
+    slides across the dates, so each input is read once (or, with workers,
+    once per chunk of dates) instead of three times.
+
+    Arguments
+    ---------
+    start, end : date-like or string
+        First and last dates for CMAQ-ready files.
+    inpat : str
+        Template for input paths (e.g., BCON_%Y-%m-%d.nc)
+    outpat : str
+        Template for output paths. Existing outputs are kept.
+    verbose : int
+        Level of verbosity
+    minvalue : scalar
+        Minimum value
+    workers : int
+        If greater than 1, dates are split into contiguous chunks that are
+        processed in separate processes.
+
+    Returns
+    -------
+    outpaths : list
+        Output paths in date order
+    """
+    import os
+    import numpy as np
+    import pandas as pd
+    from .manifest import atomicwrite
+
+    dates = pd.date_range(start, end, freq='1D')
+    if workers is not None and workers > 1 and len(dates) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        chunks = np.array_split(np.arange(len(dates)), min(workers, len(dates)))
+        with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+            futures = [
+                executor.submit(
+                    cmaqready_range, dates[c[0]], dates[c[-1]], inpat, outpat,
+                    verbose=verbose, minvalue=minvalue
+                )
+                for c in chunks
+            ]
+            return sum([future.result() for future in futures], [])
+
+    dd = pd.to_timedelta('1d')
+    loaded = {}
+    outpaths = []
+    for date in dates:
+        outpath = date.strftime(outpat)
+        outpaths.append(outpath)
+        if os.path.exists(outpath):
+            print(f'Keeping {outpath}; remove to remake')
+            continue
+        window = [date - dd, date, date + dd]
+        for d in list(loaded):
+            if d not in window:
+                del loaded[d]
+        infiles = []
+        for d in window:
+            if d not in loaded:
+                inpath = d.strftime(inpat)
+                if os.path.exists(inpath):
+                    if verbose > 0:
+                        print(f'Reading {inpath}', flush=True)
+                    # NetCDF3 inputs are memory-mapped, not copied
+                    with _openioapi(inpath) as inf:
+                        loaded[d] = inf.load()
+                else:
+                    if verbose > 0:
+                        print(f'Could not find {inpath}')
+                    loaded[d] = None
+            if loaded[d] is not None:
+                infiles.append(loaded[d])
+        if len(infiles) == 0:
+            raise FileNotFoundError(f'No inputs for {date:%F} from {inpat}')
+        outds = _cmaqready(date, infiles, minvalue=minvalue)
+        with atomicwrite(outpath) as tmppath:
+            outds.to_netcdf(tmppath)
+
+    return outpaths
+
+
+def _cmaqready(date, infiles, minvalue=1e-30):
+    """
+    Arguments
+    ---------
+    date : pandas.Timestamp
+        Date for CMAQ-ready file.
+    infiles : list
+        xarray.Datasets (IOAPI, opened with decode_cf=False) in time order.
+        Only the times that are used are read.
+    minvalue : scalar
+        Minimum value
+
+    Returns
+    -------
+    outds : xarray.Dataset
+        CMAQ-ready file in memory (see cmaqready)
+    """
+    import warnings
+    import pandas as pd
+    import xarray as xr
+    import numpy as np
+
+    clim = 60 * 80
+    dd = pd.to_timedelta('1d')
+    outtimes = pd.date_range(date, date + dd, freq='1h')
+    intime = pd.DatetimeIndex(np.concatenate([
+        _tflagtimes(f['TFLAG'].values) for f in infiles
+    ]))
     if intime.min() > date:
         warnings.warn(
             f'Input files start {intime.min():%Y-%m-%dT%H}Z after target'
@@ -101,18 +522,44 @@ def cmaqready(date, inpaths, outpath=None, verbose=0, minvalue=1e-30):
             f'Input files end {intime.max():%Y-%m-%dT%H}Z before target'
             f' end {date + dd:%Y-%m-%dT%H}; latest date copied to fill.'
         )
-    tmpds.coords['TSTEP'] = intime
+    nback = int((outtimes < intime.min()).sum())
+    nfwd = int((outtimes > intime.max()).sum())
+    if nback > 0:
+        warnings.warn(f'{nback} times before {intime.min()} back filled')
+    if nfwd > 0:
+        warnings.warn(f'{nfwd} times after {intime.max()} forward filled')
+
+    # interpolation weights are the same for all variables
+    i0, i1, w1 = timeweights(intime, outtimes)
+    inrange = np.flatnonzero(
+        (outtimes >= intime.min()) & (outtimes <= intime.max())
+    )
+    if inrange.size > 0:
+        # fill copies the first (last) output time within the inputs
+        oidx = np.clip(np.arange(len(outtimes)), inrange[0], inrange[-1])
+        i0, i1, w1 = i0[oidx], i1[oidx], w1[oidx]
+    w0 = 1 - w1
+    # only read input times that are used
+    need = np.unique(np.concatenate([i0, i1]))
+    p0 = np.searchsorted(need, i0)
+    p1 = np.searchsorted(need, i1)
+    nts = np.cumsum([0] + [f.sizes['TSTEP'] for f in infiles])
+    fneed = []
+    for fi, f in enumerate(infiles):
+        tidx = need[(need >= nts[fi]) & (need < nts[fi + 1])] - nts[fi]
+        if len(tidx) == 0:
+            continue
+        if (np.diff(tidx) == 1).all():
+            tidx = slice(tidx[0], tidx[-1] + 1)
+        fneed.append((f, tidx))
+
+    tmpds = infiles[0]
     nvars = tmpds.attrs['NVARS']
     tflagdata = np.array([
         outtimes.strftime('%Y%j').astype('i'),
         outtimes.strftime('%H%M%S').astype('i')
     ]).T[:, None, :].repeat(nvars, 1)
-    tflag = xr.DataArray(
-        tflagdata, dims=('TSTEP', 'VAR', 'DATE-TIME'),
-        name='TFLAG', attrs=tmpds['TFLAG'].attrs
-    )
-    tmpds = tmpds.interp(TSTEP=outtimes).reset_index(['TSTEP'], drop=True)
-    outds = tmpds[[]]
+    outds = xr.Dataset()
     outds.attrs.update(tmpds.attrs)
     outds.attrs['SDATE'] = np.int32(date.strftime('%Y%j'))
     outds.attrs['STIME'] = np.int32(date.strftime('%H%M%S'))
@@ -123,24 +570,76 @@ def cmaqready(date, inpaths, outpath=None, verbose=0, minvalue=1e-30):
     outds.attrs['HISTORY'] = hist[:clim]
     if len(fdesc) > clim:
         outds.attrs['description'] = fdesc
-    outds['TFLAG'] = tflag.astype('i')
-    titimes = list(enumerate(outtimes))
+    outds['TFLAG'] = xr.DataArray(
+        tflagdata.astype('i'), dims=('TSTEP', 'VAR', 'DATE-TIME'),
+        name='TFLAG', attrs=tmpds['TFLAG'].attrs
+    )
     for key in tmpds.data_vars:
         if key == 'TFLAG':
             continue
-        # outds[key] = tmpds[key].astype('f')
-        tmpv = np.maximum(tmpds[key].astype('f'), minvalue)
-        for ti, t in titimes[::-1]:
-            if t < intime.min():
-                tmpv[ti] = tmpv[ti + 1]
-                warnings.warn(f'{t} back filled')
-        for ti, t in titimes:
-            if t > intime.max():
-                tmpv[ti] = tmpv[ti - 1]
-                warnings.warn(f'{t} forward filled')
-        outds[key] = tmpv
-    if outpath is not None:
-        outds.to_netcdf(outpath)
-        return outpath
-    else:
-        return outds
+        tmpv = tmpds[key]
+        outdims = tmpv.dims
+        q0, q1 = p0, p1
+        if 'TSTEP' in tmpv.dims:
+            invals = np.concatenate([
+                f[key].isel(TSTEP=tidx).values for f, tidx in fneed
+            ], axis=0)
+        else:
+            # like xr.concat, variables without TSTEP are repeated
+            outdims = ('TSTEP',) + outdims
+            invals = np.asarray(tmpv.values)[None]
+            q0 = q1 = np.zeros_like(p0)
+        wshape = (-1,) + (1,) * (invals.ndim - 1)
+        outvals = np.empty((len(outtimes),) + invals.shape[1:], dtype='f')
+        np.add(
+            invals[q0] * w0.reshape(wshape), invals[q1] * w1.reshape(wshape),
+            out=outvals, casting='same_kind'
+        )
+        np.maximum(outvals, minvalue, out=outvals)
+        outds[key] = xr.DataArray(outvals, dims=outdims, attrs=tmpv.attrs)
+    return outds
+
+
+def _tflagtimes(tflag):
+    """Times from TFLAG values (TSTEP, VAR, DATE-TIME) of the first VAR"""
+    import pandas as pd
+    yyyyjjj = tflag[:, 0, 0]
+    hhmmss = tflag[:, 0, 1]
+    return pd.to_datetime([
+        f'{yj}T{tj:06d}' for yj, tj in zip(yyyyjjj, hhmmss)
+    ], format='%Y%jT%H%M%S').values
+
+
+def timeweights(intimes, outtimes):
+    """
+    Linear interpolation in time as indices and weights; outtimes before
+    (after) intimes use the first (last) input time.
+
+    Arguments
+    ---------
+    intimes : array-like
+        Sorted input times
+    outtimes : array-like
+        Output times
+
+    Returns
+    -------
+    i0, i1 : arrays
+        Indices of intimes before and after each outtime
+    w1 : array
+        Weight of i1; output = (1 - w1) * input[i0] + w1 * input[i1]
+    """
+    import numpy as np
+    import pandas as pd
+    inns = pd.DatetimeIndex(intimes).asi8
+    outns = pd.DatetimeIndex(outtimes).asi8
+    n = inns.size
+    idx = np.searchsorted(inns, outns, side='left')
+    i1 = np.clip(idx, 0, n - 1)
+    i0 = np.clip(idx - 1, 0, n - 1)
+    # edges are clamped (i0 == i1), so the weight does not matter
+    i0 = np.where(idx == 0, i1, i0)
+    dt = (inns[i1] - inns[i0]).astype('d')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w1 = np.where(dt > 0, (outns - inns[i0]) / dt, 1.)
+    return i0, i1, w1
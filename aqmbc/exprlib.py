@@ -1,4 +1,8 @@
-__all__ = ['gc12', 'gc12_soas', 'gc14', 'gc14_soas', 'raqms']
+__all__ = [
+    'gc12', 'gc12_soas', 'gc14', 'gc14_soas', 'raqms', 'compileexpr',
+    'compileexprpaths', 'loadexprs', 'getexprcache', 'setexprcache',
+    'ExprSet'
+]
 __doc__ = """
 Attributes
 ----------
@@ -12,8 +16,23 @@ gc14_soas : tuple
     same as above, but for the simple SOA option.
 raqms : tuple
     cb6r4 and ae6 definitions for RAQMS
+
+Functions
+---------
+compileexpr : function
+    compile expression text into a callable that replaces infile.eval
+compileexprpaths : function
+    same as compileexpr, but reads and joins expression files like translate
+loadexprs : function
+    read and parse expression files once per process (cached)
 """
 from os.path import join, dirname
+from collections import namedtuple
+import os
+import ast
+import hashlib
+import operator
+import numpy as np
 
 # redefining here because reusing from . would be recursive.
 defnpath = join(dirname(__file__), 'examples', 'definitions')
@@ -75,6 +94,638 @@ def avail(prefix=None):
         return sorted(glob(join(defnpath, prefix, '*')))
 
 
+# binary and unary operators that the compiler evaluates itself; the ufunc
+# is used when a temporary can be overwritten (out=) and the operator
+# otherwise so that results match python evaluation.
+_binops = {
+    ast.Add: (operator.add, np.add),
+    ast.Sub: (operator.sub, np.subtract),
+    ast.Mult: (operator.mul, np.multiply),
+    ast.Div: (operator.truediv, np.true_divide),
+    ast.FloorDiv: (operator.floordiv, np.floor_divide),
+    ast.Mod: (operator.mod, np.remainder),
+    ast.Pow: (operator.pow, np.power),
+}
+_unaryops = {
+    ast.USub: (operator.neg, np.negative),
+    ast.UAdd: (operator.pos, np.positive),
+}
+_noscope = (
+    ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp,
+    ast.NamedExpr, ast.Yield, ast.YieldFrom, ast.Await
+)
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _isfull(sl):
+    """True if sl is : or ... (i.e., X[:] is the same as X)"""
+    if isinstance(sl, ast.Slice):
+        return sl.lower is None and sl.upper is None and sl.step is None
+    return isinstance(sl, ast.Constant) and sl.value is Ellipsis
+
+
+class _Program:
+    """
+    Intermediate representation built by compileexpr. Nodes are hash-consed
+    so that repeated subexpressions are evaluated once. Each node is one of:
+      ('load', name), ('const', value), ('binop', op, left, right),
+      ('unary', op, operand), ('generic', source, deps, ...)
+    """
+    def __init__(self):
+        self.nodes = []
+        self.keys = {}
+        # name -> (node, cands); cands is a tuple of (leafname, patches)
+        # that mimics which variable eval would inherit properties from.
+        self.env = {}
+        # nodes of statements run only for side effects (e.g., print)
+        self.effects = []
+
+    def node(self, key, cse=True):
+        if cse and key in self.keys:
+            return self.keys[key]
+        self.nodes.append(key)
+        nid = len(self.nodes) - 1
+        if cse:
+            self.keys[key] = nid
+        return nid
+
+    def const(self, value):
+        return self.node(('const', type(value).__name__, repr(value), value))
+
+    def name(self, name):
+        if name not in self.env:
+            nid = self.node(('load', name))
+            self.env[name] = (nid, ((name, ()),))
+        return self.env[name]
+
+    def walk(self, expr):
+        if isinstance(expr, ast.Constant):
+            return self.const(expr.value), ()
+        if isinstance(expr, ast.Name):
+            return self.name(expr.id)
+        if isinstance(expr, ast.Subscript) and _isfull(expr.slice):
+            return self.walk(expr.value)
+        if isinstance(expr, ast.BinOp) and type(expr.op) in _binops:
+            lid, lcands = self.walk(expr.left)
+            rid, rcands = self.walk(expr.right)
+            lnode, rnode = self.nodes[lid], self.nodes[rid]
+            if lnode[0] == 'const' and rnode[0] == 'const':
+                try:
+                    pyop = _binops[type(expr.op)][0]
+                    return self.const(pyop(lnode[3], rnode[3])), ()
+                except Exception:
+                    pass
+            opkey = type(expr.op).__name__
+            nid = self.node(('binop', opkey, lid, rid))
+            return nid, lcands + rcands
+        if isinstance(expr, ast.UnaryOp) and type(expr.op) in _unaryops:
+            oid, ocands = self.walk(expr.operand)
+            onode = self.nodes[oid]
+            if onode[0] == 'const':
+                try:
+                    pyop = _unaryops[type(expr.op)][0]
+                    return self.const(pyop(onode[3])), ()
+                except Exception:
+                    pass
+            return self.node(('unary', type(expr.op).__name__, oid)), ocands
+        return self.generic(expr)
+
+    def generic(self, expr, cse=True):
+        """
+        Anything else (calls, comparisons, partial slices) is kept as python
+        source with names replaced by the node that holds their value.
+        """
+        for sub in ast.walk(expr):
+            if isinstance(sub, _noscope):
+                raise _Unsupported(type(sub).__name__)
+            if isinstance(sub, ast.Name) and not isinstance(sub.ctx, ast.Load):
+                raise _Unsupported('store in expression')
+
+        deps = []
+        prog = self
+
+        class Rename(ast.NodeTransformer):
+            def visit_Name(self, node):
+                nid, cands = prog.name(node.id)
+                deps.append(nid)
+                return ast.copy_location(
+                    ast.Name(id=f'_n{nid}', ctx=ast.Load()), node
+                )
+
+        newexpr = Rename().visit(
+            ast.parse(ast.unparse(expr), mode='eval').body
+        )
+        src = ast.unparse(newexpr)
+        nid = self.node(('generic', src, tuple(sorted(set(deps)))), cse=cse)
+        cands = ()
+        if isinstance(expr, ast.Subscript):
+            cands = self.walk(expr.value)[1]
+        return nid, cands
+
+    def statement(self, stmt):
+        if isinstance(stmt, ast.Pass):
+            return
+        if isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant):
+            return
+        if isinstance(stmt, ast.Expr):
+            # e.g., print('...'); run in order and never shared
+            self.effects.append(self.generic(stmt.value, cse=False)[0])
+            return
+        if not isinstance(stmt, ast.Assign):
+            raise _Unsupported(type(stmt).__name__)
+        nid, cands = self.walk(stmt.value)
+        for target in stmt.targets:
+            if isinstance(target, ast.Name):
+                self.env[target.id] = (nid, cands)
+            elif (
+                isinstance(target, ast.Attribute)
+                and isinstance(target.value, ast.Name)
+            ):
+                tid, tcands = self.name(target.value.id)
+                patch = ((target.attr, nid),)
+                tcands = tuple((k, p + patch) for k, p in tcands)
+                self.env[target.value.id] = (tid, tcands)
+            else:
+                raise _Unsupported('assignment target')
+
+
+def _load(vardict, name):
+    """Get data for name as an ndarray (or masked array) with no copy"""
+    import builtins
+    if name not in vardict:
+        if not hasattr(builtins, name):
+            # same error as eval (e.g., a species missing from the source)
+            raise NameError(f"name '{name}' is not defined")
+        return getattr(builtins, name)
+    val = vardict[name]
+    if hasattr(val, 'dimensions') and hasattr(val, 'ncattrs'):
+        val = val[...]
+        if isinstance(val, np.ma.MaskedArray):
+            return val.view(np.ma.MaskedArray)
+        return val.view(np.ndarray)
+    return val
+
+
+def _binop(opkey, a, b, buf=None):
+    """Apply opkey to a and b writing into buf if types allow"""
+    pyop, ufunc = _opsbyname[opkey]
+    if (
+        buf is not None and type(buf) is np.ndarray
+        and not isinstance(a, np.ma.MaskedArray)
+        and not isinstance(b, np.ma.MaskedArray)
+        and np.result_type(a, b) == buf.dtype
+        and np.broadcast(a, b).shape == buf.shape
+    ):
+        return ufunc(a, b, out=buf)
+    return pyop(a, b)
+
+
+def _unary(opkey, a, buf=None):
+    """Apply opkey to a writing into buf if types allow"""
+    pyop, ufunc = _opsbyname[opkey]
+    if buf is not None and type(buf) is np.ndarray:
+        return ufunc(a, out=buf)
+    return pyop(a)
+
+
+_opsbyname = {
+    k.__name__: v for k, v in list(_binops.items()) + list(_unaryops.items())
+}
+
+
+def compileexpr(exprstr):
+    """
+    Compile expression text into a callable that is equivalent to
+    infile.eval(exprstr, inplace=False).
+
+    The text is parsed once. Repeated subexpressions (e.g., a factor like
+    SpeciesBC_BCPI[:] * 0.012 used by AECI and AECJ) are evaluated once,
+    assignments that are overwritten before use are dropped, and
+    intermediates are overwritten in place (ufunc out=) when nothing else
+    uses them. Operations are not reordered, so results are identical to
+    eval. Each output is available as soon as it is computed (see stream).
+
+    Arguments
+    ---------
+    exprstr : str
+        Expressions in the same syntax as the definitions files
+
+    Returns
+    -------
+    func : function
+        func(infile) returns outf like infile.eval(exprstr, inplace=False).
+        func(infile, stream=True) returns (outf, values). outf has the
+        variables (names, dimensions, types and attributes) of the output,
+        but each is computed from the first value of each input, so it is
+        cheap. values yields (key, variable) for each output as soon as it
+        is complete and releases it after, so outputs need not be held at
+        once. values is None if the program depends on the shape of the
+        inputs or is not compiled; outf is then complete.
+        func.source has the generated program or None if the text uses
+        syntax the compiler does not support; in that case, func calls
+        infile.eval.
+    """
+    from symtable import symtable
+
+    symbols = symtable(exprstr, '<pncexpr>', 'exec').get_symbols()
+    symkeys = [s.get_name() for s in symbols]
+    assignedkeys = [s.get_name() for s in symbols if s.is_assigned()]
+    prog = _Program()
+    try:
+        for stmt in ast.parse(exprstr).body:
+            prog.statement(stmt)
+    except _Unsupported:
+        def evalfunc(infile, stream=False):
+            outf = infile.eval(exprstr, inplace=False)
+            if stream:
+                return outf, None
+            return outf
+
+        evalfunc.source = None
+        evalfunc.exprstr = exprstr
+        return evalfunc
+
+    outputs = [(key,) + prog.env[key] for key in assignedkeys]
+    # live nodes are those needed by an output or an output property
+    needed = [nid for key, nid, cands in outputs]
+    for key, nid, cands in outputs:
+        for leaf, patches in cands:
+            needed.extend([pnid for attr, pnid in patches])
+    keep = set(needed)
+    needed.extend(prog.effects)
+    live = set()
+    stack = list(needed)
+    while len(stack) > 0:
+        nid = stack.pop()
+        if nid in live:
+            continue
+        live.add(nid)
+        stack.extend(_deps(prog.nodes[nid]))
+
+    nuses = {}
+    lastuse = {}
+    for nid in sorted(live):
+        for dep in _deps(prog.nodes[nid]):
+            nuses[dep] = nuses.get(dep, 0) + 1
+            lastuse[dep] = nid
+
+    lines = ['def _program(_V, _first=False):']
+    consts = {}
+    for nid in sorted(live):
+        node = prog.nodes[nid]
+        kind = node[0]
+        if kind == 'const':
+            consts[f'_n{nid}'] = node[3]
+            continue
+        if kind == 'load':
+            expr = f'_load(_V, {node[1]!r})'
+        elif kind == 'generic':
+            expr = node[1]
+        else:
+            args = [f'_n{d}' for d in node[2:]]
+            # overwrite an operand that is a temporary used only here
+            buf = None
+            for dep in node[2:]:
+                if (
+                    prog.nodes[dep][0] in ('binop', 'unary')
+                    and nuses.get(dep, 0) == 1 and dep not in keep
+                ):
+                    buf = f'_n{dep}'
+                    break
+            fname = {'binop': '_binop', 'unary': '_unary'}[kind]
+            expr = f'{fname}({node[1]!r}, {", ".join(args)}, {buf})'
+        if nid in prog.effects:
+            # not repeated when only the first values are computed
+            lines.append('    if not _first:')
+            lines.append(f'        _n{nid} = {expr}')
+        else:
+            lines.append(f'    _n{nid} = {expr}')
+        dead = [
+            f'_n{d}' for d in sorted(set(_deps(node)))
+            if lastuse.get(d) == nid and prog.nodes[d][0] != 'const'
+        ]
+        if nid in keep:
+            # outputs are yielded when computed, then released when unused
+            lines.append(f'    yield {nid}, _n{nid}')
+            if nid not in lastuse:
+                dead.append(f'_n{nid}')
+        if len(dead) > 0:
+            lines.append(f'    del {", ".join(dead)}')
+    # constant outputs (e.g., units) first; always a generator
+    lines[1:1] = [
+        f'    yield {nid}, _n{nid}' for nid in sorted(keep)
+        if prog.nodes[nid][0] == 'const'
+    ]
+    lines.append('    yield from ()')
+    source = '\n'.join(lines)
+    namespace = dict(_load=_load, _binop=_binop, _unary=_unary, np=np)
+    namespace.update(consts)
+    exec(compile(source, '<aqmbc.exprlib>', 'exec'), namespace)
+    program = namespace['_program']
+
+    def compiledfunc(infile, stream=False):
+        if not stream:
+            return _runprogram(infile, program, exprstr, symkeys, outputs)
+        try:
+            outf = _runprogram(
+                infile, program, exprstr, symkeys, outputs, first=True
+            )
+        except (IndexError, ValueError):
+            # e.g., B[:, 5] cannot be computed from the first value
+            return _runprogram(
+                infile, program, exprstr, symkeys, outputs
+            ), None
+        values = _streamprogram(infile, program, exprstr, symkeys, outputs)
+        return outf, values
+
+    compiledfunc.source = source
+    compiledfunc.exprstr = exprstr
+    return compiledfunc
+
+
+def _deps(node):
+    if node[0] in ('binop', 'unary'):
+        return node[2:]
+    if node[0] == 'generic':
+        return node[2]
+    return ()
+
+
+def _vardict(infile, first=False):
+    """
+    Names available to expressions like PseudoNetCDFFile.eval. If first,
+    variables are sliced to their first value.
+    """
+    vardict = {}
+    for key, var in infile.variables.items():
+        ndim = len(getattr(var, 'dimensions', ()))
+        if first and ndim > 0:
+            var = var[(slice(0, 1),) * ndim]
+        vardict[key] = var
+    for pk in infile.ncattrs():
+        if pk not in vardict:
+            vardict[pk] = getattr(infile, pk)
+    vardict['np'] = np
+    vardict['self'] = infile
+    vardict['outf'] = infile
+    return vardict
+
+
+def _outfile(infile, vardict, exprstr, symkeys):
+    """
+    Make outf, the default dimensions and the default properties the same
+    way PseudoNetCDFFile.eval does.
+    """
+    import PseudoNetCDF as pnc
+
+    for key in symkeys:
+        if key in vardict:
+            tmpvar = vardict[key]
+            if hasattr(tmpvar, 'dimensions') and hasattr(tmpvar, 'ncattrs'):
+                break
+    else:
+        key = 'N/A'
+        tmpvar = pnc.PseudoNetCDFVariable(None, 'temp', 'f', ())
+
+    outf = infile.subsetVariables([key])
+    try:
+        del outf.variables[key]
+    except Exception:
+        pass
+    propd = dict([(k, getattr(tmpvar, k)) for k in tmpvar.ncattrs()])
+    propd['expression'] = exprstr
+    return outf, tmpvar.dimensions, propd
+
+
+def _addoutputs(outf, vardict, program, outputs, dimt, propd, first=False):
+    """
+    Run a compiled program and add each output to outf the same way
+    PseudoNetCDFFile.eval does. (key, variable) is yielded as soon as an
+    output and the properties it inherits are computed. If first, vardict
+    has first values (see _vardict) and side effects are skipped.
+    """
+    from PseudoNetCDF.core._variables import PseudoNetCDFVariable
+
+    # nodes of each output: its value and patched properties
+    pending = {}
+    for key, nid, cands in outputs:
+        for leaf, patches in cands:
+            leafvar = vardict.get(leaf, None)
+            if isinstance(leafvar, PseudoNetCDFVariable):
+                break
+        else:
+            leafvar = None
+        if leafvar is None or leafvar.dimensions == ():
+            leafvar, patches = None, ()
+        pending[key] = (nid, leafvar, patches)
+    nneed = {}
+    for nid, leafvar, patches in pending.values():
+        for need in set([nid] + [pnid for attr, pnid in patches]):
+            nneed[need] = nneed.get(need, 0) + 1
+
+    values = {}
+    used = set()
+    for knid, kval in program(vardict, first):
+        values[knid] = kval
+        del kval
+        ready = [
+            key for key, (nid, leafvar, patches) in pending.items()
+            if all([
+                need in values for need in [nid] + [p for a, p in patches]
+            ])
+        ]
+        for key in ready:
+            nid, leafvar, patches = pending.pop(key)
+            val = values[nid]
+            if nid in used and isinstance(val, np.ndarray):
+                # eval would have made separate arrays
+                val = val.copy()
+            used.add(nid)
+            if leafvar is not None:
+                props = {k: leafvar.getncattr(k) for k in leafvar.ncattrs()}
+                for attr, pnid in patches:
+                    props[attr] = values[pnid]
+                outf.variables[key] = PseudoNetCDFVariable(
+                    outf, key, val.dtype.char, leafvar.dimensions,
+                    values=val, **props
+                )
+            else:
+                outf.createVariable(
+                    key, val.dtype.char, dimt, values=val, **propd
+                )
+            del val
+            for need in set([nid] + [pnid for attr, pnid in patches]):
+                nneed[need] -= 1
+                if nneed[need] == 0:
+                    del values[need]
+            yield key, outf.variables[key]
+
+
+def _runprogram(infile, program, exprstr, symkeys, outputs, first=False):
+    """
+    Run a compiled program and build outf the same way
+    PseudoNetCDFFile.eval does. If first, outputs are computed from the
+    first value of each input (see compileexpr).
+    """
+    vardict = _vardict(infile, first=first)
+    outf, dimt, propd = _outfile(infile, vardict, exprstr, symkeys)
+    initkeys = set(outf.variables)
+    for key, var in _addoutputs(
+        outf, vardict, program, outputs, dimt, propd, first=first
+    ):
+        pass
+    # outputs are complete in any order, but are stored in assigned order
+    for key, nid, cands in outputs:
+        if key not in initkeys:
+            outf.variables[key] = outf.variables.pop(key)
+
+    return outf
+
+
+def _streamprogram(infile, program, exprstr, symkeys, outputs):
+    """
+    Run a compiled program and yield (key, variable) for each output as soon
+    as it is complete (see compileexpr). Each is released once yielded.
+    """
+    vardict = _vardict(infile)
+    outf, dimt, propd = _outfile(infile, vardict, exprstr, symkeys)
+    for key, var in _addoutputs(outf, vardict, program, outputs, dimt, propd):
+        del outf.variables[key]
+        yield key, var
+        del var
+
+
+def compileexprpaths(exprpaths):
+    """
+    Read and join exprpaths like bcon.translate and apply compileexpr. The
+    compiled function is cached by the content of exprpaths (see loadexprs).
+
+    Arguments
+    ---------
+    exprpaths : list
+        paths to expr file
+
+    Returns
+    -------
+    func : function
+        see compileexpr
+    """
+    exprs = loadexprs(exprpaths)
+    if exprs.key not in _compiledcache:
+        _compiledcache[exprs.key] = compileexpr(exprs.text)
+    return _compiledcache[exprs.key]
+
+
+ExprSet = namedtuple(
+    'ExprSet', ['paths', 'key', 'text', 'rawtext', 'symbols', 'inputs',
+                'outputs']
+)
+ExprSet.__doc__ = """
+Parsed expression files
+
+paths : tuple
+    expression file paths
+key : str
+    sha1 of the file contents (in order)
+text : str
+    stripped file contents joined by newlines (as evaluated)
+rawtext : str
+    file contents joined (as stored in description)
+symbols : tuple
+    all names in symtable order
+inputs : tuple
+    names that are read (may include outputs like O3 = O3 * 1e3)
+outputs : tuple
+    names that are assigned
+"""
+
+# (abspath, mtime_ns, size) -> (sha1, text)
+_filecache = {}
+# sha1 of all files -> ExprSet
+_exprcache = {}
+# sha1 of all files -> compileexpr output (not shared with workers)
+_compiledcache = {}
+
+
+def _readexpr(path):
+    stat = os.stat(path)
+    filekey = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if filekey not in _filecache:
+        with open(path, 'r') as exprfile:
+            text = exprfile.read()
+        digest = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        _filecache[filekey] = (digest, text)
+    return _filecache[filekey]
+
+
+def loadexprs(exprpaths):
+    """
+    Read and parse expression files. Files are read again only if their
+    mtime or size changed, and parsing is reused for identical contents.
+
+    Arguments
+    ---------
+    exprpaths : list
+        paths to expr file
+
+    Returns
+    -------
+    exprs : ExprSet
+        text, symbols, inputs and outputs of the expressions
+    """
+    from symtable import symtable
+
+    exprpaths = tuple(exprpaths)
+    records = [_readexpr(p) for p in exprpaths]
+    digests = [digest for digest, text in records]
+    texts = [text for digest, text in records]
+    key = hashlib.sha1(' '.join(digests).encode('utf-8')).hexdigest()
+    if key not in _exprcache:
+        text = '\n'.join([t.strip() for t in texts])
+        symbols = symtable(text, '<bcon>', 'exec').get_symbols()
+        _exprcache[key] = ExprSet(
+            paths=exprpaths, key=key, text=text, rawtext=''.join(texts),
+            symbols=tuple([s.get_name() for s in symbols]),
+            inputs=tuple([
+                s.get_name() for s in symbols if s.is_referenced()
+            ]),
+            outputs=tuple([s.get_name() for s in symbols if s.is_assigned()])
+        )
+    exprs = _exprcache[key]
+    if exprs.paths != exprpaths:
+        exprs = exprs._replace(paths=exprpaths)
+    return exprs
+
+
+def getexprcache():
+    """
+    Returns
+    -------
+    cache : dict
+        file and expression caches; picklable for setexprcache in workers
+    """
+    return dict(files=dict(_filecache), exprs=dict(_exprcache))
+
+
+def setexprcache(cache=None):
+    """
+    Arguments
+    ---------
+    cache : dict or None
+        output of getexprcache (e.g., from a parent process)
+
+    Returns
+    -------
+    None
+    """
+    if cache is not None:
+        _filecache.update(cache['files'])
+        _exprcache.update(cache['exprs'])
+
+
 gc12 = exprpaths(['gcnc_airmolden.expr', 'gc12_to_cb6r3.expr',
                   'gc12_to_cb6mp.expr', 'gc12_to_ae7.expr'], prefix='gc')
 gc12_soas = gc12[:-1] + exprpaths(['gc12_soas_to_ae7.expr'], 'gc')
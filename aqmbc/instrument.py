@@ -0,0 +1,138 @@
+__all__ = ['StageLog', 'usage']
+__doc__ = """
+Per-stage instrumentation for bc and runcfg.
+
+Each stage records wall time, CPU time, peak resident memory increase and
+bytes read/written by the process. Memory and I/O use resource and
+/proc/self/io when available (Linux and macOS); otherwise they are nan.
+
+Example
+=======
+
+log = StageLog()
+with log.stage('open'):
+    f = pnc.pncopen(inpath, format='ioapi')
+print(log.todataframe())
+"""
+import sys
+import time
+from contextlib import contextmanager
+
+_fields = ('wall', 'cpu', 'maxrss_delta', 'read_bytes', 'write_bytes')
+
+
+def usage():
+    """
+    Returns
+    -------
+    out : dict
+        wall (s, perf_counter), cpu (s, process_time), maxrss (bytes, peak
+        resident memory so far), read_bytes and write_bytes (bytes passed to
+        read and write system calls so far).
+    """
+    out = dict(
+        wall=time.perf_counter(), cpu=time.process_time(),
+        maxrss=float('nan'), read_bytes=float('nan'),
+        write_bytes=float('nan')
+    )
+    try:
+        import resource
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux and bytes on macOS
+        out['maxrss'] = maxrss * (1 if sys.platform == 'darwin' else 1024)
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/io', 'r') as iof:
+            iod = dict([line.split(':') for line in iof if ':' in line])
+        out['read_bytes'] = int(iod['rchar'])
+        out['write_bytes'] = int(iod['wchar'])
+    except (OSError, KeyError, ValueError):
+        pass
+
+    return out
+
+
+class StageLog:
+    def __init__(self, verbose=0, **info):
+        """
+        Collect one record per stage. Records are dictionaries so that they
+        can be returned from worker processes and written to csv.
+
+        Arguments
+        ---------
+        verbose : int
+            If > 0, print each stage name as it starts (the progress markers
+            previously printed by bc).
+        info : mappable
+            Added to every record (e.g., inpath and outpath).
+        """
+        self.verbose = verbose
+        self.info = info
+        self.records = []
+
+    @contextmanager
+    def stage(self, name, **info):
+        """
+        Context manager that records usage of the enclosed block.
+
+        Arguments
+        ---------
+        name : str
+            Stage name (e.g., open, wndw, ijslice, kinterp, translate, save)
+        info : mappable
+            Added to this record (e.g., chunk)
+
+        Yields
+        ------
+        record : dict
+            Record that is filled when the block exits. The record is kept
+            even if the block raises.
+        """
+        if self.verbose > 0:
+            print(name, flush=True)
+        record = dict(self.info)
+        record['stage'] = name
+        record.update(info)
+        start = usage()
+        try:
+            yield record
+        finally:
+            end = usage()
+            record['wall'] = end['wall'] - start['wall']
+            record['cpu'] = end['cpu'] - start['cpu']
+            record['maxrss_delta'] = end['maxrss'] - start['maxrss']
+            record['read_bytes'] = end['read_bytes'] - start['read_bytes']
+            record['write_bytes'] = end['write_bytes'] - start['write_bytes']
+            self.records.append(record)
+
+    def total(self):
+        """
+        Returns
+        -------
+        out : dict
+            Sum of wall, cpu, read_bytes and write_bytes and max of
+            maxrss_delta across records.
+        """
+        out = {}
+        for key in _fields:
+            vals = [r[key] for r in self.records]
+            if key == 'maxrss_delta':
+                out[key] = max(vals) if len(vals) > 0 else 0
+            else:
+                out[key] = sum(vals)
+        return out
+
+    def todataframe(self):
+        """
+        Returns
+        -------
+        df : pandas.DataFrame
+            One row per record
+        """
+        import pandas as pd
+        return pd.DataFrame.from_records(self.records)
+
+    def to_csv(self, path):
+        """Write records to path as csv (see todataframe)"""
+        self.todataframe().to_csv(path, index=False)
@@ -0,0 +1,249 @@
+__all__ = [
+    'atomicwrite', 'temppath', 'fingerprint', 'confighash', 'checksum',
+    'readmanifest', 'writemanifest', 'iscurrent', 'makerecord'
+]
+__doc__ = """
+Crash-safe outputs and a run manifest for resuming runcfg.
+
+* atomicwrite : write to a temporary path that replaces the output only when
+  complete, so a stopped run never leaves a partial output.
+* temppath : the temporary path used by atomicwrite (for outputs that stay
+  open across functions, e.g., bc with tchunk).
+* fingerprint : size and modification time of input files.
+* confighash : sha1 of the options that define an output.
+* checksum : size, modification time and sha1 of an output file.
+* readmanifest/writemanifest : records (one per output path) with label,
+  input fingerprint, config hash, output checksum and status.
+* iscurrent : True if a record still describes an output, its inputs and
+  its configuration.
+
+Example
+=======
+
+records = readmanifest('manifest.json')
+record = records.get(outpath)
+if not iscurrent(record, inpath, config, outpath):
+    with atomicwrite(outpath) as tmppath:
+        make(inpath, tmppath, **config)
+    records[outpath] = makerecord(label, inpath, config, outpath, 'ok')
+    writemanifest('manifest.json', records)
+"""
+import os
+import json
+import hashlib
+from contextlib import contextmanager
+
+
+def temppath(path):
+    """Temporary path for path in the same folder (see atomicwrite)"""
+    return f'{path}.{os.getpid()}.tmp'
+
+
+@contextmanager
+def atomicwrite(path):
+    """
+    Arguments
+    ---------
+    path : str
+        Final output path
+
+    Yields
+    ------
+    tmppath : str
+        Temporary path in the same folder. When the block completes, tmppath
+        replaces path (os.replace). If the block fails, tmppath is removed
+        and path is unchanged.
+    """
+    tmppath = temppath(path)
+    try:
+        yield tmppath
+        os.replace(tmppath, path)
+    finally:
+        if os.path.exists(tmppath):
+            os.remove(tmppath)
+
+
+def fingerprint(inpaths):
+    """
+    Arguments
+    ---------
+    inpaths : str or list
+        Input paths. Paths that are not local files (e.g., urls) are
+        identified only by the path.
+
+    Returns
+    -------
+    fp : list
+        [path, size, mtime_ns] for each path (size and mtime_ns are None if
+        path is not a file)
+    """
+    if isinstance(inpaths, str):
+        inpaths = [inpaths]
+    fp = []
+    for inpath in inpaths:
+        if os.path.isfile(inpath):
+            pstat = os.stat(inpath)
+            fp.append([inpath, pstat.st_size, pstat.st_mtime_ns])
+        else:
+            fp.append([inpath, None, None])
+    return fp
+
+
+def confighash(config):
+    """
+    Arguments
+    ---------
+    config : mappable
+        JSON-serializable options (non-serializable values use str)
+
+    Returns
+    -------
+    key : str
+        sha1 of config with sorted keys
+    """
+    text = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def checksum(path, blocksize=2**24):
+    """
+    Arguments
+    ---------
+    path : str
+        Output path
+    blocksize : int
+        Bytes read at a time
+
+    Returns
+    -------
+    out : dict
+        size, mtime_ns and sha1 of path
+    """
+    pstat = os.stat(path)
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as inf:
+        for block in iter(lambda: inf.read(blocksize), b''):
+            sha1.update(block)
+    return dict(
+        size=pstat.st_size, mtime_ns=pstat.st_mtime_ns, sha1=sha1.hexdigest()
+    )
+
+
+def makerecord(
+    label, inpaths, config, outpath, status, message='', previous=None
+):
+    """
+    Arguments
+    ---------
+    label : str
+        Label of the output (e.g., BCON 2022-01-01T00)
+    inpaths : str or list
+        Inputs (see fingerprint)
+    config : mappable
+        Options (see confighash)
+    outpath : str
+        Output path. The checksum is None if outpath does not exist.
+    status : str
+        ok, cached or failed
+    message : str
+        Error message, if any
+    previous : dict or None
+        Earlier record for outpath. If status is cached and its output
+        still has the same size and modification time, its checksum is
+        reused instead of reading outpath again.
+
+    Returns
+    -------
+    record : dict
+        label, input (fingerprint), config (confighash), output (checksum),
+        status and message
+    """
+    output = None
+    if status != 'failed' and os.path.exists(outpath):
+        oldoutput = None if previous is None else previous.get('output')
+        pstat = os.stat(outpath)
+        if (
+            status == 'cached' and oldoutput is not None
+            and oldoutput['size'] == pstat.st_size
+            and oldoutput['mtime_ns'] == pstat.st_mtime_ns
+        ):
+            output = oldoutput
+        else:
+            output = checksum(outpath)
+    return dict(
+        label=label, input=fingerprint(inpaths), config=confighash(config),
+        output=output, status=status, message=message
+    )
+
+
+def iscurrent(record, inpaths, config, outpath):
+    """
+    Arguments
+    ---------
+    record : dict or None
+        Record from makerecord (e.g., from readmanifest)
+    inpaths, config, outpath :
+        Current inputs, options and output (see makerecord)
+
+    Returns
+    -------
+    current : bool
+        True if record finished (ok or cached), inputs and config are the
+        same, and outpath is unchanged. outpath is only read (sha1) if its
+        size or modification time changed.
+    """
+    if record is None or record.get('status') not in ('ok', 'cached'):
+        return False
+    if record['input'] != fingerprint(inpaths):
+        return False
+    if record['config'] != confighash(config):
+        return False
+    output = record.get('output')
+    if output is None or not os.path.exists(outpath):
+        return False
+    pstat = os.stat(outpath)
+    if pstat.st_size != output['size']:
+        return False
+    if pstat.st_mtime_ns == output['mtime_ns']:
+        return True
+    return checksum(outpath)['sha1'] == output['sha1']
+
+
+def readmanifest(path):
+    """
+    Arguments
+    ---------
+    path : str
+        Manifest path (JSON)
+
+    Returns
+    -------
+    records : dict
+        Records keyed by output path; empty if path does not exist.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as inf:
+        return json.load(inf)['records']
+
+
+def writemanifest(path, records):
+    """
+    Arguments
+    ---------
+    path : str
+        Manifest path (JSON); replaced atomically (see atomicwrite)
+    records : dict
+        Records keyed by output path (see makerecord)
+
+    Returns
+    -------
+    path : str
+    """
+    outdir = os.path.dirname(path)
+    if outdir != '':
+        os.makedirs(outdir, exist_ok=True)
+    with atomicwrite(path) as tmppath:
+        with open(tmppath, 'w') as outf:
+            json.dump(dict(records=records), outf, indent=1)
+    return path
@@ -1,7 +1,11 @@
-__all__ = ['raqms', 'geoscf', 'geoschem', 'tcr', 'waccm']
+__all__ = [
+    'raqms', 'geoscf', 'geoschem', 'tcr', 'waccm', 'util', 'download'
+]
 
 from . import raqms
 from . import geoscf
 from . import geoschem
 from . import waccm
 from . import tcr
+from . import util
+from . import download
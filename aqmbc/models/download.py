@@ -0,0 +1,290 @@
+__all__ = ['download', 'fetch', 'requeststransport', 'urllibtransport']
+__doc__ = """
+Shared downloader for model source files (see waccm, raqms and tcr).
+
+* download : fetch many urls with a bounded thread pool.
+* fetch : fetch one url to dest.part, resuming with HTTP Range requests and
+  retrying with exponential backoff; dest.part is verified (size and,
+  optionally, checksum) before it is renamed to dest, so dest is never
+  partial.
+* requeststransport/urllibtransport : transports (requests is used when
+  installed; otherwise urllib). Any function with the same signature can be
+  used (e.g., for a local server or authentication).
+
+Example
+=======
+
+from aqmbc.models.download import download
+download(
+    ['https://example.org/a.nc', 'https://example.org/b.nc'],
+    ['SRC/a.nc', 'SRC/b.nc'], workers=2
+)
+"""
+import os
+import time
+
+
+class _Retry(Exception):
+    """Raised for failures that a later attempt may fix"""
+    pass
+
+
+def requeststransport(url, headers=None, timeout=60):
+    """
+    Arguments
+    ---------
+    url : str
+        Url to get
+    headers : dict or None
+        Request headers (e.g., Range)
+    timeout : float
+        Seconds to wait for the server
+
+    Returns
+    -------
+    response : requests.Response
+        Context manager with status_code, headers and iter_content
+    """
+    import requests
+    return requests.get(url, headers=headers, stream=True, timeout=timeout)
+
+
+class _UrllibResponse:
+    """urllib response with the parts of requests.Response used by fetch"""
+    def __init__(self, resp, status_code):
+        self._resp = resp
+        self.status_code = status_code
+        self.headers = resp.headers
+
+    def iter_content(self, chunk_size=2**20):
+        while True:
+            chunk = self._resp.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        self._resp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def urllibtransport(url, headers=None, timeout=60):
+    """Same as requeststransport, but uses urllib (no extra dependency)"""
+    import urllib.request
+    import urllib.error
+    req = urllib.request.Request(url, headers=headers or {})
+    try:
+        resp = urllib.request.urlopen(req, timeout=timeout)
+        status = resp.status
+    except urllib.error.HTTPError as e:
+        resp = e
+        status = e.code
+    return _UrllibResponse(resp, status)
+
+
+def _defaulttransport():
+    try:
+        import requests  # noqa: F401
+        return requeststransport
+    except ImportError:
+        return urllibtransport
+
+
+def _contentrange(headers):
+    """(first byte, total size) from Content-Range; None if not known"""
+    crange = headers.get('Content-Range', headers.get('content-range'))
+    if crange is None:
+        return None, None
+    span, total = crange.split()[-1].split('/')
+    first = None if span == '*' else int(span.split('-')[0])
+    total = None if total == '*' else int(total)
+    return first, total
+
+
+def _checksumok(path, checksum, blocksize=2**24):
+    """True if path matches checksum (algorithm:hexdigest, e.g., md5:...)"""
+    import hashlib
+    algo, expected = checksum.split(':', 1)
+    hasher = hashlib.new(algo)
+    with open(path, 'rb') as inf:
+        for block in iter(lambda: inf.read(blocksize), b''):
+            hasher.update(block)
+    return hasher.hexdigest().lower() == expected.strip().lower()
+
+
+def _fetchpart(url, partpath, transport, blocksize, timeout):
+    """
+    Add to partpath the bytes of url that it does not have.
+
+    Returns
+    -------
+    total : int or None
+        Size of url reported by the server (None if not reported)
+    """
+    start = os.path.getsize(partpath) if os.path.exists(partpath) else 0
+    headers = {}
+    if start > 0:
+        headers['Range'] = f'bytes={start}-'
+    with transport(url, headers=headers, timeout=timeout) as r:
+        status = r.status_code
+        if status == 416 and start > 0:
+            # nothing left to get; size is checked by fetch
+            return _contentrange(r.headers)[1]
+        if status in (408, 429) or status >= 500:
+            raise _Retry(f'HTTP {status}')
+        if status >= 400:
+            raise RuntimeError(f'{url}: HTTP {status}')
+        if status == 206:
+            first, total = _contentrange(r.headers)
+            if first != start:
+                os.remove(partpath)
+                raise _Retry(f'asked for byte {start}; got {first}')
+            mode = 'ab'
+        else:
+            # server ignored Range; start over
+            mode = 'wb'
+            total = int(r.headers.get('Content-Length', 0)) or None
+        with open(partpath, mode) as outf:
+            for chunk in r.iter_content(chunk_size=blocksize):
+                outf.write(chunk)
+    return total
+
+
+def fetch(
+    url, dest, size=None, checksum=None, transport=None, retries=5,
+    backoff=1., blocksize=2**20, timeout=60, verbose=1
+):
+    """
+    Arguments
+    ---------
+    url : str
+        Url to download
+    dest : str
+        Output path. If dest exists, it is used as is.
+    size : int or None
+        Expected size in bytes. If None, the size reported by the server (if
+        any) is checked.
+    checksum : str or None
+        Expected checksum as algorithm:hexdigest (e.g., md5:d41d8cd9...)
+    transport : function or None
+        transport(url, headers=headers, timeout=timeout) returns a response
+        like requests.Response (see requeststransport). If None, use
+        requeststransport if requests is installed; otherwise
+        urllibtransport.
+    retries : int
+        Attempts after the first. Each attempt resumes from dest + '.part'.
+    backoff : float
+        Seconds before the first retry; doubled for each retry.
+    blocksize : int
+        Bytes written at a time
+    timeout : float
+        Seconds to wait for the server
+    verbose : int
+        Level of verbosity
+
+    Returns
+    -------
+    dest : str
+        Output path
+    """
+    from http.client import HTTPException
+
+    if os.path.exists(dest):
+        if verbose > 0:
+            print(f'Using cached {dest}')
+        return dest
+    if transport is None:
+        transport = _defaulttransport()
+    outdir = os.path.dirname(dest)
+    if outdir != '':
+        os.makedirs(outdir, exist_ok=True)
+    partpath = dest + '.part'
+    for attempt in range(retries + 1):
+        try:
+            total = _fetchpart(url, partpath, transport, blocksize, timeout)
+            if size is not None:
+                total = size
+            psize = os.path.getsize(partpath)
+            if total is not None and psize != total:
+                if psize > total:
+                    os.remove(partpath)
+                raise _Retry(f'got {psize} of {total} bytes')
+            if checksum is not None and not _checksumok(partpath, checksum):
+                os.remove(partpath)
+                raise _Retry(f'{checksum} does not match')
+            os.replace(partpath, dest)
+            if verbose > 0:
+                print(f'Downloaded {dest} ({psize / 1024**2:.1f} MB)')
+            return dest
+        except (OSError, HTTPException, _Retry) as e:
+            msg = f'{type(e).__name__}: {e}'
+            if attempt == retries:
+                raise IOError(
+                    f'{url} failed after {retries + 1} attempts; {msg}'
+                )
+            wait = backoff * 2**attempt
+            if verbose > 0:
+                print(f'{url} attempt {attempt + 1} failed ({msg});'
+                      f' retrying in {wait:.0f}s', flush=True)
+            time.sleep(wait)
+
+
+def download(
+    urls, dests, sizes=None, checksums=None, workers=4, transport=None,
+    retries=5, backoff=1., blocksize=2**20, timeout=60, verbose=1
+):
+    """
+    Fetch each url to its dest with up to workers concurrent downloads.
+
+    Arguments
+    ---------
+    urls : list
+        Urls to download
+    dests : list
+        Output path for each url
+    sizes, checksums : list or None
+        Expected size and checksum for each url (see fetch)
+    workers : int
+        Maximum number of concurrent downloads
+    transport, retries, backoff, blocksize, timeout, verbose :
+        See fetch
+
+    Returns
+    -------
+    dests : list
+        Output paths. If any url fails, a RuntimeError is raised after all
+        urls have been attempted.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    urls = list(urls)
+    dests = list(dests)
+    if sizes is None:
+        sizes = [None] * len(urls)
+    if checksums is None:
+        checksums = [None] * len(urls)
+    workers = max(1, min(workers, len(urls)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                fetch, url, dest, size=size, checksum=checksum,
+                transport=transport, retries=retries, backoff=backoff,
+                blocksize=blocksize, timeout=timeout, verbose=verbose
+            )
+            for url, dest, size, checksum in zip(urls, dests, sizes, checksums)
+        ]
+    failed = []
+    for url, future in zip(urls, futures):
+        try:
+            future.result()
+        except Exception as e:
+            failed.append(f'{url} ({e})')
+    if len(failed) > 0:
+        raise RuntimeError(f'{len(failed)} downloads failed: {failed}')
+
+    return dests
@@ -1,54 +1,240 @@
 __all__ = ['download_window']
+__doc__ = """
+GEOS-CF reader (geoscf) and OpenDAP downloader (download_window).
+
+download_window requests several hours at a time, fetches met, chm and xgc
+concurrently (up to workers requests), and backs off when the server fails.
+With perimeter=True, only bands around the BCON perimeter are requested.
+
+Example
+=======
+
+from aqmbc.models.geoscf import download_window
+download_window(
+    '12US1', ['2023-04-15T00:30', '2023-04-15T01:30'], batch=2,
+    perimeter=True, chmvars=['o3', 'so4'], xgcvars=[]
+)
+"""
 import PseudoNetCDF as pnc
 
+_rooturl = 'https://opendap.nccs.nasa.gov/dods/gmao/geos-cf/assim'
+
+
+# datasets opened by _fetchone in this process (one per worker)
+_opened = {}
+
+
+def _fetchone(url, varkeys, itime, windows):
+    """
+    Subset url (time indices and each lon/lat window) and load it into
+    memory. url is opened once per process and kept open for later requests
+    (see _closeall); it is reopened after a failure.
+    """
+    import xarray as xr
+    f = _opened.get(url)
+    if f is None:
+        f = _opened[url] = xr.open_dataset(url)
+    try:
+        tf = f[varkeys].isel(time=itime)
+        out = None
+        for xlim, ylim in windows:
+            wf = tf.sel(lon=xlim, lat=ylim).load()
+            out = wf if out is None else out.combine_first(wf)
+    except Exception:
+        _opened.pop(url).close()
+        raise
+    return out
+
+
+def _closeall():
+    """Close datasets opened by _fetchone in this process"""
+    while len(_opened) > 0:
+        _opened.popitem()[1].close()
+
+
+def _executor(workers):
+    """
+    Pool for _fetchall. If workers > 1, requests use separate processes
+    (netCDF reads in one process are serialized); otherwise, one thread.
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    if workers > 1:
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=1)
 
-def tryandtime(tmpf, label, verbose=1):
+
+def _fetchall(
+    tasks, executor, workers=3, maxtries=10, backoff=10., verbose=1
+):
     """
-    This function tries to download data in tmpf via OpenDAP. If it fails,
-    then it tries again up to maxtries. The entire process is timed.
+    Run _fetchone for each task with at most workers concurrent requests.
+
+    When a request fails, it is resubmitted, the number of concurrent
+    requests is halved and the next request waits backoff seconds (doubled
+    for each consecutive failure up to 32 * backoff). Each success adds one
+    concurrent request (up to workers) and halves the wait.
 
     Arguments
     ---------
-    tmpf : xarray.Dataset
-        File from GEOS-CF
+    tasks : list
+        (label, url, varkeys, itime, windows) for each request
+    executor : concurrent.futures.Executor
+        Pool with at least workers workers (see _executor)
+    workers : int
+        Maximum concurrent requests
+    maxtries : int
+        Maximum attempts per request
+    backoff : float
+        Seconds to wait after the first failure
     verbose : int
         Level of verbosity
 
     Returns
     -------
-    dt : float
-        Time elapsed.
+    results : list
+        xarray.Dataset for each task
     """
     import time
+    from concurrent.futures import wait, FIRST_COMPLETED
 
-    maxtries = 10
-    t0 = time.time()
-    ntries = 0
-    success = False
-    while not success and ntries < maxtries:
-        ntries += 1
-        try:
-            # Might fail
-            tmpf.load()
-            success = True
-        except Exception as e:
-            if verbose > 0:
-                print(str(e), end='.retry.')
+    workers = max(1, min(workers, len(tasks)))
+    pending = list(range(len(tasks)))
+    ntries = [0] * len(tasks)
+    starts = [0.] * len(tasks)
+    results = [None] * len(tasks)
+    running = {}
+    limit = workers
+    delay = 0.
+    try:
+        while len(pending) > 0 or len(running) > 0:
+            while len(pending) > 0 and len(running) < limit:
+                ti = pending.pop(0)
+                ntries[ti] += 1
+                starts[ti] = time.time()
+                future = executor.submit(_fetchone, *tasks[ti][1:])
+                running[future] = ti
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                ti = running.pop(future)
+                label = tasks[ti][0]
+                try:
+                    results[ti] = future.result()
+                except Exception as e:
+                    if ntries[ti] >= maxtries:
+                        raise IOError(
+                            f'{label} failed after {ntries[ti]} tries; {e}'
+                        )
+                    limit = max(1, limit // 2)
+                    delay = min(backoff * 32, max(backoff, delay * 2))
+                    if verbose > 0:
+                        print(f'{label} failed ({e}); retrying in'
+                              f' {delay:.0f}s with {limit} concurrent',
+                              flush=True)
+                    pending.insert(0, ti)
+                    continue
+                limit = min(workers, limit + 1)
+                delay = delay / 2
+                if verbose > 0:
+                    dt = time.time() - starts[ti]
+                    msg = f'{label} {dt:.0f}s'
+                    if ntries[ti] > 1:
+                        msg = f'{msg} ({ntries[ti]} tries)'
+                    print(msg, flush=True)
+            if delay > 0 and len(pending) > 0:
+                time.sleep(delay)
+    except BaseException:
+        # requests not yet started are not run (e.g., on failure or
+        # KeyboardInterrupt)
+        for future in running:
+            future.cancel()
+        raise
+
+    return results
+
+
+def _timebatches(tidx, batch):
+    """
+    Group time indices into requests of up to batch evenly spaced times.
+
+    Returns
+    -------
+    batches : list
+        (positions in tidx, slice of time indices) for each request
+    """
+    batches = []
+    group = []
+    for pos, ti in enumerate(tidx):
+        if len(group) > 0:
+            step = ti - tidx[group[-1]]
+            if len(group) > 1:
+                regular = step == tidx[group[1]] - tidx[group[0]]
+            else:
+                regular = step > 0
+            if len(group) == batch or not regular:
+                batches.append(group)
+                group = []
+        group.append(pos)
+    if len(group) > 0:
+        batches.append(group)
+
+    out = []
+    for group in batches:
+        t0 = tidx[group[0]]
+        t1 = tidx[group[-1]]
+        step = 1 if len(group) == 1 else tidx[group[1]] - t0
+        out.append((group, slice(t0, t1 + 1, step)))
+    return out
+
+
+def _windows(metaf, perimeter=False, nsplit=1, pad=1):
+    """
+    Arguments
+    ---------
+    metaf : PseudoNetCDF.PseudoNetCDFFile
+        BCON metadata with longitude and latitude (PERIM)
+    perimeter : bool
+        If False, one window that bounds the perimeter. If True, nsplit
+        windows for each side (south, east, north, west) of the perimeter.
+    nsplit : int
+        Windows per side. Sides of projected grids are curved in lon/lat, so
+        shorter pieces have thinner windows.
+    pad : float
+        Degrees added to each side of each window
 
-    t1 = time.time()
-    dt = t1 - t0
-    if verbose > 0:
-        msg = f'{label} {dt:.0f}s'
-        if ntries > 1:
-            msg = f'{msg} ({ntries} tries)'
-        print(msg)
+    Returns
+    -------
+    windows : list
+        (xlim, ylim) slices
+    """
+    import numpy as np
 
-    return dt
+    lonp = np.asarray(metaf.variables['longitude'][:]).ravel()
+    latp = np.asarray(metaf.variables['latitude'][:]).ravel()
+    if perimeter:
+        nc = metaf.NCOLS
+        nr = metaf.NROWS
+        nt = getattr(metaf, 'NTHIK', 1)
+        ends = np.cumsum([0, nc + nt, nr + nt, nc + nt, nr + nt]) * nt
+        sides = [
+            piece
+            for s, e in zip(ends[:-1], ends[1:])
+            for piece in np.array_split(np.arange(s, e), nsplit)
+        ]
+    else:
+        sides = [slice(None)]
+    windows = []
+    for side in sides:
+        xlim = slice(lonp[side].min() - pad, lonp[side].max() + pad)
+        ylim = slice(latp[side].min() - pad, latp[side].max() + pad)
+        windows.append((xlim, ylim))
+    return windows
 
 
 def download_window(
     gdnam, dates, sleep=60,
-    metvars=None, chmvars=None, xgcvars=None
+    metvars=None, chmvars=None, xgcvars=None, batch=1, workers=3,
+    perimeter=False, nsplit=1, maxtries=10, backoff=10., rooturl=None,
+    outroot='GEOSCF', verbose=1
 ):
     """
     Arguments
@@ -60,13 +246,42 @@ def download_window(
         Dates to process. Each will be saved separately on disk.
     sleep : int
         GEOS-CF OpenDAP will crash if too many calls are made sequentially.
-        Heuristically, a minute between calls prevents crashes.
+        Heuristically, a minute between calls prevents crashes. Seconds
+        between each batch of requests.
     metvars : list
         Optional list of metvars to subset. See GEOS-CF fluid documentation.
     chemvars : list
         Optional list of chmvars to subset. See GEOS-CF fluid documentation.
     xgcvars : list
         Optional list of xgcvars to subset. See GEOS-CF fluid documentation.
+    batch : int
+        Maximum hours per request. Hours in one request must be evenly
+        spaced (e.g., consecutive).
+    workers : int
+        Maximum concurrent requests (one each for met, chm and xgc). Each
+        worker opens each dataset once. After a failure, fewer requests are
+        made at once.
+    perimeter : bool
+        If True, request only bands around each side of the BCON perimeter
+        instead of the rectangle that bounds it. The rest of the rectangle
+        is saved as missing, so outputs are only useful for BCON.
+    nsplit : int
+        With perimeter, each side is subset as nsplit windows. All windows
+        of a dataset are read from one open dataset.
+    maxtries : int
+        Maximum attempts per request
+    backoff : float
+        Seconds to wait after the first failure; doubled for each
+        consecutive failure.
+    rooturl : str or None
+        Folder (url or local path) with met_tavg_1hr_g1440x721_v36,
+        chm_tavg_1hr_g1440x721_v36 and xgc_tavg_1hr_g1440x721_v36. Defaults
+        to the GMAO OpenDAP server.
+    outroot : str
+        Outputs are saved as
+        {outroot}/{gdnam}/%Y/%m/%d/geoscf_mcx_tavg_1hr_g1440x721_v36_...
+    verbose : int
+        Level of verbosity
 
     Returns
     -------
@@ -75,90 +290,118 @@ def download_window(
     """
     import pandas as pd
     import aqmbc
-    import numpy as np
     import xarray as xr
     import os
     import time
+    from ..manifest import atomicwrite
 
-    sleep = 60
     dates = pd.to_datetime(dates)
     metaf = aqmbc.options.getmetaf(bctype='bcon', gdnam=gdnam)
-    lonp = metaf.variables['longitude']
-    xlim = slice(*np.quantile(lonp, [0, 1]) + np.array([-1, 1]))
-    latp = metaf.variables['latitude']
-    ylim = slice(*np.quantile(latp, [0, 1]) + np.array([-1, 1]))
+    windows = _windows(metaf, perimeter=perimeter, nsplit=nsplit)
 
-    rooturl = 'https://opendap.nccs.nasa.gov/dods/gmao/geos-cf/assim'
+    if rooturl is None:
+        rooturl = _rooturl
     meturl = f'{rooturl}/met_tavg_1hr_g1440x721_v36'
     chmurl = f'{rooturl}/chm_tavg_1hr_g1440x721_v36'
     xgcurl = f'{rooturl}/xgc_tavg_1hr_g1440x721_v36'
 
-    mf = xr.open_dataset(meturl)
-    cf = xr.open_dataset(chmurl)
-    xf = xr.open_dataset(xgcurl)
-
+    # metadata only; files are closed before any process is started
+    with xr.open_dataset(meturl) as mf:
+        mtimes = mf.indexes['time']
     if metvars is None:
         metvars = ['zl', 'airdens', 'ps', 'delp', 'q', 't']
     else:
         metvars = list(metvars)
     if chmvars is None:
-        chmvars = list(cf.data_vars)
+        with xr.open_dataset(chmurl) as cf:
+            chmvars = list(cf.data_vars)
     else:
         chmvars = list(chmvars)
     if xgcvars is None:
-        xgcvars = list(xf.data_vars)
+        with xr.open_dataset(xgcurl) as xf:
+            xgcvars = list(xf.data_vars)
     else:
         xgcvars = list(xgcvars)
+    groups = [('met', meturl, metvars)]
+    if len(chmvars) > 0:
+        groups.append(('chm', chmurl, chmvars))
+    if len(xgcvars) > 0:
+        groups.append(('xgc', xgcurl, xgcvars))
 
     outpaths = []
+    todo = []
     for t in dates:
-        tv = mf.time.sel(time=t, method='nearest').values
-        stime = pd.to_datetime(tv).round('1s').to_pydatetime()
-        outdir = f'GEOSCF/{gdnam}/{stime:%Y/%m/%d}'
+        ti = mtimes.get_indexer([t], method='nearest')[0]
+        stime = pd.to_datetime(mtimes[ti]).round('1s').to_pydatetime()
+        outdir = f'{outroot}/{gdnam}/{stime:%Y/%m/%d}'
         pathsuf = f'{stime:%Y-%m-%dT%H%M}Z.nc'
         outpath = f'{outdir}/geoscf_mcx_tavg_1hr_g1440x721_v36_{pathsuf}'
-        if os.path.exists(outpath):
-            print(f'Keeping cached: {outpath}')
-            outpaths.append(outpath)
+        outpaths.append(outpath)
+        if os.path.exists(outpath) or outpath in [o for _, o, _ in todo]:
+            if verbose > 0:
+                print(f'Keeping cached: {outpath}')
             continue
+        todo.append((ti, outpath, stime))
 
-        print(f'Making: {outpath}')
-        tmpmf = mf[metvars].sel(time=tv, lat=ylim, lon=xlim)
-        tryandtime(tmpmf, 'met')
-        mergefs = [tmpmf]
-        if len(chmvars) > 0:
-            tmpcf = cf[chmvars].sel(time=tv, lat=ylim, lon=xlim)
-            tryandtime(tmpcf, 'chm')
-            mergefs.append(tmpcf)
-        if len(xgcvars) > 0:
-            tmpxf = xf[xgcvars].sel(time=tv, lat=ylim, lon=xlim)
-            tryandtime(tmpxf, 'xgc')
-            mergefs.append(tmpxf)
-        outf = xr.merge(mergefs)
-        outf.attrs['data_source'] = f'{meturl}, {chmurl}, {xgcurl}'
-        os.makedirs(os.path.dirname(outpath), exist_ok=True)
-        outf.expand_dims(time=[stime]).to_netcdf(outpath)
-        outpaths.append(outpath)
-        if len(dates) > 1:
-            time.sleep(sleep)
+    tidx = [ti for ti, _, _ in todo]
+    batches = _timebatches(tidx, max(1, batch))
+    workers = max(1, min(workers, len(groups)))
+    executor = _executor(workers)
+    try:
+        for bi, (group, itime) in enumerate(batches):
+            if verbose > 0:
+                for pos in group:
+                    print(f'Making: {todo[pos][1]}')
+            tasks = [
+                (f'{gkey} {mtimes[itime.start]:%FT%H}+{len(group)}h',
+                 url, varkeys, itime, windows)
+                for gkey, url, varkeys in groups
+            ]
+            mergefs = _fetchall(
+                tasks, executor, workers=workers, maxtries=maxtries,
+                backoff=backoff, verbose=verbose
+            )
+            batchf = xr.merge(mergefs)
+            batchf.attrs['data_source'] = f'{meturl}, {chmurl}, {xgcurl}'
+            for pos in group:
+                ti, outpath, stime = todo[pos]
+                outf = batchf.sel(time=mtimes[ti]).drop_vars('time')
+                os.makedirs(os.path.dirname(outpath), exist_ok=True)
+                with atomicwrite(outpath) as tmppath:
+                    outf.expand_dims(time=[stime]).to_netcdf(tmppath)
+            if bi < len(batches) - 1:
+                time.sleep(sleep)
+    finally:
+        executor.shutdown()
+        # datasets opened in this process (workers=1)
+        _closeall()
 
     return outpaths
 
 
 class geoscf(pnc.PseudoNetCDFFile):
-    def __init__(self, *args, **kwds):
+    def __init__(self, *args, varkeys=None, **kwds):
         """
         Thin wrapper around raqms files to add ll2ij, getTimes, and
         interpSigma functions.
+
+        If varkeys is provided, only varkeys, coordinates, and the pressure
+        variables needed by interpSigma (ps, delp) are available.
         """
+        from .util import keepvariables
+        # netcdf by default; format detection opens the file many times
+        kwds.setdefault('format', 'netcdf')
         f = pnc.pncopen(*args, **kwds)
+        # keep the source open while variables are in use
+        self._f = f
+        coordkeys = ['time', 'lat', 'lon', 'lev']
         self.dimensions = f.dimensions
-        self.variables = f.variables
+        self.variables = keepvariables(
+            f.variables, varkeys, coordkeys + ['ps', 'delp']
+        )
         for k in f.ncattrs():
             setattr(self, k, f.getncattr(k))
-        self.setCoords(
-            ['time', 'lat', 'lon', 'lev']
-        )
+        self.setCoords(coordkeys)
 
     def ll2ij(self, lon, lat, bounds='warn', clean='clip'):
         import numpy as np
@@ -185,7 +428,7 @@ class geoscf(pnc.PseudoNetCDFFile):
 
     def interpSigma(
         self, vglvls, vgtop=None, interptype='linear', extrapolate=False,
-        fill_value='extrapolate', verbose=0
+        fill_value='extrapolate', verbose=0, varkeys=None
     ):
         """
         Parameters
@@ -202,6 +445,9 @@ class geoscf(pnc.PseudoNetCDFFile):
         fill_value : boolean
             set fill value (e.g, nan) to prevent extrapolation or edge
             continuation
+        varkeys : iterable or None
+            if provided, only interpolate (and output) layered variables in
+            varkeys
 
         Returns
         -------
@@ -213,50 +459,35 @@ class geoscf(pnc.PseudoNetCDFFile):
         When extrapolate is false, the edge values are used for points beyond
         the inputs.
         """
-        from PseudoNetCDF.coordutil import sigma2coeff as sigma2coeff_con
-        from .util import sigma2coeff_lin
+        from .util import sigma2band, applyband
         import numpy as np
 
         psfc = self.variables['ps'][:][:, None, ...]
         delp = self.variables['delp'][:]
         plow = psfc - np.cumsum(delp[:, ::-1], axis=1)[:, ::-1]
-        pedges = np.concatenate([plow, psfc], axis=1)
         pmid = plow + delp * 0.5
-        ptop = psfc - delp.sum(1)
+        ptop = psfc - delp.sum(1, keepdims=True)
         pedges = np.concatenate([ptop, ptop + np.cumsum(delp, axis=1)], axis=1)
-        newshape = list(delp.shape)
         nzout = len(vglvls) - 1
-        newshape.insert(2, nzout)
-        itershape = [newshape[0]] + newshape[3:]
         sigma = (pedges - vgtop) / (psfc - vgtop)
         if interptype not in ('linear', 'conserve'):
             print(f'Unknown interptype {interptype}; default to linear')
             interptype = 'linear'
-        if interptype == 'linear':
-            sigma2coeff = sigma2coeff_lin
-        else:
-            sigma2coeff = sigma2coeff_con
-
-        tmpv = np.zeros(newshape, dtype='f')
-        for idx in np.ndindex(*itershape):
-            srcidx = (idx[0], slice(None)) + tuple(idx[1:])
-            destidx = (idx[0], slice(None), slice(None)) + tuple(idx[1:])
-            fromvglvls = sigma[srcidx]
-            # sigma2coeff expects vglvls to decrease (i.e., surface to top),
-            # but RAQMS is ordered top-to-surface. So, the vglvls are reversed
-            # and the results are reversed as well.
-            tmpv[destidx] = sigma2coeff(
-                fromvglvls[::-1], vglvls
-            )[::-1]
-
-        pweight = tmpv[:] * pmid[:, :, None, ...]
-        pnorm = pweight.sum(1)
-        exprkeys = [
+        # sigma2band expects vglvls to decrease (i.e., surface to top),
+        # but GEOS-CF is ordered top-to-surface. So, the vglvls are reversed
+        # and the values are reversed as well.
+        k0, wgt = sigma2band(sigma[:, ::-1], vglvls, interptype=interptype)
+        rpmid = pmid[:, ::-1]
+        pnorm = applyband(rpmid, k0, wgt)
+        levkeys = [
             key
             for key, var in self.variables.items()
             if var.dimensions[:2] == ('time', 'lev')
         ]
-        outdims = self.variables[exprkeys[0]].dimensions
+        exprkeys = [
+            key for key in levkeys if varkeys is None or key in varkeys
+        ]
+        outdims = self.variables['delp'].dimensions
 
         outf = pnc.PseudoNetCDFFile()
         for k, d in self.dimensions.items():
@@ -276,11 +507,11 @@ class geoscf(pnc.PseudoNetCDFFile):
             outvar = outf.createVariable(
                 key, invar.dtype.char, outdims, **props
             )
-            outvar[:] = (
-                invar[:][:, :, None, ...] * pweight
-            ).sum(1) / pnorm
+            outvar[:] = applyband(
+                invar[:][:, ::-1] * rpmid, k0, wgt
+            ) / pnorm
         for key, var in self.variables.items():
-            if key not in exprkeys and key not in self.dimensions:
+            if key not in levkeys and key not in self.dimensions:
                 outf.copyVariable(var, key=key)
 
         return outf
@@ -3,29 +3,45 @@ import PseudoNetCDF as pnc
 
 
 class gcbench(pnc.PseudoNetCDFFile):
-    def __init__(self, *args, **kwds):
+    def __init__(self, *args, varkeys=None, **kwds):
         """
         Thin wrapper around gcnc. Finds associated StateMet file by replacing
         input path SpeciesConc with StateMet. Renames all SpeciesConc_* to
         SpeciesBC_* to allow use with regular expression files.
 
         If StateMet is not available... set Met_PMID
+
+        If varkeys is provided, only varkeys and coordinates are available
+        and StateMet is only used if Met_PMIDDRY or Met_T is in varkeys.
         """
         import os
+        from .util import keepvariables
+        coordkeys = [
+            'time', 'lat', 'lon', 'lev', 'hyai', 'hybi', 'hyam', 'hybm', 'P0'
+        ]
         concpath = args[0]
         metpath = concpath.replace('SpeciesConc', 'StateMet')
         f = pnc.pncopen(*args, format='gcnc')
         self._f = f
         for k, d in f.dimensions.items():
             self.createDimension(k, len(d))
-        for k, v in f.variables.items():
-            self.variables[k.replace('SpeciesConc_', 'SpeciesBC_')] = v
-        if os.path.exists(metpath):
+        invars = {
+            k.replace('SpeciesConc_', 'SpeciesBC_'): v
+            for k, v in f.variables.items()
+        }
+        # the US standard atmosphere is calculated from SpeciesBC_O3
+        needmet = (
+            varkeys is None or 'Met_PMIDDRY' in varkeys or 'Met_T' in varkeys
+        )
+        self.variables.update(
+            keepvariables(invars, varkeys, coordkeys + ['SpeciesBC_O3'])
+        )
+        if needmet and os.path.exists(metpath):
             mf = pnc.pncopen(metpath, format='gcnc')
             self.variables['Met_PMIDDRY'] = mf.variables['Met_PMIDDRY']
             self.variables['Met_T'] = mf.variables['Met_T']
             self._mf = mf
-        else:
+        elif needmet:
             msg = f'StateMet not found ({metpath})'
             pnc.pncwarn.warn(msg)
             msg = 'Using US STD atmosphere T = f(P) and P=A+B*P0.'
@@ -33,9 +49,9 @@ class gcbench(pnc.PseudoNetCDFFile):
             addstdpt(self)
         for k in f.ncattrs():
             self.setncattr(k, f.getncattr(k))
-        self.setCoords(
-            ['time', 'lat', 'lon', 'lev', 'hyai', 'hybi', 'hyam', 'hybm', 'P0']
-        )
+        if varkeys is not None and 'SpeciesBC_O3' not in varkeys:
+            self.variables.pop('SpeciesBC_O3', None)
+        self.setCoords(coordkeys)
 
     def getTimes(self):
         return pnc.geoschemfiles.gcnc.getTimes(self)
@@ -2,7 +2,7 @@ __all__ = ['download', 'raqms']
 import PseudoNetCDF as pnc
 
 
-def download(dates, root=None):
+def download(dates, root=None, workers=4, **kwds):
     """
     Convenience function for downloading. If root url change
 
@@ -15,6 +15,10 @@ def download(dates, root=None):
         If None, defaults to https://bin.ssec.wisc.edu/pub/raqms/ESRL/RAQMS/
         If the root path has changed, provide a new value here and raise an
         issue at  https://github.com/barronh/aqmbc/issues
+    workers : int
+        Maximum number of concurrent downloads
+    kwds : mappable
+        Passed to aqmbc.models.download.download (e.g., retries, transport)
 
     Returns
     -------
@@ -22,59 +26,46 @@ def download(dates, root=None):
         List of paths that were downloaded
     """
     import pandas as pd
-    import requests
-    from os.path import basename, join, exists
-    from os import makedirs
+    from os.path import basename, join
+    from .download import download as _download
 
     if root is None:
         root = 'https://bin.ssec.wisc.edu/pub/raqms/ESRL/RAQMS/'
 
+    urls = []
     destpaths = []
     for date in pd.to_datetime(dates):
         url = date.strftime(f'{root}/uwhyb_%m_%d_%Y_%HZ.chem.assim.nc')
-        dest = join('RAQMS', basename(url))
-        if not exists(dest):
-            makedirs('RAQMS', exist_ok=True)
-            with requests.get(url, stream=True) as r:
-                total_size = int(r.headers.get("content-length", 0))
-                if total_size == 0:
-                    total_size = 1024**3
-                print('total_size (MB):', total_size / 1024**2)
-                print('Each . represents 1/80th')
-                block_size = 1024 * 1024
-                r_size = 0
-                r.raise_for_status()
-                with open(dest, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=block_size):
-                        f.write(chunk)
-                        r_size += len(chunk)
-                        print(f'\r{int(r_size / total_size * 80)*"."}', end='')
-                    print()
-        else:
-            print(f'Using cached {dest}')
-
-        destpaths.append(dest)
-
-    return destpaths
+        urls.append(url)
+        destpaths.append(join('RAQMS', basename(url)))
+
+    return _download(urls, destpaths, workers=workers, **kwds)
 
 
 class raqms(pnc.PseudoNetCDFFile):
-    def __init__(self, *args, **kwds):
+    def __init__(self, *args, varkeys=None, **kwds):
         """
         Thin wrapper around raqms files to add ll2ij, getTimes, and
         interpSigma functions.
+
+        If varkeys is provided, only varkeys and coordinates (including the
+        pressure variables needed by interpSigma) are available.
         """
+        from .util import keepvariables
+        # netcdf by default; format detection opens the file many times
+        kwds.setdefault('format', 'netcdf')
         f = pnc.pncopen(*args, **kwds)
+        # keep the source open while variables are in use
+        self._f = f
+        coordkeys = [
+            'lat', 'lon', 'lev', 'Times', 'IDATE', 'wlong', 'slat',
+            'psfc', 'pdash', 'delp'
+        ]
         self.dimensions = f.dimensions
-        self.variables = f.variables
+        self.variables = keepvariables(f.variables, varkeys, coordkeys)
         for k in f.ncattrs():
             setattr(self, k, f.getncattr(k))
-        self.setCoords(
-            [
-                'lat', 'lon', 'lev', 'Times', 'IDATE', 'wlong', 'slat',
-                'psfc', 'pdash', 'delp'
-            ]
-        )
+        self.setCoords(coordkeys)
 
     def ll2ij(self, lon, lat, bounds='warn', clean='clip'):
         import numpy as np
@@ -104,7 +95,7 @@ class raqms(pnc.PseudoNetCDFFile):
 
     def interpSigma(self, vglvls, vgtop=None, interptype='linear',
                     extrapolate=False, fill_value='extrapolate',
-                    verbose=0):
+                    verbose=0, varkeys=None):
         """
         Parameters
         ----------
@@ -120,6 +111,9 @@ class raqms(pnc.PseudoNetCDFFile):
         fill_value : boolean
             set fill value (e.g, nan) to prevent extrapolation or edge
             continuation
+        varkeys : iterable or None
+            if provided, only interpolate (and output) layered variables in
+            varkeys
 
         Returns
         -------
@@ -131,53 +125,46 @@ class raqms(pnc.PseudoNetCDFFile):
         When extrapolate is false, the edge values are used for points beyond
         the inputs.
         """
-        from PseudoNetCDF.coordutil import sigma2coeff as sigma2coeff_con
-        from .util import sigma2coeff_lin
+        from .util import sigma2band, applyband
         import numpy as np
         import warnings
 
         psfc = self.variables['psfc'][:][:, None, ...] * 100
         delp = self.variables['delp'][:] * 100
         pmid = self.variables['pdash'][:] * 100
-        ptop = psfc - delp.sum(1)
+        ptop = psfc - delp.sum(1, keepdims=True)
         pedges = np.concatenate([ptop, ptop + np.cumsum(delp, axis=1)], axis=1)
-        newshape = list(delp.shape)
-        newshape.insert(2, len(vglvls) - 1)
-        itershape = [newshape[0]] + newshape[3:]
         sigma = (pedges - vgtop) / (psfc - vgtop)
-        tmpv = np.zeros(newshape, dtype='f')
         if interptype not in ('linear', 'conserve'):
             print(f'Unknown interptype {interptype}; default to linear')
             interptype = 'linear'
-        if interptype == 'linear':
-            sigma2coeff = sigma2coeff_lin
-        else:
-            sigma2coeff = sigma2coeff_con
-        for idx in np.ndindex(*itershape):
-            srcidx = (idx[0], slice(None)) + tuple(idx[1:])
-            destidx = (idx[0], slice(None), slice(None)) + tuple(idx[1:])
-            fromvglvls = sigma[srcidx]
-            # sigma2coeff expects vglvls to decrease (i.e., surface to top),
-            # but RAQMS is ordered top-to-surface. So, the vglvls are reversed
-            # and the results are reversed as well.
-            tmpv[destidx] = sigma2coeff(
-                fromvglvls[::-1], vglvls
-            )[::-1]
-
-        pweight = tmpv[:] * pmid[:, :, None, ...]
-        pnorm = pweight.sum(1)
-        exprkeys = [
+        # sigma2band expects vglvls to decrease (i.e., surface to top),
+        # but RAQMS is ordered top-to-surface. So, the vglvls are reversed
+        # and the values are reversed as well.
+        k0, wgt = sigma2band(sigma[:, ::-1], vglvls, interptype=interptype)
+        rpmid = pmid[:, ::-1]
+        pnorm = applyband(rpmid, k0, wgt)
+        levkeys = [
             key
             for key, var in self.variables.items()
             if var.dimensions[:2] == ('time', 'lev')
         ]
+        exprkeys = [
+            key for key in levkeys if varkeys is None or key in varkeys
+        ]
         outvars = {}
         for key in exprkeys:
             with warnings.catch_warnings():
                 warnings.simplefilter("ignore")
-                outvars[key] = (
-                    self.variables[key][:][:, :, None, ...] * pweight
-                ).sum(1) / pnorm
+                invar = self.variables[key]
+                outvals = applyband(
+                    invar[:][:, ::-1] * rpmid, k0, wgt
+                ) / pnorm
+                # from_ncvs needs dimensions, so keep those of the input
+                outvars[key] = pnc.PseudoNetCDFVariable(
+                    None, key, outvals.dtype.char, invar.dimensions,
+                    values=outvals
+                )
 
         outf = pnc.PseudoNetCDFFile.from_ncvs(**outvars)
 
@@ -189,7 +176,7 @@ class raqms(pnc.PseudoNetCDFFile):
                 outf.copyDimension(dim, key=key)
 
         for key, var in self.variables.items():
-            if key not in exprkeys and key not in self.dimensions:
+            if key not in levkeys and key not in self.dimensions:
                 outf.copyVariable(var, key=key)
 
         for vk, ov in self.variables.items():
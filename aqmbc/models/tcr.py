@@ -3,7 +3,7 @@ import PseudoNetCDF as pnc
 import warnings
 
 
-def download(dates, freq='mon', root=None):
+def download(dates, freq='mon', root=None, workers=4, **kwds):
     """
     Convenience function for downloading. If root url change
 
@@ -17,6 +17,10 @@ def download(dates, freq='mon', root=None):
         If None, defaults to https://tropess.gesdisc.eosdis.nasa.gov/data/
         If the root path has changed, provide a new value here and raise an
         issue at  https://github.com/barronh/aqmbc/issues
+    workers : int
+        Maximum number of concurrent downloads
+    kwds : mappable
+        Passed to aqmbc.models.download.download (e.g., retries, transport)
 
     Returns
     -------
@@ -24,9 +28,8 @@ def download(dates, freq='mon', root=None):
         List of paths that were downloaded
     """
     import pandas as pd
-    import requests
-    from os.path import basename, join, exists
-    from os import makedirs
+    from os.path import basename, join
+    from .download import download as _download
 
     if root is None:
         root = 'https://tropess.gesdisc.eosdis.nasa.gov/data/'
@@ -37,6 +40,7 @@ def download(dates, freq='mon', root=None):
     ft = '_VERTCONCS/TRPSCR'
     st = '3D.1/TROPESS_reanalysis_'
 
+    urls = []
     destpaths = []
     for year in years:
         varpaths = [
@@ -56,30 +60,10 @@ def download(dates, freq='mon', root=None):
         ]
         for varpath in varpaths:
             url = f'{root}/{varpath}'
-            dest = join('TCR', basename(url))
-            if not exists(dest):
-                makedirs('TCR', exist_ok=True)
-                with requests.get(url, stream=True) as r:
-                    ts = int(r.headers.get("content-length", 0))
-                    if ts == 0:
-                        ts = 1024**3
-                    print('total_size (MB):', ts / 1024**2)
-                    print('Each . represents 1/80th')
-                    block_size = 1024 * 1024
-                    rs = 0
-                    r.raise_for_status()
-                    with open(dest, 'wb') as f:
-                        for chunk in r.iter_content(chunk_size=block_size):
-                            f.write(chunk)
-                            rs += len(chunk)
-                            print(f'\r{int(rs / ts * 80)*"."}', end='')
-                        print()
-            else:
-                print(f'Using cached {dest}')
-
-        destpaths.append(dest)
-
-    return destpaths
+            urls.append(url)
+            destpaths.append(join('TCR', basename(url)))
+
+    return _download(urls, destpaths, workers=workers, **kwds)
 
 
 class tcr(pnc.PseudoNetCDFFile):
@@ -190,7 +174,7 @@ class tcr(pnc.PseudoNetCDFFile):
 
     def interpSigma(self, vglvls, vgtop=None, interptype='linear',
                     extrapolate=False, fill_value='extrapolate',
-                    verbose=0):
+                    verbose=0, varkeys=None):
         """
         Parameters
         ----------
@@ -206,6 +190,9 @@ class tcr(pnc.PseudoNetCDFFile):
         fill_value : boolean
             set fill value (e.g, nan) to prevent extrapolation or edge
             continuation
+        varkeys : iterable or None
+            if provided, only interpolate (and output) layered variables in
+            varkeys
 
         Returns
         -------
@@ -218,8 +205,9 @@ class tcr(pnc.PseudoNetCDFFile):
         the inputs.
         """
         from PseudoNetCDF.coordutil import sigma2coeff
-        from .util import sigma2coeff_lin
+        from .util import sigma2coeff_lin, getweights
         import numpy as np
+        import functools
 
         vglvls = np.asarray(vglvls)
         lev = self.variables['lev']
@@ -245,19 +233,29 @@ class tcr(pnc.PseudoNetCDFFile):
         wgtslice[2] = slice(None)
         wgtslice = tuple(wgtslice)
         sigma = (pedges - vgtop) / (psfc - vgtop)
-        exprkeys = [
+        levkeys = [
             key for key, var in self.variables.items()
             if var.dimensions[:2] == ('time', 'lev')
         ]
+        exprkeys = [
+            key for key in levkeys if varkeys is None or key in varkeys
+        ]
         outvars = {}
         if interptype not in ('conserve', 'linear'):
             print(f'Unknown {interptype}: default to linear')
             interptype = 'linear'
+        # TCR levels are fixed, so weights are the same for every file
         if interptype == 'conserve':
-            tmpv = sigma2coeff(sigma, vglvls)
+            tmpv = getweights(
+                sigma, vglvls, vgtop, interptype,
+                functools.partial(sigma2coeff, sigma, vglvls)
+            )
             lweight = (tmpv[:] * levvals[:, None])[wgtslice]
         elif interptype == 'linear':
-            tmpv = sigma2coeff_lin(sigma, vglvls)
+            tmpv = getweights(
+                sigma, vglvls, vgtop, interptype,
+                functools.partial(sigma2coeff_lin, sigma, vglvls)
+            )
             lweight = tmpv[wgtslice]
 
         for key in exprkeys:
@@ -294,7 +292,7 @@ class tcr(pnc.PseudoNetCDFFile):
                 outf.copyDimension(dim, key=key)
 
         for key, var in self.variables.items():
-            if key not in exprkeys and key not in self.dimensions:
+            if key not in levkeys and key not in self.dimensions:
                 outf.copyVariable(var, key=key)
 
         for vk, ov in self.variables.items():
@@ -1,4 +1,12 @@
-__all__ = ['sigma2coeff_lin']
+__all__ = [
+    'sigma2coeff_lin', 'sigma2coeff_batch', 'sigma2band', 'applyband',
+    'band2dense', 'getweights', 'setweightcache', 'weightkey',
+    'keepvariables'
+]
+from collections import OrderedDict
+
+_weightcache = OrderedDict()
+_weightcacheopts = {'cachedir': None, 'maxsize': 16}
 
 
 def sigma2coeff_lin(sigma, vglvls):
@@ -45,3 +53,337 @@ def sigma2coeff_lin(sigma, vglvls):
             lwgt[lui, li] = luw
 
     return lwgt
+
+
+def _sigma2index(sigma, levels):
+    """
+    Fractional index of each level in sigma for many columns at once. This is
+    equivalent to np.interp(levels, sigma[::-1], np.arange(n)[::-1]) applied
+    to each column, including clamping to the first and last index.
+
+    Arguments
+    ---------
+    sigma : array
+        Source edges shaped (T, n, ...) in descending order on axis 1
+    levels : array
+        Destination values shaped (m,) in descending order
+
+    Returns
+    -------
+    idx : array
+        Fractional indices shaped (T, m, ...)
+    """
+    import numpy as np
+    n = sigma.shape[1]
+    x = np.asarray(levels).reshape((1, -1) + (1,) * (sigma.ndim - 2))
+    outshape = (sigma.shape[0], x.shape[1]) + sigma.shape[2:]
+    count = np.zeros(outshape, dtype='i')
+    for si in range(n):
+        count += (sigma[:, si:si + 1] >= x)
+    k = np.clip(count - 1, 0, n - 2)
+    shi = np.take_along_axis(sigma, k, axis=1)
+    slo = np.take_along_axis(sigma, k + 1, axis=1)
+    ds = shi - slo
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frac = np.where(ds != 0, (shi - x) / ds, 0)
+    return k + np.clip(frac, 0, 1)
+
+
+def sigma2band(sigma, vglvls, interptype='linear', dtype='f'):
+    """
+    Calculate banded weighting coefficients for each destination (D) layer for
+    many columns at once. Each destination layer only receives weight from B
+    adjacent source layers (B=2 for linear; B is the widest overlap for
+    conserve), so the weights are stored as the first source layer index and
+    B weights instead of all S source layers.
+
+    Arguments
+    ---------
+    sigma : array-like
+        Source model edges shaped (T, S+1, ...) where ... are any number of
+        horizontal dimensions (e.g., ROW, COL or PERIM).
+    vglvls : array-like
+        CMAQ model edges (D+1) defined as sigma = (p - ptop) / (psrf / ptop)
+    interptype : str
+        'linear' or 'conserve'
+    dtype : str
+        Data type of weights
+
+    Returns
+    -------
+    k0, wgt : tuple of arrays
+        k0 is the first source layer shaped (T, D, ...) and wgt are weights
+        shaped (T, B, D, ...) for source layers k0 to k0 + B - 1. The source
+        layers are always valid (0 <= k0 and k0 + B <= S).
+
+    Notes
+    -----
+    * Both sigma and vglvls are expected in descending order (1 to 0)
+    * Both sigma and vglvls must be use the same ptop and psrf
+    * See applyband to interpolate values and band2dense to get weights
+      equivalent to sigma2coeff_batch.
+    """
+    import numpy as np
+    sigma = np.asarray(sigma, dtype='d')
+    vglvls = np.asarray(vglvls, dtype='d')
+    nzs = sigma.shape[1] - 1
+    if interptype == 'linear':
+        csigma = (sigma[:, 1:] + sigma[:, :-1]) / 2
+        cvglvls = (vglvls[1:] + vglvls[:-1]) / 2
+        lfs = _sigma2index(csigma, cvglvls)
+        lli = np.floor(lfs).astype('i')
+        luw = lfs - lli
+        # when the lower layer is the last layer, luw is 0 and the band
+        # is shifted down so that both layers are valid.
+        k0 = np.minimum(lli, nzs - 2)
+        shift = (lli - k0).astype('d')
+        wgt = np.stack([
+            (1 - luw) * (1 - shift), luw * (1 - shift) + (1 - luw) * shift
+        ], axis=1)
+    elif interptype == 'conserve':
+        edges = _sigma2index(sigma, vglvls)
+        bot = edges[:, :-1]
+        top = edges[:, 1:]
+        k0 = np.floor(bot).astype('i')
+        nb = max(int((np.ceil(top) - k0).max()), 1)
+        k0 = np.clip(k0, 0, nzs - nb)
+        wgt = np.stack([
+            np.clip(top - (k0 + b), 0, 1) - np.clip(bot - (k0 + b), 0, 1)
+            for b in range(nb)
+        ], axis=1)
+    else:
+        raise KeyError(
+            f'interptype must be linear or conserve; got {interptype}'
+        )
+
+    return k0, wgt.astype(dtype)
+
+
+def applyband(vals, k0, wgt):
+    """
+    Apply banded weights to values.
+
+    Arguments
+    ---------
+    vals : array-like
+        Source values shaped (T, S, ...)
+    k0, wgt : arrays
+        Banded weights from sigma2band
+
+    Returns
+    -------
+    out : array
+        Weighted sum shaped (T, D, ...)
+    """
+    import numpy as np
+    # masked values contribute nothing (as in a masked sum)
+    vals = np.ma.filled(vals, 0)
+    out = np.zeros(k0.shape, dtype=np.result_type(vals, wgt))
+    for b in range(wgt.shape[1]):
+        out += np.take_along_axis(vals, k0 + b, axis=1) * wgt[:, b]
+
+    return out
+
+
+def band2dense(k0, wgt, nzs):
+    """
+    Arguments
+    ---------
+    k0, wgt : arrays
+        Banded weights from sigma2band
+    nzs : int
+        Number of source layers (S)
+
+    Returns
+    -------
+    coeff : array
+        Weights shaped (T, S, D, ...) as in sigma2coeff_batch
+    """
+    import numpy as np
+    outshape = k0.shape[:1] + (nzs,) + k0.shape[1:]
+    coeff = np.zeros(outshape, dtype=wgt.dtype)
+    for b in range(wgt.shape[1]):
+        np.put_along_axis(coeff, (k0 + b)[:, None], wgt[:, b:b + 1], axis=1)
+
+    return coeff
+
+
+def sigma2coeff_batch(sigma, vglvls, interptype='linear', dtype='f'):
+    """
+    Calculate weighting coefficients for each source (S) layer to each
+    destination (D) layer for many columns in one vectorized pass. For each
+    column, the result is the same as sigma2coeff_lin (linear) or
+    PseudoNetCDF.coordutil.sigma2coeff (conserve).
+
+    Arguments
+    ---------
+    sigma : array-like
+        Source model edges shaped (T, S+1, ...) where ... are any number of
+        horizontal dimensions (e.g., ROW, COL or PERIM).
+    vglvls : array-like
+        CMAQ model edges (D+1) defined as sigma = (p - ptop) / (psrf / ptop)
+    interptype : str
+        'linear' or 'conserve'
+    dtype : str
+        Data type of output
+
+    Returns
+    -------
+    coeff : array
+        Weights shaped (T, S, D, ...).
+
+    Notes
+    -----
+    * Both sigma and vglvls are expected in descending order (1 to 0)
+    * Both sigma and vglvls must be use the same ptop and psrf
+    * The dense coefficients are mostly zeros; sigma2band uses much less
+      memory.
+    """
+    import numpy as np
+    nzs = np.shape(sigma)[1] - 1
+    k0, wgt = sigma2band(sigma, vglvls, interptype=interptype, dtype=dtype)
+    return band2dense(k0, wgt, nzs)
+
+
+def setweightcache(cachedir=None, maxsize=None):
+    """
+    Configure the interpolation weights cache used by getweights.
+
+    Arguments
+    ---------
+    cachedir : str or None
+        If str, weights are also stored in cachedir as weights_<key>.npz so
+        they can be reused by later runs or other processes. If None, weights
+        are only cached in memory.
+    maxsize : int or None
+        Maximum number of weights kept in memory (least recently used are
+        evicted first). If None, keep the current value (default 16).
+
+    Returns
+    -------
+    opts : dict
+        Current cache options
+    """
+    _weightcacheopts['cachedir'] = cachedir
+    if maxsize is not None:
+        _weightcacheopts['maxsize'] = maxsize
+        while len(_weightcache) > maxsize:
+            _weightcache.popitem(last=False)
+
+    return dict(_weightcacheopts)
+
+
+def weightkey(srcdef, vglvls, vgtop, interptype):
+    """
+    Arguments
+    ---------
+    srcdef : array-like
+        Source vertical definition (e.g., sigma edges or pressure levels)
+    vglvls : array-like
+        CMAQ model edges
+    vgtop : scalar
+        CMAQ model top
+    interptype : str
+        linear or conserve
+
+    Returns
+    -------
+    key : str
+        Hex digest that uniquely identifies the weights
+    """
+    import hashlib
+    import numpy as np
+    h = hashlib.sha1()
+    for arr in (srcdef, vglvls, vgtop):
+        arr = np.ascontiguousarray(arr, dtype='d')
+        h.update(str(arr.shape).encode())
+        h.update(arr.tobytes())
+    h.update(str(interptype).encode())
+    return h.hexdigest()
+
+
+def getweights(srcdef, vglvls, vgtop, interptype, func):
+    """
+    Get weights from the memory cache, the disk cache (if configured with
+    setweightcache), or by calling func. Useful when the source vertical
+    grid is fixed (e.g., pressure levels), so weights are identical for
+    every file and date.
+
+    Arguments
+    ---------
+    srcdef, vglvls, vgtop, interptype :
+        See weightkey
+    func : callable
+        Called without arguments to calculate weights when they are not
+        cached. Must return an array or a tuple of arrays.
+
+    Returns
+    -------
+    weights : array or tuple
+        Result of func (possibly from cache)
+    """
+    import os
+    import numpy as np
+    key = weightkey(srcdef, vglvls, vgtop, interptype)
+    if key in _weightcache:
+        _weightcache.move_to_end(key)
+        return _weightcache[key]
+
+    cachedir = _weightcacheopts['cachedir']
+    cachepath = None
+    if cachedir is not None:
+        cachepath = os.path.join(cachedir, f'weights_{key}.npz')
+
+    if cachepath is not None and os.path.exists(cachepath):
+        with np.load(cachepath) as npzf:
+            istuple = bool(npzf['istuple'])
+            arrays = tuple(
+                npzf[k] for k in sorted(npzf.files) if k != 'istuple'
+            )
+        weights = arrays if istuple else arrays[0]
+    else:
+        weights = func()
+        if cachepath is not None:
+            istuple = isinstance(weights, tuple)
+            arrays = weights if istuple else (weights,)
+            os.makedirs(cachedir, exist_ok=True)
+            # write then rename so other processes never see partial files
+            tmppath = f'{cachepath}.{os.getpid()}.tmp.npz'
+            np.savez(
+                tmppath, istuple=istuple,
+                **{f'arr_{i:03d}': a for i, a in enumerate(arrays)}
+            )
+            os.replace(tmppath, cachepath)
+
+    _weightcache[key] = weights
+    while len(_weightcache) > _weightcacheopts['maxsize']:
+        _weightcache.popitem(last=False)
+
+    return weights
+
+
+def keepvariables(variables, varkeys=None, required=()):
+    """
+    Restrict variables to those needed without reading them.
+
+    Arguments
+    ---------
+    variables : dict-like
+        Variables from a file (e.g., netCDF4.Dataset.variables)
+    varkeys : iterable or None
+        Variable names to keep (e.g., symbols in expressions). If None, all
+        variables are kept.
+    required : iterable
+        Variable names always kept (e.g., coordinates and pressure inputs
+        for interpSigma)
+
+    Returns
+    -------
+    outvars : dict-like
+        variables if varkeys is None; otherwise, an OrderedDict with only
+        varkeys and required in the original order.
+    """
+    if varkeys is None:
+        return variables
+    keep = set(varkeys).union(required)
+    return OrderedDict([(k, v) for k, v in variables.items() if k in keep])
@@ -2,7 +2,7 @@ __all__ = ['download', 'waccm']
 import PseudoNetCDF as pnc
 
 
-def download(dates, root=None, fires='finn'):
+def download(dates, root=None, fires='finn', workers=4, **kwds):
     """
     Convenience function for downloading. If root url change
 
@@ -15,6 +15,10 @@ def download(dates, root=None, fires='finn'):
         If None, defaults to https://www.acom.ucar.edu/waccm/DATA/
         If the root path has changed, provide a new value here and raise an
         issue at  https://github.com/barronh/aqmbc/issues
+    workers : int
+        Maximum number of concurrent downloads
+    kwds : mappable
+        Passed to aqmbc.models.download.download (e.g., retries, transport)
 
     Returns
     -------
@@ -22,13 +26,13 @@ def download(dates, root=None, fires='finn'):
         List of paths that were downloaded
     """
     import pandas as pd
-    import requests
-    from os.path import basename, join, exists
-    from os import makedirs
+    from os.path import basename, join
+    from .download import download as _download
 
     if root is None:
         root = 'https://www.acom.ucar.edu/waccm/DATA/'
 
+    urls = []
     destpaths = []
     for date in pd.to_datetime(dates):
         fname = (
@@ -36,49 +40,36 @@ def download(dates, root=None, fires='finn'):
             + {'finn': '001', 'qfed': '002'}[fires]
             + '.cam.h3.%Y-%m-%d-00000.nc')
         url = date.strftime(f'{root}/{fname}')
-        dest = join('WACCM', basename(url))
-        if not exists(dest):
-            makedirs('WACCM', exist_ok=True)
-            with requests.get(url, stream=True) as r:
-                total_size = int(r.headers.get("content-length", 0))
-                if total_size == 0:
-                    total_size = 8 * 1024**3
-                print('total_size (MB):', total_size / 1024**2)
-                print('Each . represents 1/80th')
-                block_size = 1024 * 1024
-                r_size = 0
-                r.raise_for_status()
-                with open(dest, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=block_size):
-                        f.write(chunk)
-                        r_size += len(chunk)
-                        print(f'\r{int(r_size / total_size * 80)*"."}', end='')
-                    print()
-        else:
-            print(f'Using cached {dest}')
-
-        destpaths.append(dest)
-
-    return destpaths
+        urls.append(url)
+        destpaths.append(join('WACCM', basename(url)))
+
+    return _download(urls, destpaths, workers=workers, **kwds)
 
 
 class waccm(pnc.PseudoNetCDFFile):
-    def __init__(self, *args, **kwds):
+    def __init__(self, *args, varkeys=None, **kwds):
         """
         Thin wrapper around waccm files to add ll2ij, getTimes, and
         interpSigma functions.
+
+        If varkeys is provided, only varkeys and coordinates (including the
+        hybrid coordinate variables needed by interpSigma) are available.
         """
+        from .util import keepvariables
+        # netcdf by default; format detection opens the file many times
+        kwds.setdefault('format', 'netcdf')
         f = pnc.pncopen(*args, **kwds)
+        # keep the source open while variables are in use
+        self._f = f
+        coordkeys = [
+            'lat', 'lon', 'lev', 'time', 'date', 'datesec', 'date',
+            'hyam', 'hybm', 'P0', 'ilev', 'hyai', 'hybi', 'PS'
+        ]
         self.dimensions = f.dimensions
-        self.variables = f.variables
+        self.variables = keepvariables(f.variables, varkeys, coordkeys)
         for k in f.ncattrs():
             setattr(self, k, f.getncattr(k))
-        self.setCoords(
-            [
-                'lat', 'lon', 'lev', 'time', 'date', 'datesec', 'date',
-                'hyam', 'hybm', 'P0', 'ilev', 'hyai', 'hybi', 'PS'
-            ]
-        )
+        self.setCoords(coordkeys)
 
     def ll2ij(self, lon, lat, bounds='warn', clean='clip'):
         import numpy as np
@@ -97,7 +88,7 @@ class waccm(pnc.PseudoNetCDFFile):
 
     def interpSigma(self, vglvls, vgtop=None, interptype='linear',
                     extrapolate=False, fill_value='extrapolate',
-                    verbose=0):
+                    verbose=0, varkeys=None):
         """
         Parameters
         ----------
@@ -113,6 +104,9 @@ class waccm(pnc.PseudoNetCDFFile):
         fill_value : boolean
             set fill value (e.g, nan) to prevent extrapolation or edge
             continuation
+        varkeys : iterable or None
+            if provided, only interpolate (and output) layered variables in
+            varkeys
 
         Returns
         -------
@@ -124,8 +118,7 @@ class waccm(pnc.PseudoNetCDFFile):
         When extrapolate is false, the edge values are used for points beyond
         the inputs.
         """
-        from PseudoNetCDF.coordutil import sigma2coeff
-        import numpy as np
+        from .util import sigma2band, applyband
 
         # time, lev, lat, lon or time, lev, PERIM
         psfc = self.variables['PS'][:][:, None, ...]
@@ -142,34 +135,32 @@ class waccm(pnc.PseudoNetCDFFile):
         # ptop = pedges[:, 1:]
         # pbot = pedges[:, :-1]
         # delp = pbot - ptop
-        newshape = list(pmid.shape)
-        newshape.insert(2, len(vglvls) - 1)
-        itershape = [newshape[0]] + newshape[3:]
         sigma = (pedges - vgtop) / (psfc - vgtop)
-        tmpv = np.zeros(newshape, dtype='f')
-        for idx in np.ndindex(*itershape):
-            srcidx = (idx[0], slice(None)) + tuple(idx[1:])
-            destidx = (idx[0], slice(None), slice(None)) + tuple(idx[1:])
-            fromvglvls = sigma[srcidx]
-            # sigma2coeff expects vglvls to decrease (i.e., surface to top),
-            # but WACCM is ordered top-to-surface. So, the vglvls are reversed
-            # and the results are reversed as well.
-            tmpv[destidx] = sigma2coeff(
-                fromvglvls[::-1], vglvls
-            )[::-1]
-
-        pweight = tmpv[:] * pmid[:, :, None, ...]
-        pnorm = pweight.sum(1)
-        exprkeys = [
+        # sigma2band expects vglvls to decrease (i.e., surface to top),
+        # but WACCM is ordered top-to-surface. So, the vglvls are reversed
+        # and the values are reversed as well.
+        k0, wgt = sigma2band(sigma[:, ::-1], vglvls, interptype='conserve')
+        rpmid = pmid[:, ::-1]
+        pnorm = applyband(rpmid, k0, wgt)
+        levkeys = [
             key
             for key, var in self.variables.items()
             if var.dimensions[:2] == ('time', 'lev')
         ]
+        exprkeys = [
+            key for key in levkeys if varkeys is None or key in varkeys
+        ]
         outvars = {}
         for key in exprkeys:
-            outvars[key] = (
-                self.variables[key][:][:, :, None, ...] * pweight
-            ).sum(1) / pnorm
+            invar = self.variables[key]
+            outvals = applyband(
+                invar[:][:, ::-1] * rpmid, k0, wgt
+            ) / pnorm
+            # from_ncvs needs dimensions, so keep those of the input
+            outvars[key] = pnc.PseudoNetCDFVariable(
+                None, key, outvals.dtype.char, invar.dimensions,
+                values=outvals
+            )
 
         outf = pnc.PseudoNetCDFFile.from_ncvs(**outvars)
 
@@ -182,7 +173,7 @@ class waccm(pnc.PseudoNetCDFFile):
 
         for key, var in self.variables.items():
             if (
-                key not in exprkeys
+                key not in levkeys
                 and key not in self.dimensions
                 and key not in ('hyam', 'hybm', 'hyai', 'hybi')
             ):
@@ -1,9 +1,21 @@
 import pandas as pd
 import glob
 import os
+from .manifest import atomicwrite
 
 
-def get_vertprof(inbcon, varkeys=None, func='mean', verbose=0, outpath=None):
+def _isfresh(outpath, inpaths):
+    """True if outpath exists and is newer than all inpaths"""
+    if outpath is None or not os.path.exists(outpath):
+        return False
+    intimes = [os.stat(p).st_mtime for p in inpaths]
+    outtime = os.stat(outpath).st_mtime
+    return len(intimes) == 0 or outtime > max(intimes)
+
+
+def get_vertprof(
+    inbcon, varkeys=None, func='mean', verbose=0, outpath=None, cachedir=None
+):
     """
     Arguments
     ---------
@@ -20,6 +32,9 @@ def get_vertprof(inbcon, varkeys=None, func='mean', verbose=0, outpath=None):
         Level of verbosity
     outpath : str or None
         Path to save (or retrieve) the vertical profile from
+    cachedir : str or None
+        Folder to reuse the profile of each unchanged path when outpath must
+        be remade (see makereport).
 
     Returns
     -------
@@ -29,22 +44,23 @@ def get_vertprof(inbcon, varkeys=None, func='mean', verbose=0, outpath=None):
     import xarray as xr
     if isinstance(inbcon, str):
         inbcon = sorted(glob.glob(inbcon))
-    if outpath is not None:
-        if os.path.exists(outpath):
-            intimes = [os.stat(p).st_mtime for p in inbcon]
-            outtime = os.stat(outpath).st_mtime
-            if len(intimes) == 0 or outtime > max(intimes):
-                vprof = xr.open_dataset(outpath)
-                return vprof
+    if _isfresh(outpath, inbcon):
+        vprof = xr.open_dataset(outpath)
+        return vprof
     vprof = make_vertprof(
-        inbcon=inbcon, varkeys=varkeys, func=func, verbose=verbose
+        inbcon=inbcon, varkeys=varkeys, func=func, verbose=verbose,
+        cachedir=cachedir
     )
     if outpath is not None:
-        vprof.to_netcdf(outpath)
+        with atomicwrite(outpath) as tmppath:
+            vprof.to_netcdf(tmppath)
     return vprof
 
 
-def make_vertprof(inbcon, varkeys=None, func='mean', verbose=0):
+def make_vertprof(
+    inbcon, varkeys=None, func='mean', verbose=0, sidecar=True, workers=1,
+    cachedir=None
+):
     """
     Arguments
     ---------
@@ -59,60 +75,31 @@ def make_vertprof(inbcon, varkeys=None, func='mean', verbose=0):
         Name of function to apply to each variable (min, mean, max, median)
     verbose : int
         Level of verbosity
+    sidecar : bool
+        If True and func is min, mean or max, use layer profiles saved with
+        each path (see stats.readsidecar) when they are current and have all
+        varkeys. Otherwise, read data.
+    workers : int
+        Number of processes (see makereport)
+    cachedir : str or None
+        Folder to store and reuse the result of each path (see makereport)
 
     Returns
     -------
     vf : xarray.Dataset
         Variables have func applied to all dimensions except for LAY.
     """
-    import xarray as xr
-    import numpy as np
-
     if isinstance(func, str):
         funcs = [func]
     else:
         funcs = func
-    vfs = []
-    ts = []
-    if isinstance(inbcon, str):
-        inbcon = sorted(glob.glob(inbcon))
-    n = len(inbcon)
-    for i, inpath in enumerate(inbcon):
-        if isinstance(inpath, str):
-            if verbose > 0:
-                print(inpath, flush=True)
-            f = xr.open_dataset(inpath, decode_cf=False)
-        else:
-            if verbose > 0:
-                print(f'\r{i / n:.2%}', end='', flush=True)
-            f = inpath
-        ts.append(f.SDATE * 1000000 + f.STIME)
-        if 'PERIM' in f.sizes:
-            dims = ('TSTEP', 'PERIM')
-        else:
-            dims = ('TSTEP', 'ROW', 'COL')
-        if varkeys is None:
-            varkeys = [k for k, v in f.data_vars.items() if 'LAY' in v.dims]
-        vfs.append(xr.concat([
-            getattr(f[varkeys], funcstr)(dims)
-            for funcstr in funcs
-        ], dim='func'))
-    vf = xr.concat(vfs, dim='TSTEP')
-    for vkey in varkeys:
-        vf[vkey].attrs.update(f[vkey].attrs)
-    vf.attrs.update(f.attrs)
-    vf.coords['LAY'] = (f.VGLVLS[1:] + f.VGLVLS[:-1]) / 2
-    vf.coords['func'] = funcs
-    try:
-        vf.coords['TSTEP'] = pd.to_datetime(ts, format='%Y%j%H%M%S')
-    except Exception:
-        # time-independent files cannot know their time. Use sequence
-        # starting at 1
-        vf.coords['TSTEP'] = np.arange(vf.sizes['TSTEP']) + 1
-        pass
+    statdf, vprofs = makereport(
+        inbcon, profkeys=varkeys, funcs=funcs, dostats=False,
+        sidecar=sidecar, workers=workers, verbose=verbose, cachedir=cachedir
+    )
     if isinstance(func, str):
-        vf = vf.isel(func=0)
-    return vf
+        return vprofs[func]
+    return _profdataset(vprofs, funcs)
 
 
 def plot_vprof(vmean, vmin=None, vmax=None, ax=None, **kwds):
@@ -155,7 +142,7 @@ def plot_vprof(vmean, vmin=None, vmax=None, ax=None, **kwds):
 
 def getstats(
     inbcon, varkeys=None, verbose=0, add_summary=True, outpath=None,
-    draft=False
+    draft=False, cachedir=None
 ):
     """
     Arguments
@@ -178,6 +165,9 @@ def getstats(
     draft : bool
         If True, use actual_range and actual_median properties instead of file
         data.
+    cachedir : str or None
+        Folder to reuse the statistics of each unchanged path when outpath
+        must be remade (see makereport).
 
     Returns
     -------
@@ -189,26 +179,29 @@ def getstats(
 
     if isinstance(inbcon, str):
         inbcon = sorted(glob.glob(inbcon))
-    if outpath is not None:
-        if os.path.exists(outpath):
-            intimes = [os.stat(p).st_mtime for p in inbcon]
-            outtime = os.stat(outpath).st_mtime
-            if len(intimes) == 0 or outtime > max(intimes):
-                statdf = pd.read_csv(outpath, index_col=[0, 1])
-                return statdf
+    if _isfresh(outpath, inbcon):
+        statdf = pd.read_csv(outpath, index_col=[0, 1])
+        return statdf
 
-    statdf = makestats(inbcon, varkeys=varkeys, verbose=verbose, draft=draft)
+    statdf = makestats(
+        inbcon, varkeys=varkeys, verbose=verbose, draft=draft,
+        cachedir=cachedir
+    )
 
     if add_summary:
         statdf = summarize(statdf)
 
     if outpath is not None:
-        statdf.to_csv(outpath)
+        with atomicwrite(outpath) as tmppath:
+            statdf.to_csv(tmppath)
 
     return statdf
 
 
-def makestats(inbcon, varkeys=None, verbose=0, draft=False):
+def makestats(
+    inbcon, varkeys=None, verbose=0, draft=False, alpha=0.005, sidecar=True,
+    workers=1, cachedir=None
+):
     """
     Arguments
     ---------
@@ -222,61 +215,437 @@ def makestats(inbcon, varkeys=None, verbose=0, draft=False):
     verbose : int
         Level of verbosity
     draft : bool
-        If True, use actual_range and actual_median properties instead of file
-        data.
-
+        If True, use actual_* properties (e.g., actual_range, actual_mean, and
+        actual_median) instead of file data.
+    alpha : float
+        Relative accuracy of medians (see stats.QuantileSketch)
+    sidecar : bool
+        If True, use statistics saved with each path (see stats.readsidecar)
+        when they are current and have all varkeys. Otherwise, read data.
+    workers : int
+        Number of processes (see makereport)
+    cachedir : str or None
+        Folder to store and reuse the result of each path (see makereport)
 
     Returns
     -------
     statdf : pandas.DataFrame
         Dataframe with rows for each file and variable combination. Each row
-        has min, mean, median, max, std
+        has min, mean, median, max, std and count. Unless draft,
+        statdf.attrs['stats'] has a stats.RunningStats for each variable
+        merged across files (used by summarize).
+
+    Notes
+    -----
+    Without a sidecar, each variable is read once, one time step at a time,
+    and accumulated with stats.RunningStats. mean, std, min and max are exact;
+    median is within alpha (relative). Sidecars are written by
+    bcon.saveioapi (alpha=0.005).
     """
-    import numpy as np
-    import xarray as xr
+    statdf, vprofs = makereport(
+        inbcon, statkeys=varkeys, funcs=(), draft=draft, alpha=alpha,
+        sidecar=sidecar, workers=workers, verbose=verbose, cachedir=cachedir
+    )
+    return statdf
 
-    stats = {}
+
+def makereport(
+    inbcon, statkeys=None, profkeys=None, funcs=('mean', 'min', 'max'),
+    dostats=True, draft=False, alpha=0.005, sidecar=True, workers=1,
+    verbose=0, cachedir=None
+):
+    """
+    Make statistics (see makestats) and vertical profiles (see make_vertprof)
+    with one pass through the files. Each file is opened once and files are
+    distributed across workers.
+
+    Arguments
+    ---------
+    inbcon : list or str
+        If str, inbcon = sorted(glob.glob(inbcon))
+        If list, items should be str or xarray.Dataset object. Datasets are
+        processed in this process.
+    statkeys : list or None
+        Variable keys for statistics (if None or empty, use all)
+    profkeys : list or None
+        Variable keys for profiles (if None or empty, use all with LAY)
+    funcs : list
+        Profile functions (min, mean, max, median). If empty, no profiles.
+    dostats : bool
+        If False, skip statistics.
+    draft, alpha, sidecar :
+        See makestats (draft and alpha) and make_vertprof (sidecar)
+    workers : int
+        Number of processes. If 1 or less, files are processed in this
+        process.
+    verbose : int
+        Level of verbosity
+    cachedir : str or None
+        Folder to store and reuse the result of each path (see reportkey).
+        Only new or changed paths are processed.
+
+    Returns
+    -------
+    statdf : pandas.DataFrame or None
+        See makestats; None if not dostats
+    vprofs : dict
+        For each func, a Dataset as returned by make_vertprof(func=func)
+    """
     if isinstance(inbcon, str):
         inbcon = sorted(glob.glob(inbcon))
-    n = len(inbcon)
-    for bi, inpath in enumerate(inbcon):
-        if verbose > 0:
+    if not dostats and len(funcs) == 0:
+        return None, {}
+    taskkw = dict(
+        statkeys=statkeys, profkeys=profkeys, funcs=tuple(funcs),
+        dostats=dostats, draft=draft, alpha=alpha, sidecar=sidecar
+    )
+    results = [None] * len(inbcon)
+    cachepaths = [None] * len(inbcon)
+    if cachedir is not None:
+        for i, inpath in enumerate(inbcon):
             if isinstance(inpath, str):
-                print(inpath, flush=True)
+                cachepaths[i] = _reportcachepath(cachedir, inpath, taskkw)
+                results[i] = _loadreport(cachepaths[i], inpath)
+        if verbose > 0:
+            nhit = len([r for r in results if r is not None])
+            print(f'Using {nhit} of {len(inbcon)} cached results', flush=True)
+
+    todo = [i for i, r in enumerate(results) if r is None]
+    inmemory = not all([isinstance(inbcon[i], str) for i in todo])
+    if workers is None or workers <= 1 or len(todo) <= 1 or inmemory:
+        n = len(todo)
+        for ti, i in enumerate(todo):
+            inpath = inbcon[i]
+            if verbose > 0:
+                if isinstance(inpath, str):
+                    print(inpath, flush=True)
+                else:
+                    print(f'\r{ti / n:.2%}', end='', flush=True)
+            results[i] = _filereport(inpath, **taskkw)
+    else:
+        import functools
+        from concurrent.futures import ProcessPoolExecutor
+        workers = min(workers, len(todo))
+        task = functools.partial(_filereport, **taskkw)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            todopaths = [inbcon[i] for i in todo]
+            for i, result in zip(todo, executor.map(task, todopaths)):
+                if verbose > 0:
+                    print(inbcon[i], flush=True)
+                results[i] = result
+    for i in todo:
+        if cachepaths[i] is not None:
+            _savereport(cachepaths[i], results[i])
+
+    statdf = None
+    if dostats:
+        statdf = _statframe(results, draft)
+    vprofs = {}
+    for funcstr in funcs:
+        vprofs[funcstr] = _profdataset(results, funcstr)
+    return statdf, vprofs
+
+
+def reportkey(inpath, **kwds):
+    """
+    Arguments
+    ---------
+    inpath : str
+        Path to a file
+    kwds : mappable
+        Options of the result (e.g., statkeys, funcs)
+
+    Returns
+    -------
+    key : str
+        <pathhash>_<statehash> where pathhash is a fingerprint of the
+        absolute path and kwds, and statehash is a fingerprint of the size
+        and modification time of inpath.
+    """
+    import hashlib
+    import json
+    abspath = os.path.abspath(inpath)
+    pstat = os.stat(inpath)
+    pathtxt = json.dumps([abspath, kwds], sort_keys=True, default=str)
+    pathhash = hashlib.sha1(pathtxt.encode()).hexdigest()[:16]
+    statetxt = f'{pstat.st_size}_{pstat.st_mtime_ns}'
+    statehash = hashlib.sha1(statetxt.encode()).hexdigest()[:16]
+    return f'{pathhash}_{statehash}'
+
+
+def _reportcachepath(cachedir, inpath, taskkw):
+    return os.path.join(
+        cachedir, f'report_{reportkey(inpath, **taskkw)}.pkl'
+    )
+
+
+def _loadreport(cachepath, inpath):
+    """Cached _filereport result or None"""
+    import pickle
+    if not os.path.exists(cachepath):
+        return None
+    try:
+        with open(cachepath, 'rb') as inf:
+            result = pickle.load(inf)
+    except Exception:
+        return None
+    # same file may have been given by another (e.g., relative) path
+    result['path'] = inpath
+    return result
+
+
+def _savereport(cachepath, result):
+    """Save result and remove results of older versions of the same path"""
+    import pickle
+    cachedir = os.path.dirname(cachepath)
+    os.makedirs(cachedir, exist_ok=True)
+    pathhash = os.path.basename(cachepath).split('_')[1]
+    for oldpath in glob.glob(os.path.join(cachedir, f'report_{pathhash}_*')):
+        if oldpath != cachepath:
+            os.remove(oldpath)
+    with atomicwrite(cachepath) as tmppath:
+        with open(tmppath, 'wb') as outf:
+            pickle.dump(result, outf)
+
+
+def _filereport(
+    inpath, statkeys=None, profkeys=None, funcs=(), dostats=True,
+    draft=False, alpha=0.005, sidecar=True
+):
+    """
+    Statistics and profiles of one file (see makereport for arguments).
+    Only statkeys and profkeys are read, and each is read once (see
+    _scanvar) for both statistics and profiles.
+
+    Returns
+    -------
+    result : dict
+        path, rows (for makestats), stats (RunningStats of each variable;
+        empty if draft), time (SDATE * 1000000 + STIME) and profile (Dataset
+        with func and LAY dimensions; None if funcs is empty)
+    """
+    import numpy as np
+    import xarray as xr
+    from .stats import readsidecar
+    from .cmaq import _openioapi
+
+    if isinstance(inpath, str):
+        # lazy; only the header is read until data is needed and NetCDF3
+        # files are memory-mapped (see aqmbc.cmaq.mmapioapi)
+        f = _openioapi(inpath)
+    else:
+        f = inpath
+    records = None
+    if sidecar and isinstance(inpath, str):
+        records = readsidecar(inpath)
+    result = dict(
+        path=inpath, rows={}, stats={}, profile=None,
+        time=f.SDATE * 1000000 + f.STIME
+    )
+    if not dostats:
+        statkeys = []
+    elif statkeys is None or len(statkeys) == 0:
+        statkeys = sorted([k for k in f.data_vars if k != 'TFLAG'])
+    if len(funcs) == 0:
+        profkeys = []
+    elif profkeys is None or len(profkeys) == 0:
+        profkeys = [k for k, v in f.data_vars.items() if 'LAY' in v.dims]
+
+    # statistics and profiles from metadata when possible
+    statrecords = records is not None and all([
+        k in records and records[k]['stats'].sketch.alpha == alpha
+        for k in statkeys
+    ])
+    profrecords = (
+        records is not None
+        and all([k in records for k in profkeys])
+        and all([fs in ('mean', 'min', 'max') for fs in funcs])
+    )
+    scankeys = []
+    if not draft and not statrecords:
+        scankeys.extend(statkeys)
+    if not profrecords:
+        scankeys.extend([k for k in profkeys if k not in scankeys])
+    scans = {}
+    for vark in scankeys:
+        scans[vark] = _scanvar(
+            f[vark], dostats=vark in statkeys and not draft,
+            funcs=funcs if (vark in profkeys and not profrecords) else (),
+            alpha=alpha
+        )
+
+    for vark in statkeys:
+        var = f[vark]
+        if draft:
+            vstd = var.attrs.get('actual_std', np.nan)
+            vmean = var.attrs.get('actual_mean', np.nan)
+            vmedian = var.attrs.get('actual_median', np.nan)
+            vmin, vmax = var.attrs.get('actual_range', np.nan)
+            vcount = var.attrs.get('actual_count', np.nan)
+        else:
+            if statrecords:
+                vstats = records[vark]['stats']
             else:
-                print(f'\r{bi / n:.2%}', end='', flush=True)
-
-        infile = xr.open_dataset(inpath, decode_cf=False)
-        if varkeys is None or len(varkeys) == 0:
-            varkeys = sorted([k for k in infile.data_vars if k != 'TFLAG'])
-        for vark in varkeys:
-            if verbose > 1:
-                print(vark, end='.', flush=True)
-            var = infile[vark]
-            if draft:
-                vstd = var.attrs.get('actual_std', np.nan)
-                vmean = var.attrs.get('actual_mean', np.nan)
-                vmedian = var.attrs.get('actual_median', np.nan)
-                vmin, vmax = var.attrs.get('actual_range', np.nan)
+                vstats = scans[vark][0]
+            result['stats'][vark] = vstats
+            vmedian = vstats.median
+            vmean = float(vstats.mean)
+            vstd = vstats.std
+            vmin = vstats.min
+            vmax = vstats.max
+            vcount = vstats.count
+        result['rows'][vark] = {
+            'unit': var.units.strip(), 'mean': vmean, 'std': vstd,
+            'median': vmedian, 'min': vmin, 'max': vmax, 'count': vcount
+        }
+
+    if len(funcs) > 0:
+        vprofs = {}
+        for k in profkeys:
+            if profrecords:
+                vprof = np.array([
+                    getattr(records[k]['profile'], funcstr)
+                    for funcstr in funcs
+                ])
             else:
-                vl = var[:]
-                vmedian = float(np.median(vl))
-                vmean = float(vl.mean())
-                vstd = float(vl.std())
-                vmin = float(vl.min())
-                vmax = float(vl.max())
-            stats[inpath, vark] = {
-                'unit': var.units.strip(), 'mean': vmean, 'std': vstd,
-                'median': vmedian, 'min': vmin, 'max': vmax
-            }
-        if verbose > 1:
-            print()
+                vprof = scans[k][1]
+            vprofs[k] = (
+                ('func', 'LAY'), vprof.astype(f[k].dtype.newbyteorder('='))
+            )
+        vf = xr.Dataset(vprofs)
+        for vkey in profkeys:
+            vf[vkey].attrs.update(f[vkey].attrs)
+        vf.attrs.update(f.attrs)
+        vf.coords['func'] = list(funcs)
+        result['profile'] = vf
+
+    if isinstance(inpath, str):
+        f.close()
+    return result
+
 
+def _scanvar(var, dostats=True, funcs=(), alpha=0.005, chunkbytes=2**26):
+    """
+    Read var (xarray.DataArray with TSTEP and LAY) once for statistics and
+    layer profiles (reduced over all other dimensions, e.g., TSTEP and PERIM).
+
+    Times are read in chunks of about chunkbytes, so memory is bounded and
+    dask-backed inputs are computed one chunk at a time. A median profile
+    needs all values of each layer, so var is read in one chunk.
+
+    Arguments
+    ---------
+    var : xarray.DataArray
+        Variable to scan
+    dostats : bool
+        If True, accumulate stats.RunningStats
+    funcs : list
+        Profile functions (mean, min, max, median)
+    alpha : float
+        See stats.RunningStats
+
+    Returns
+    -------
+    vstats : stats.RunningStats or None
+        Statistics of all values (None if not dostats)
+    vprof : array or None
+        Profiles with shape (len(funcs), NLAY) (None if funcs is empty)
+    """
+    import numpy as np
+    from .stats import RunningStats, ProfileStats
+
+    vstats = RunningStats(alpha=alpha) if dostats else None
+    if var.ndim == 0:
+        if vstats is not None:
+            vstats.update(var.values)
+        return vstats, None
+    laxis = var.dims.index('LAY') if 'LAY' in var.dims else None
+    vprof = None
+    pstats = None
+    if len(funcs) > 0:
+        pstats = ProfileStats(axis=laxis)
+    nt = var.shape[0]
+    if 'median' in funcs:
+        tchunk = nt
+    else:
+        tbytes = var[0].size * var.dtype.itemsize
+        tchunk = max(1, int(chunkbytes // max(tbytes, 1)))
+    medians = None
+    for t0 in range(0, nt, tchunk):
+        vals = np.asarray(var[t0:t0 + tchunk].values)
+        # one native copy of a chunk is faster than byte-swapping each pass
+        vals = vals.astype(vals.dtype.newbyteorder('='), copy=False)
+        if vstats is not None:
+            vstats.update(vals)
+        if pstats is not None:
+            pstats.update(vals)
+            if 'median' in funcs:
+                lvals = np.moveaxis(vals, laxis, 0)
+                lvals = lvals.reshape(lvals.shape[0], -1)
+                medians = np.median(lvals, axis=1)
+                # like xarray, skip nan (slower, so only where needed)
+                hasnan = np.isnan(medians)
+                if hasnan.any():
+                    medians[hasnan] = np.nanmedian(lvals[hasnan], axis=1)
+    if pstats is not None:
+        vprof = np.array([
+            medians if funcstr == 'median' else getattr(pstats, funcstr)
+            for funcstr in funcs
+        ])
+    return vstats, vprof
+
+
+def _statframe(results, draft=False):
+    """Combine _filereport rows and stats (see makestats)"""
+    stats = {}
+    allstats = {}
+    for result in results:
+        for vark, row in result['rows'].items():
+            stats[result['path'], vark] = row
+        for vark, vstats in result['stats'].items():
+            if vark in allstats:
+                allstats[vark].merge(vstats)
+            else:
+                allstats[vark] = vstats
     statdf = pd.DataFrame.from_dict(stats, orient='index')
     statdf.index.names = ['path', 'variable']
+    if not draft:
+        statdf.attrs['stats'] = allstats
     return statdf
 
 
+def _profdataset(results, funcstr):
+    """
+    Combine _filereport profiles for funcstr (see make_vertprof). If funcstr
+    is a list, results is a dictionary of Datasets (one per func) and they
+    are combined along func.
+    """
+    import numpy as np
+    import xarray as xr
+
+    if not isinstance(funcstr, str):
+        vf = xr.concat([results[fs] for fs in funcstr], dim='func')
+        vf.coords['func'] = list(funcstr)
+        return vf.transpose('TSTEP', 'func', 'LAY')
+    vfs = [r['profile'].sel(func=funcstr) for r in results]
+    vf = xr.concat(vfs, dim='TSTEP')
+    last = vfs[-1]
+    for vkey in last.data_vars:
+        vf[vkey].attrs.update(last[vkey].attrs)
+    vf.attrs.update(last.attrs)
+    vglvls = np.asarray(last.attrs['VGLVLS'])
+    vf.coords['LAY'] = (vglvls[1:] + vglvls[:-1]) / 2
+    ts = [r['time'] for r in results]
+    try:
+        vf.coords['TSTEP'] = pd.to_datetime(ts, format='%Y%j%H%M%S')
+    except Exception:
+        # time-independent files cannot know their time. Use sequence
+        # starting at 1
+        vf.coords['TSTEP'] = np.arange(vf.sizes['TSTEP']) + 1
+        pass
+    return vf
+
+
 def summarize(statdf, append=True):
     """
     Arguments
@@ -289,15 +658,38 @@ def summarize(statdf, append=True):
     Returns
     -------
     statdf : pandas.DataFrame
-        Add Overall record for each variable where mean and std are averages,
-        unit and min are their minimums, max is its maximum, and median is its
-        median.
+        Add Overall record for each variable where unit and min are their
+        minimums and max is its maximum. If count is available, mean and std
+        are for all values combined (exact). Otherwise, mean and std are
+        averages. median is from the merged stats (statdf.attrs['stats'])
+        when available. Otherwise, it is the median of medians.
     """
-    summarydf = statdf.groupby(['variable']).agg(
+    import numpy as np
+    aggkw = dict(
         unit=('unit', 'min'), mean=('mean', 'mean'),
         median=('median', 'median'),
         std=('std', 'mean'), max=('max', 'max'), min=('min', 'min')
     )
+    hascount = 'count' in statdf.columns and statdf['count'].notna().all()
+    if hascount:
+        aggkw['count'] = ('count', 'sum')
+    summarydf = statdf.groupby(['variable']).agg(**aggkw)
+    if hascount:
+        # combine means and variances using counts (exact)
+        vardf = statdf.reset_index('variable')
+        count = vardf['count']
+        wsum = (vardf['mean'] * count).groupby(vardf['variable']).sum()
+        mean = wsum / summarydf['count']
+        dev = vardf['mean'] - mean.reindex(vardf['variable']).values
+        m2 = (
+            count * (vardf['std']**2 + dev**2)
+        ).groupby(vardf['variable']).sum()
+        summarydf['mean'] = mean
+        summarydf['std'] = np.sqrt(m2 / summarydf['count'])
+    allstats = statdf.attrs.get('stats', {})
+    for vark in summarydf.index:
+        if vark in allstats:
+            summarydf.loc[vark, 'median'] = allstats[vark].median
     summarydf['path'] = 'Overall'
     summarydf = summarydf.reset_index().set_index(['path', 'variable'])
     if append:
@@ -354,7 +746,13 @@ def barplot(ds, bar_kw=None):
 
 def reportfromcfg(cfgobjs, cfgtype='path'):
     """
-    Runs getstats, and get_vertprof and save to disk
+    Make statistics (see getstats) and mean, min and max vertical profiles
+    (see get_vertprof) and save to disk. Each BCON file is opened once and
+    files are distributed across workers ([common] workers; see makereport).
+    Outputs are only remade if any is older than any BCON file. Then, only
+    new or changed BCON files are processed; results of the others are
+    reused from [REPORT] cachedir (default: reportcache in the folder of
+    summary).
     If summaryfigs='y', run plot_gaspm_bars and plot_2spc_vprof and save
     results to disk.
 
@@ -372,6 +770,7 @@ def reportfromcfg(cfgobjs, cfgtype='path'):
     from . import loadcfg
     import json
     import pandas as pd
+    import xarray as xr
 
     cfg = loadcfg(cfgobjs, cfgtype=cfgtype)
     dofigs = cfg.get('REPORT', 'standardfigs').lower()[:1] in ('y', 't', '1')
@@ -379,15 +778,44 @@ def reportfromcfg(cfgobjs, cfgtype='path'):
         cfg.get('BCON', 'start_date'), cfg.get('BCON', 'end_date')
     )
     verbose = int(cfg.get('common', 'verbose'))
+    workers = cfg.getint('common', 'workers')
     outtmpl = cfg.get('BCON', 'output')
     inpaths = [d.strftime(outtmpl) for d in dates]
     sumpath = cfg.get('REPORT', 'summary')
-    varkeys = json.loads(cfg.get('REPORT', 'summaryspcs'))
+    statkeys = json.loads(cfg.get('REPORT', 'summaryspcs'))
+    profkeys = json.loads(cfg.get('REPORT', 'vprofspcs'))
+    vpaths = {
+        funcstr: cfg.get('REPORT', f'vprof{funcstr}')
+        for funcstr in ['mean', 'min', 'max']
+    }
+    outpaths = [sumpath] + list(vpaths.values())
+    for outpath in outpaths:
+        os.makedirs(os.path.dirname(outpath) or '.', exist_ok=True)
+
+    cachedir = cfg.get('REPORT', 'cachedir')
+    if cachedir == '':
+        cachedir = os.path.join(os.path.dirname(sumpath), 'reportcache')
+
+    if all([_isfresh(outpath, inpaths) for outpath in outpaths]):
+        statdf = pd.read_csv(sumpath, index_col=[0, 1])
+        vprofs = {}
+        for funcstr, vpath in vpaths.items():
+            with xr.open_dataset(vpath) as vf:
+                vprofs[funcstr] = vf.load()
+    else:
+        # unchanged files are reused from cachedir
+        statdf, vprofs = makereport(
+            inpaths, statkeys=statkeys, profkeys=profkeys,
+            funcs=list(vpaths), workers=workers, verbose=verbose,
+            cachedir=cachedir
+        )
+        statdf = summarize(statdf)
+        with atomicwrite(sumpath) as tmppath:
+            statdf.to_csv(tmppath)
+        for funcstr, vpath in vpaths.items():
+            with atomicwrite(vpath) as tmppath:
+                vprofs[funcstr].to_netcdf(tmppath)
     print(sumpath)
-    os.makedirs(os.path.dirname(sumpath), exist_ok=True)
-    statdf = getstats(
-        inpaths, varkeys=varkeys, verbose=verbose, outpath=sumpath
-    )
     datadesc = f'({dates[0]:%F} to {dates[-1]:%F}, n={len(dates)})'
     if dofigs:
         for metric in ['median', 'mean', 'min', 'max']:
@@ -397,15 +825,9 @@ def reportfromcfg(cfgobjs, cfgtype='path'):
                 horizontalalignment='right', verticalalignment='top'
             )
             fig.savefig(sumpath + f'.{metric}.png')
-    varkeys = json.loads(cfg.get('REPORT', 'profilespcs'))
-    for funcstr in ['mean', 'min', 'max']:
-        vpath = cfg.get('REPORT', f'profile{funcstr}')
-        os.makedirs(os.path.dirname(vpath), exist_ok=True)
+    for funcstr, vpath in vpaths.items():
         print(vpath)
-        bf = get_vertprof(
-            inpaths, varkeys=varkeys, func=funcstr, verbose=verbose,
-            outpath=vpath
-        )
+        bf = vprofs[funcstr]
         if dofigs:
             fig = plot_2spc_vprof(bf)
             fig.axes[0].set_title(f'{funcstr.title()} around perimiter')
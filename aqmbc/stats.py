@@ -0,0 +1,425 @@
+__all__ = [
+    'QuantileSketch', 'RunningStats', 'ProfileStats', 'sidecarpath',
+    'writesidecar', 'readsidecar'
+]
+__doc__ = """
+One-pass, mergeable statistics for reporting.
+
+* RunningStats : count, mean and variance (Welford/Chan), min and max, plus
+  a QuantileSketch for the median. Update chunk-by-chunk and merge across
+  files; mean, std, min and max are exact.
+* QuantileSketch : log-bucketed histogram (as in DDSketch) whose quantiles
+  have a relative error of at most alpha and that merges exactly.
+* ProfileStats : count, sum, min and max for each layer (vertical profile).
+* writesidecar/readsidecar : store RunningStats and ProfileStats of each
+  variable next to an output file (path + '.stats.json') so reports can be
+  made without reading data.
+
+Example
+=======
+
+stats = RunningStats()
+for ti in range(nt):
+    stats.update(var[ti])
+print(stats.mean, stats.std, stats.median)
+"""
+import os
+import json
+import numpy as np
+from .manifest import atomicwrite
+
+
+def _mergecounts(keys, counts, newkeys, newcounts):
+    """Add newcounts at newkeys to counts at keys; returns sorted keys"""
+    allkeys = np.concatenate([keys, newkeys])
+    allcounts = np.concatenate([counts, newcounts])
+    ukeys, inv = np.unique(allkeys, return_inverse=True)
+    ucounts = np.bincount(inv.ravel(), weights=allcounts, minlength=len(ukeys))
+    return ukeys, ucounts.astype('i8')
+
+
+class QuantileSketch:
+    def __init__(self, alpha=0.005):
+        """
+        Histogram with buckets whose width grows with magnitude so that any
+        value in a bucket is within alpha (relative) of the bucket value.
+
+        Arguments
+        ---------
+        alpha : float
+            Relative accuracy of quantiles (e.g., 0.005 is 0.5%)
+        """
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._lngamma = np.log(self.gamma)
+        self.zeros = 0
+        self.pos = (np.zeros(0, dtype='i8'), np.zeros(0, dtype='i8'))
+        self.neg = (np.zeros(0, dtype='i8'), np.zeros(0, dtype='i8'))
+
+    @property
+    def count(self):
+        return int(self.zeros + self.pos[1].sum() + self.neg[1].sum())
+
+    def _index(self, absvals):
+        """bucket keys; absvals (float32 or float64) is overwritten"""
+        keys = np.log(absvals, out=absvals)
+        keys *= keys.dtype.type(1 / self._lngamma)
+        return np.ceil(keys, out=keys).astype('i8')
+
+    def _value(self, keys):
+        return 2 * self.gamma ** keys.astype('d') / (self.gamma + 1)
+
+    def update(self, values):
+        """
+        Add values (array-like; must be finite) to the sketch. float32
+        values are indexed in float32, which is faster and adds at most
+        ~1e-5 to the relative error.
+        """
+        values = np.asarray(values)
+        if values.dtype.char not in ('f', 'd'):
+            values = values.astype('d')
+        values = values.ravel()
+        if values.size == 0:
+            return self
+        if values.min() > 0:
+            # usual case (e.g., concentrations); copy is overwritten
+            parts = [('pos', values.copy())]
+        else:
+            parts = [('pos', values[values > 0]), ('neg', -values[values < 0])]
+            self.zeros += int(np.count_nonzero(values == 0))
+        for store, absvals in parts:
+            if absvals.size == 0:
+                continue
+            keys = self._index(absvals)
+            kmin = keys.min()
+            counts = np.bincount(keys - kmin)
+            found = counts > 0
+            setattr(self, store, _mergecounts(
+                *getattr(self, store),
+                np.arange(kmin, kmin + counts.size)[found], counts[found]
+            ))
+        return self
+
+    def merge(self, other):
+        """
+        Add counts from other (must have the same alpha) to this sketch.
+        """
+        if other.alpha != self.alpha:
+            raise ValueError(
+                f'alpha must match to merge; got {self.alpha}, {other.alpha}'
+            )
+        self.pos = _mergecounts(*self.pos, *other.pos)
+        self.neg = _mergecounts(*self.neg, *other.neg)
+        self.zeros += other.zeros
+        return self
+
+    def quantile(self, q):
+        """
+        Arguments
+        ---------
+        q : float
+            Quantile (0-1). Like np.quantile (linear), values at ranks
+            floor(q * (n - 1)) and ceil(q * (n - 1)) are interpolated.
+
+        Returns
+        -------
+        value : float
+            Approximate quantile; nan if the sketch is empty.
+        """
+        n = self.count
+        if n == 0:
+            return np.nan
+        # ascending: most negative first, zeros, then positive
+        nkeys, ncounts = self.neg
+        pkeys, pcounts = self.pos
+        values = np.concatenate([
+            -self._value(nkeys[::-1]), [0.], self._value(pkeys)
+        ])
+        counts = np.concatenate([ncounts[::-1], [self.zeros], pcounts])
+        cumcounts = np.cumsum(counts)
+        rank = q * (n - 1)
+        lo, hi = int(np.floor(rank)), int(np.ceil(rank))
+        vlo, vhi = values[np.searchsorted(cumcounts, [lo, hi], side='right')]
+        return float(vlo + (vhi - vlo) * (rank - lo))
+
+    def todict(self):
+        """Returns dictionary of alpha, zeros and buckets (see fromdict)"""
+        return dict(
+            alpha=self.alpha, zeros=self.zeros,
+            poskeys=self.pos[0].tolist(), poscounts=self.pos[1].tolist(),
+            negkeys=self.neg[0].tolist(), negcounts=self.neg[1].tolist(),
+        )
+
+    @classmethod
+    def fromdict(cls, d):
+        """Inverse of todict"""
+        out = cls(alpha=d['alpha'])
+        out.zeros = int(d['zeros'])
+        out.pos = (
+            np.asarray(d['poskeys'], dtype='i8'),
+            np.asarray(d['poscounts'], dtype='i8')
+        )
+        out.neg = (
+            np.asarray(d['negkeys'], dtype='i8'),
+            np.asarray(d['negcounts'], dtype='i8')
+        )
+        return out
+
+
+class RunningStats:
+    def __init__(self, alpha=0.005):
+        """
+        Accumulate count, mean, sum of squared deviations (m2), min, max and
+        a QuantileSketch one chunk at a time.
+
+        Arguments
+        ---------
+        alpha : float
+            Relative accuracy of the median (see QuantileSketch)
+        """
+        self.count = 0
+        self.mean = 0.
+        self.m2 = 0.
+        self.min = np.inf
+        self.max = -np.inf
+        self.sketch = QuantileSketch(alpha=alpha)
+
+    def _combine(self, count, mean, m2, vmin, vmax):
+        """Chan et al. parallel update of count, mean and m2"""
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta**2 * self.count * count / total
+        self.count = total
+        self.min = min(self.min, vmin)
+        self.max = max(self.max, vmax)
+
+    def update(self, values):
+        """
+        Add values (array-like); masked and non-finite values are skipped.
+        Statistics are accumulated in float64.
+        """
+        values = np.ma.asarray(values)
+        if np.ma.is_masked(values):
+            values = values.compressed()
+        values = np.asarray(values).ravel()
+        isfinite = np.isfinite(values)
+        if not isfinite.all():
+            values = values[isfinite]
+        if values.size == 0:
+            return self
+        mean = values.mean(dtype='d')
+        dev = np.subtract(values, mean, dtype='d')
+        m2 = np.dot(dev, dev)
+        vmin = float(values.min())
+        vmax = float(values.max())
+        self._combine(values.size, mean, m2, vmin, vmax)
+        self.sketch.update(values)
+        return self
+
+    def merge(self, other):
+        """Add other (RunningStats) to this one"""
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+        self.sketch.merge(other.sketch)
+        return self
+
+    @property
+    def var(self):
+        """Population variance (ddof=0, like np.var)"""
+        if self.count == 0:
+            return np.nan
+        return self.m2 / self.count
+
+    @property
+    def std(self):
+        """Population standard deviation (ddof=0, like np.std)"""
+        return float(np.sqrt(self.var))
+
+    @property
+    def median(self):
+        """Approximate median (see QuantileSketch.quantile)"""
+        return self.sketch.quantile(0.5)
+
+    def todict(self):
+        """Returns dictionary of all properties (see fromdict)"""
+        return dict(
+            count=self.count, mean=float(self.mean), m2=float(self.m2),
+            min=float(self.min), max=float(self.max),
+            sketch=self.sketch.todict()
+        )
+
+    @classmethod
+    def fromdict(cls, d):
+        """Inverse of todict"""
+        out = cls(alpha=d['sketch']['alpha'])
+        out.count = int(d['count'])
+        out.mean = d['mean']
+        out.m2 = d['m2']
+        out.min = d['min']
+        out.max = d['max']
+        out.sketch = QuantileSketch.fromdict(d['sketch'])
+        return out
+
+
+class ProfileStats:
+    def __init__(self, axis=1):
+        """
+        Accumulate count, sum, min and max for each index along axis (e.g.,
+        LAY in TSTEP, LAY, PERIM) one chunk at a time.
+
+        Arguments
+        ---------
+        axis : int
+            Axis of values passed to update that is kept
+        """
+        self.axis = axis
+        self.count = None
+        self.sum = None
+        self.min = None
+        self.max = None
+
+    def update(self, values):
+        """
+        Add values (array-like); non-finite values are skipped. Sums are
+        accumulated in float64.
+        """
+        values = np.ma.asarray(values)
+        if np.ma.is_masked(values):
+            values = values.astype('d').filled(np.nan)
+        values = np.asarray(values)
+        axis = self.axis % values.ndim
+        others = tuple([i for i in range(values.ndim) if i != axis])
+        # reduce without copying; sums are only finite if all values are
+        vsum = values.sum(others, dtype='d')
+        if np.isfinite(vsum).all():
+            count = np.full(vsum.shape, values.size // vsum.size, dtype='i8')
+            vmin = values.min(others).astype('d')
+            vmax = values.max(others).astype('d')
+        else:
+            isfinite = np.isfinite(values)
+            count = isfinite.sum(others)
+            vsum = np.where(isfinite, values, 0).sum(others, dtype='d')
+            vmin = np.where(isfinite, values, np.inf).min(others).astype('d')
+            vmax = np.where(isfinite, values, -np.inf).max(others).astype('d')
+        self._combine(count, vsum, vmin, vmax)
+        return self
+
+    def _combine(self, count, vsum, vmin, vmax):
+        if self.count is None:
+            self.count = count
+            self.sum = vsum
+            self.min = vmin
+            self.max = vmax
+        else:
+            self.count = self.count + count
+            self.sum = self.sum + vsum
+            self.min = np.minimum(self.min, vmin)
+            self.max = np.maximum(self.max, vmax)
+
+    def merge(self, other):
+        """Add other (ProfileStats with the same length) to this one"""
+        if other.count is not None:
+            self._combine(other.count, other.sum, other.min, other.max)
+        return self
+
+    @property
+    def mean(self):
+        """Mean of each layer (nan where count is 0)"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 0, self.sum / self.count, np.nan)
+
+    def todict(self):
+        """Returns dictionary of all properties (see fromdict)"""
+        return dict(
+            axis=self.axis, count=self.count.tolist(), sum=self.sum.tolist(),
+            min=self.min.tolist(), max=self.max.tolist()
+        )
+
+    @classmethod
+    def fromdict(cls, d):
+        """Inverse of todict"""
+        out = cls(axis=d['axis'])
+        out.count = np.asarray(d['count'], dtype='i8')
+        out.sum = np.asarray(d['sum'], dtype='d')
+        out.min = np.asarray(d['min'], dtype='d')
+        out.max = np.asarray(d['max'], dtype='d')
+        return out
+
+
+def sidecarpath(path):
+    """Path of the statistics stored for path (see writesidecar)"""
+    return path + '.stats.json'
+
+
+def writesidecar(path, records):
+    """
+    Save statistics of each variable in path to sidecarpath(path). The size
+    and modification time of path are stored so that readsidecar can reject
+    statistics that no longer describe path; write after path is complete
+    (e.g., after sync).
+
+    Arguments
+    ---------
+    path : str
+        Path of the file that the statistics describe
+    records : mappable
+        For each variable, a dictionary with units (str), stats
+        (RunningStats) and profile (ProfileStats)
+
+    Returns
+    -------
+    outpath : str
+        Path of the sidecar
+    """
+    pstat = os.stat(path)
+    out = dict(
+        path=os.path.basename(path), size=pstat.st_size,
+        mtime_ns=pstat.st_mtime_ns, variables={
+            key: dict(
+                units=rec['units'], stats=rec['stats'].todict(),
+                profile=rec['profile'].todict()
+            )
+            for key, rec in records.items()
+        }
+    )
+    outpath = sidecarpath(path)
+    with atomicwrite(outpath) as tmppath:
+        with open(tmppath, 'w') as outf:
+            json.dump(out, outf)
+    return outpath
+
+
+def readsidecar(path):
+    """
+    Arguments
+    ---------
+    path : str
+        Path of a file written with a sidecar (see writesidecar)
+
+    Returns
+    -------
+    records : dict or None
+        For each variable, units, stats (RunningStats) and profile
+        (ProfileStats). None if the sidecar does not exist or if path has
+        changed (size or modification time) since it was written.
+    """
+    spath = sidecarpath(path)
+    if not os.path.exists(spath) or not os.path.exists(path):
+        return None
+    with open(spath, 'r') as inf:
+        sidecar = json.load(inf)
+    pstat = os.stat(path)
+    if (
+        sidecar['size'] != pstat.st_size
+        or sidecar['mtime_ns'] != pstat.st_mtime_ns
+    ):
+        return None
+    return {
+        key: dict(
+            units=rec['units'], stats=RunningStats.fromdict(rec['stats']),
+            profile=ProfileStats.fromdict(rec['profile'])
+        )
+        for key, rec in sidecar['variables'].items()
+    }
@@ -1,12 +1,9 @@
-def test_bconfromcmaq():
-    import tempfile
+def _makecase(tdir, ndays=1):
+    """Write GRIDDESC, expression, config, and CMAQ inputs to tdir"""
     from os.path import join
-    import glob
     import PseudoNetCDF as pnc
     import numpy as np
-    from .. import runcfg
 
-    tdir = tempfile.TemporaryDirectory()
     gdpath = join(tdir.name, 'GRIDDESC')
     cfgpath = join(tdir.name, 'test.cfg')
     exprpath = join(tdir.name, 'test.expr')
@@ -52,18 +49,32 @@ start_date=2022-01-01
 end_date=2022-01-01
 freq=d
 output=${rcpath}/test.bcon.%Y%m%d.nc
-""")
+""".replace('end_date=2022-01-01', f'end_date=2022-01-{ndays:02d}'))
         cfgf.flush()
 
-    concpath = join(tdir.name, 'test_input_20220101.nc')
-    cf = pnc.pncopen(
-        gdpath, format='griddesc', GDNAM='1188NHEMI2', FTYPE=1,
-        SDATE=2022001, STIME=0, TSTEP=10000, nsteps=24,
-        VGLVLS=np.asarray([1., .8, .6, .4, .2, 0]),
-        var_kwds={'O3': 'ppb'}, withcf=False
-    )
-    cf.variables['O3'][:, :, :, :] = np.arange(5)[None, :, None, None] + 1
-    cf.save(concpath, verbose=0)
+    for d in range(ndays):
+        concpath = join(tdir.name, f'test_input_202201{d + 1:02d}.nc')
+        cf = pnc.pncopen(
+            gdpath, format='griddesc', GDNAM='1188NHEMI2', FTYPE=1,
+            SDATE=2022001 + d, STIME=0, TSTEP=10000, nsteps=24,
+            VGLVLS=np.asarray([1., .8, .6, .4, .2, 0]),
+            var_kwds={'O3': 'ppb'}, withcf=False
+        )
+        cf.variables['O3'][:, :, :, :] = np.arange(5)[None, :, None, None] + 1
+        cf.save(concpath, verbose=0)
+
+    return cfgpath
+
+
+def test_bconfromcmaq():
+    import tempfile
+    from os.path import join
+    import glob
+    import PseudoNetCDF as pnc
+    from .. import runcfg
+
+    tdir = tempfile.TemporaryDirectory()
+    cfgpath = _makecase(tdir)
     runcfg([cfgpath])
     iconpath = glob.glob(join(tdir.name, 'test.icon.*.nc'))[0]
     bconpath = glob.glob(join(tdir.name, 'test.bcon.*.nc'))[0]
@@ -75,3 +86,347 @@ output=${rcpath}/test.bcon.%Y%m%d.nc
     assert bcf.NCOLS == 60
     print(bcf.variables['O3'][0, :, 0])
     assert len(bcf.dimensions['PERIM']) == (50 * 2 + 60 * 2 + 4)
+
+
+def test_runcfgworkers():
+    import tempfile
+    from os.path import join
+    import PseudoNetCDF as pnc
+    import numpy as np
+    from .. import runcfg
+
+    sdir = tempfile.TemporaryDirectory()
+    scfgpath = _makecase(sdir, ndays=2)
+    runcfg([scfgpath], workers=1)
+    tdir = tempfile.TemporaryDirectory()
+    cfgpath = _makecase(tdir, ndays=2)
+    results = runcfg([cfgpath], workers=2)
+    assert [r['status'] for r in results] == ['ok', 'ok', 'ok']
+    for key in ['bcon.20220101', 'bcon.20220102', 'icon.20220101']:
+        sf = pnc.pncopen(join(sdir.name, f'test.{key}.nc'), format='ioapi')
+        tf = pnc.pncopen(join(tdir.name, f'test.{key}.nc'), format='ioapi')
+        assert np.allclose(sf.variables['O3'][:], tf.variables['O3'][:])
+    results = runcfg([cfgpath], workers=2)
+    assert [r['status'] for r in results] == ['cached', 'cached', 'cached']
+
+
+def test_cellmap():
+    import tempfile
+    import glob
+    from unittest import mock
+    from os.path import join
+    import PseudoNetCDF as pnc
+    import numpy as np
+    from .. import bcon
+
+    tdir = tempfile.TemporaryDirectory()
+    _makecase(tdir)
+    gdpath = join(tdir.name, 'GRIDDESC')
+    varf = pnc.pncopen(
+        join(tdir.name, 'test_input_20220101.nc'), format='ioapi'
+    )
+    metaf = pnc.pncopen(
+        gdpath, format='griddesc', GDNAM='108US1', FTYPE=2,
+        VGLVLS=np.asarray([1., .5, 0]), VGTOP=5000.
+    )
+    dimkeys = {'ROW': 'ROW', 'COL': 'COL', 'TSTEP': 'TSTEP', 'LAY': 'LAY'}
+    lon = metaf.variables['longitude']
+    lat = metaf.variables['latitude']
+    chki, chkj = varf.ll2ij(lon, lat, bounds='warn', clean='clip')
+    bcon._cellmaps.clear()
+    i, j = bcon.getcellmap(varf, metaf, dimkeys, mapdir=tdir.name)
+    assert np.all(i == chki) and np.all(j == chkj)
+    assert len(glob.glob(join(tdir.name, 'cellmap_108US1_2_*.npz'))) == 1
+
+    # second request must come from memory or disk, not ll2ij
+    noll2ij = AssertionError('ll2ij should not be called')
+    with mock.patch.object(type(varf), 'll2ij', side_effect=noll2ij):
+        i, j = bcon.getcellmap(varf, metaf, dimkeys, mapdir=tdir.name)
+        bcon._cellmaps.clear()
+        i, j = bcon.getcellmap(varf, metaf, dimkeys, mapdir=tdir.name)
+    assert np.all(i == chki) and np.all(j == chkj)
+
+
+def test_bctchunk():
+    import tempfile
+    from os.path import join
+    import netCDF4 as nc
+    import PseudoNetCDF as pnc
+    import numpy as np
+    from .. import bcon
+
+    tdir = tempfile.TemporaryDirectory()
+    _makecase(tdir)
+    inpath = join(tdir.name, 'test_input_20220101.nc')
+    with nc.Dataset(inpath, mode='r+') as inf:
+        o3 = inf.variables['O3']
+        o3[:] = o3[:] * (np.arange(24) + 1)[:, None, None, None]
+    metaf = pnc.pncopen(
+        join(tdir.name, 'GRIDDESC'), format='griddesc', GDNAM='108US1',
+        FTYPE=2, VGLVLS=np.asarray([1., .75, .5, .25, 0]), VGTOP=5000.
+    )
+    exprpaths = [join(tdir.name, 'test.expr')]
+    outpaths = []
+    for tchunk in [None, 5]:
+        outpath = join(tdir.name, f'test.tchunk{tchunk}.nc')
+        out = bcon.bc(
+            inpath, outpath, metaf, exprpaths=exprpaths, tchunk=tchunk,
+            vmethod='linear', history='tchunk', minvalue=1e-30
+        )
+        out.close()
+        outpaths.append(outpath)
+
+    chkf = pnc.pncopen(outpaths[1], format='ioapi')
+    assert chkf.variables['TFLAG'][-1, 0, 1] == 230000
+    _samebc(*outpaths)
+
+    # source with a fixed-size (not unlimited) time dimension
+    from os.path import dirname
+    from .. import options
+    from ..benchmarks import synthetic
+    from ..exprlib import exprpaths as getexprpaths
+    inpath = synthetic.waccm(
+        join(tdir.name, 'waccm.nc'), nlon=24, nlat=12, nlev=10, ntimes=8
+    )
+    with nc.Dataset(inpath) as inf:
+        assert not inf.dimensions['time'].isunlimited()
+    gdpath = join(dirname(dirname(__file__)), 'examples', 'GRIDDESC')
+    metaf = options.getmetaf('bcon', 'TEST', 'EPA_35L', gdpath=gdpath)
+    exprpaths = list(getexprpaths(['waccm_o3so4.expr'], prefix='waccm'))
+    outpaths = []
+    for tchunk in [None, 3]:
+        outpath = join(tdir.name, f'waccm.tchunk{tchunk}.nc')
+        out = bcon.bc(
+            inpath, outpath, metaf, exprpaths=exprpaths, tchunk=tchunk,
+            format_kw={'format': 'waccm'}, dimkeys=options.dims['waccm'],
+            verbose=0
+        )
+        out.close()
+        outpaths.append(outpath)
+    _samebc(*outpaths)
+
+
+def _samebc(refpath, chkpath):
+    """Assert refpath and chkpath are identical except for time stamps"""
+    import netCDF4 as nc
+    import numpy as np
+
+    stamps = ['CDATE', 'CTIME', 'WDATE', 'WTIME']
+    with nc.Dataset(refpath) as reff, nc.Dataset(chkpath) as chkf:
+        assert reff.ncattrs() == chkf.ncattrs()
+        for key in reff.ncattrs():
+            if key not in stamps:
+                assert np.all(reff.getncattr(key) == chkf.getncattr(key))
+        assert reff.dimensions.keys() == chkf.dimensions.keys()
+        for key, refv in reff.variables.items():
+            chkv = chkf.variables[key]
+            assert refv.dtype == chkv.dtype
+            assert refv.__dict__.keys() == chkv.__dict__.keys()
+            for akey, aval in refv.__dict__.items():
+                if akey.startswith('actual_'):
+                    # statistics merged by chunk differ by rounding
+                    assert np.allclose(aval, chkv.getncattr(akey))
+                else:
+                    assert np.all(aval == chkv.getncattr(akey))
+            assert np.array_equal(refv[:], chkv[:])
+
+
+def test_cellwndw():
+    import tempfile
+    from os.path import join
+    import netCDF4 as nc
+    import PseudoNetCDF as pnc
+    import numpy as np
+    from .. import bcon
+
+    tdir = tempfile.TemporaryDirectory()
+    _makecase(tdir)
+    inpath = join(tdir.name, 'test_input_20220101.nc')
+    with nc.Dataset(inpath, mode='r+') as inf:
+        o3 = inf.variables['O3']
+        o3[:] = np.random.default_rng(0).random(o3.shape) + 1
+    metaf = pnc.pncopen(
+        join(tdir.name, 'GRIDDESC'), format='griddesc', GDNAM='108US1',
+        FTYPE=2, VGLVLS=np.asarray([1., .75, .5, .25, 0]), VGTOP=5000.
+    )
+    dimkeys = {'ROW': 'ROW', 'COL': 'COL', 'TSTEP': 'TSTEP', 'LAY': 'LAY'}
+
+    # strips hold every unique cell
+    varf = pnc.pncopen(inpath, format='ioapi')
+    i, j = bcon.getcellmap(varf, metaf, dimkeys)
+    cells, inverse, strips = bcon.cellstrips(i, j, maxwaste=1)
+    assert np.array_equal(cells[inverse], np.stack([j, i], axis=1))
+    allidx = np.sort(np.concatenate([idx for _, _, idx in strips]))
+    assert np.array_equal(allidx, np.arange(cells.shape[0]))
+    for rslice, cslice, idx in strips:
+        cj, ci = cells[idx].T
+        assert np.all((cj >= rslice.start) & (cj < rslice.stop))
+        assert np.all((ci >= cslice.start) & (ci < cslice.stop))
+    # merged into one read of the rectangle that bounds every cell
+    cells, inverse, strips = bcon.cellstrips(i, j, maxwaste=1, maxreads=1)
+    assert len(strips) == 1
+    rslice, cslice, idx = strips[0]
+    assert (rslice.start, rslice.stop) == (j.min(), j.max() + 1)
+    assert (cslice.start, cslice.stop) == (i.min(), i.max() + 1)
+    assert np.array_equal(np.sort(idx), np.arange(cells.shape[0]))
+
+    # same values as the rectangular window, with and without tchunk
+    exprpaths = [join(tdir.name, 'test.expr')]
+    for tchunk in [None, 10]:
+        outs = []
+        for perimeter in [False, True]:
+            outpath = join(tdir.name, f'test.{tchunk}.{perimeter}.nc')
+            out = bcon.bc(
+                inpath, outpath, metaf, exprpaths=exprpaths, tchunk=tchunk,
+                vmethod='linear', perimeter=perimeter, verbose=0
+            )
+            out.close()
+            outs.append(pnc.pncopen(outpath, format='ioapi'))
+        for key in ['TFLAG', 'O3']:
+            refv = outs[0].variables[key][:]
+            assert np.array_equal(refv, outs[1].variables[key][:])
+
+
+def test_lazysubset(capsys):
+    import tempfile
+    from os.path import join
+    from unittest import mock
+    import PseudoNetCDF as pnc
+    from .. import bcon
+
+    tdir = tempfile.TemporaryDirectory()
+    _makecase(tdir)
+    inpath = join(tdir.name, 'test_input_20220101.nc')
+    infile = pnc.pncopen(inpath, format='ioapi')
+    outf = bcon.lazysubset(infile, ['O3'], verbose=1)
+    assert 'O3' in outf.variables
+    assert capsys.readouterr().out == ''
+    # readers that cannot subset in place fall back to subset
+    infile = pnc.pncopen(inpath, format='ioapi')
+    nosubset = AttributeError('subsetVariables')
+    cls = type(infile)
+    with mock.patch.object(cls, 'subsetVariables', side_effect=nosubset):
+        outf = bcon.lazysubset(infile, ['O3'], verbose=1)
+    assert 'O3' in outf.variables
+    assert 'using subset' in capsys.readouterr().out
+    # other errors are not hidden
+    infile = pnc.pncopen(inpath, format='ioapi')
+    with mock.patch.object(cls, 'subsetVariables', side_effect=IOError):
+        try:
+            bcon.lazysubset(infile, ['O3'])
+        except IOError:
+            pass
+        else:
+            raise AssertionError('IOError should not be caught')
+
+
+def test_stagelog():
+    import tempfile
+    from os.path import join
+    import pandas as pd
+    from .. import runcfg
+
+    tdir = tempfile.TemporaryDirectory()
+    cfgpath = _makecase(tdir, ndays=2)
+    stagecsv = join(tdir.name, 'stages.csv')
+    with open(cfgpath, 'a') as cfgf:
+        cfgf.write(f'\n[common]\nstagecsv={stagecsv}\ntchunk=12\n')
+    results = runcfg([cfgpath])
+    stages = [r['stage'] for r in results[0]['stages']]
+    assert stages[:2] == ['open', 'wndw']
+    assert stages[-2:] == ['append', 'updatestats']
+    assert stages.count('translate') == 2
+    stagedf = pd.read_csv(stagecsv)
+    assert sorted(stagedf['label'].unique()) == sorted(
+        [r['label'] for r in results]
+    )
+    for key in ['wall', 'cpu', 'maxrss_delta', 'read_bytes', 'write_bytes']:
+        assert (stagedf[key] >= 0).all()
+    save = stagedf.query('stage == "save"')
+    assert (save['write_bytes'] > 0).all()
+
+
+def test_atomicsave():
+    import tempfile
+    from os.path import join, exists
+    from unittest import mock
+    import PseudoNetCDF as pnc
+    import numpy as np
+    from .. import bcon
+    from ..manifest import temppath
+
+    tdir = tempfile.TemporaryDirectory()
+    _makecase(tdir)
+    inpath = join(tdir.name, 'test_input_20220101.nc')
+    metaf = pnc.pncopen(
+        join(tdir.name, 'GRIDDESC'), format='griddesc', GDNAM='108US1',
+        FTYPE=2, VGLVLS=np.asarray([1., .75, .5, .25, 0]), VGTOP=5000.
+    )
+    exprpaths = [join(tdir.name, 'test.expr')]
+    outpath = join(tdir.name, 'test.atomic.nc')
+    kwds = dict(exprpaths=exprpaths, tchunk=5, vmethod='linear', verbose=0)
+    # a run that fails after the first chunk must not leave outpath
+    crash = RuntimeError('crash')
+    with mock.patch.object(bcon, 'appendioapi', side_effect=crash):
+        try:
+            bcon.bc(inpath, outpath, metaf, **kwds)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError('appendioapi should have failed')
+    assert not exists(outpath)
+    assert exists(temppath(outpath))
+    out = bcon.bc(inpath, outpath, metaf, **kwds)
+    out.close()
+    assert exists(outpath) and exists(outpath + '.stats.json')
+    assert not exists(temppath(outpath))
+    chkf = pnc.pncopen(outpath, format='ioapi')
+    assert chkf.variables['O3'].shape[0] == 24
+    assert chkf.variables['O3'].actual_count == chkf.variables['O3'].size
+
+
+def test_savestream():
+    import os
+    import tempfile
+    from os.path import join, dirname
+    from .. import bcon, options
+    from ..benchmarks import synthetic
+    from ..exprlib import exprpaths as getexprpaths
+    from ..instrument import StageLog
+
+    tdir = tempfile.TemporaryDirectory()
+    exprpaths = list(getexprpaths(
+        ['waccm_met.expr', 'waccm_cb6.expr', 'waccm_ae7.expr'],
+        prefix='waccm'
+    ))
+    # fixed-size time dimension and many output variables
+    inpath = synthetic.waccm(
+        join(tdir.name, 'waccm.nc'), nlon=24, nlat=12, nlev=10, ntimes=4,
+        varkeys=synthetic.exprinputs(exprpaths)
+    )
+    gdpath = join(dirname(dirname(__file__)), 'examples', 'GRIDDESC')
+    metaf = options.getmetaf('bcon', 'TEST', 'EPA_35L', gdpath=gdpath)
+    outpaths = []
+    for exprengine in ['eval', 'compiled']:
+        outpath = join(tdir.name, f'waccm.{exprengine}.nc')
+        log = StageLog(verbose=0)
+        out = bcon.bc(
+            inpath, outpath, metaf, exprpaths=exprpaths, verbose=0,
+            format_kw={'format': 'waccm'}, dimkeys=options.dims['waccm'],
+            exprengine=exprengine, stagelog=log
+        )
+        assert len(out.variables) > 50
+        out.close()
+        outpaths.append(outpath)
+        # defining the header does not move values, so each value is
+        # written once (netCDF writes whole pages, so partial records are
+        # written more than once; moving values wrote >200x outbytes)
+        save = [r for r in log.records if r['stage'] == 'save'][0]
+        outbytes = (
+            os.path.getsize(outpath) + os.path.getsize(outpath + '.stats.json')
+        )
+        if save['write_bytes'] == save['write_bytes']:
+            assert save['write_bytes'] < 10 * outbytes
+
+    # streamed species (compiled) are the same
+    _samebc(*outpaths)
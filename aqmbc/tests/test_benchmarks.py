@@ -0,0 +1,43 @@
+def test_run():
+    import glob
+    import json
+    import tempfile
+    from os.path import join
+    from ..benchmarks import run, stages
+    from ..stats import readsidecar
+
+    tdir = tempfile.TemporaryDirectory()
+    outpath = join(tdir.name, 'results.json')
+    size = dict(nlon=12, nlat=7, nlev=5, ntimes=2)
+    for source in ['waccm', 'tcr']:
+        results = run(
+            source, gdnam='108US2', size=size, repeat=2,
+            workdir=join(tdir.name, source), outpath=outpath
+        )
+        chk = json.load(open(outpath, 'r'))
+        assert chk == json.loads(json.dumps(results))
+        assert sorted(chk['order']) == sorted(stages)
+        assert chk['order'][:2] == ['open', 'wndw']
+        for stage in stages:
+            assert len(chk['stages'][stage]['times']) == 2
+            assert chk['stages'][stage]['min'] >= 0
+        assert chk['outbytes'] > 0
+        # makestats reads the statistics of the neighboring copies too
+        bcpaths = glob.glob(join(tdir.name, source, f'{source}_bcon_2*.nc'))
+        assert len(bcpaths) == 3
+        for bcpath in bcpaths:
+            assert readsidecar(bcpath) is not None
+
+
+def test_exprinputs():
+    from ..benchmarks.synthetic import exprinputs
+    from ..exprlib import exprpaths
+
+    inkeys = exprinputs(exprpaths(['gc14_o3so4.expr'], prefix='gc'))
+    assert inkeys == ['AIRMOLDEN', 'SpeciesBC_O3', 'SpeciesBC_SO4']
+    inkeys = exprinputs(exprpaths(
+        ['gcnc_airmolden.expr', 'gc14_o3so4.expr'], prefix='gc'
+    ))
+    assert inkeys == [
+        'Met_PMIDDRY', 'Met_T', 'SpeciesBC_O3', 'SpeciesBC_SO4'
+    ]
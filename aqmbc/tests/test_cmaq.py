@@ -35,3 +35,184 @@ def test_cmaqready():
     assert bcf.TFLAG[-1, 0, 1] == 0
     assert np.allclose(bcf.O3[:-1, :, :], 2)
     assert np.allclose(bcf.O3[-1, :, :], 3)
+
+
+def test_timeweights():
+    import numpy as np
+    import pandas as pd
+    from ..cmaq import timeweights
+
+    intimes = pd.date_range('2022-01-01T00:30', periods=3, freq='1h')
+    outtimes = pd.date_range('2022-01-01T00', periods=5, freq='1h')
+    i0, i1, w1 = timeweights(intimes, outtimes)
+    invals = np.array([1., 3., 5.])
+    outvals = invals[i0] * (1 - w1) + invals[i1] * w1
+    assert np.allclose(outvals, [1, 2, 4, 5, 5])
+    i0, i1, w1 = timeweights(intimes, intimes)
+    assert np.allclose(invals[i0] * (1 - w1) + invals[i1] * w1, invals)
+
+
+def test_cmaqready_range():
+    import tempfile
+    from os.path import join
+    import PseudoNetCDF as pnc
+    import numpy as np
+    import xarray as xr
+    from ..cmaq import cmaqready, cmaqready_range
+
+    tdir = tempfile.TemporaryDirectory()
+    gdpath = join(tdir.name, 'GRIDDESC')
+    with open(gdpath, mode='w') as gdf:
+        gdf.write("""' '
+'CONUS_LCC'
+2 33.0 45.0 -97.0 -97.0 40.0
+' '
+'108US1'
+'CONUS_LCC'  -2952000.0 -2772000.0 108000.0 108000.0 60 50 1
+' '
+""")
+    inpat = join(tdir.name, 'test_%Y%m%d.nc')
+    for d in range(4):
+        bcf = pnc.pncopen(
+            gdpath, format='griddesc', GDNAM='108US1', FTYPE=2,
+            SDATE=2022001 + d, STIME=0, TSTEP=10000, nsteps=24,
+            var_kwds={'O3': 'ppb'}
+        )
+        bcf.variables['O3'][:] = np.arange(24)[:, None, None] + d * 24
+        bcf.save(f'{inpat[:-9]}202201{d + 1:02d}.nc', verbose=0).close()
+
+    for workers in [1, 2]:
+        outpat = join(tdir.name, f'ready{workers}_%Y%m%d.nc')
+        outpaths = cmaqready_range(
+            '2022-01-01', '2022-01-04', inpat, outpat, workers=workers
+        )
+        assert len(outpaths) == 4
+        for di, outpath in enumerate(outpaths):
+            date = f'2022-01-{di + 1:02d}'
+            chkf = cmaqready(date, inpat)
+            with xr.open_dataset(outpath, decode_cf=False) as outf:
+                assert np.allclose(outf['O3'], chkf['O3'])
+                assert (outf['TFLAG'] == chkf['TFLAG']).all()
+
+
+def test_batch_timeindependent():
+    import tempfile
+    import shutil
+    from os.path import join, getsize
+    import PseudoNetCDF as pnc
+    import netCDF4 as nc
+    import numpy as np
+    from ..cmaq import batch_timeindependent, timeindependent
+    from ..stats import writesidecar, readsidecar, RunningStats, ProfileStats
+
+    tdir = tempfile.TemporaryDirectory()
+    gdpath = join(tdir.name, 'GRIDDESC')
+    with open(gdpath, mode='w') as gdf:
+        gdf.write("""' '
+'CONUS_LCC'
+2 33.0 45.0 -97.0 -97.0 40.0
+' '
+'108US1'
+'CONUS_LCC'  -2952000.0 -2772000.0 108000.0 108000.0 60 50 1
+' '
+""")
+    inpaths = []
+    for fmt in ['NETCDF3_CLASSIC', 'NETCDF3_64BIT_OFFSET', 'NETCDF4_CLASSIC']:
+        icf = pnc.pncopen(
+            gdpath, format='griddesc', GDNAM='108US1', FTYPE=1,
+            SDATE=2022001, STIME=120000, TSTEP=10000, nsteps=1,
+            var_kwds={'O3': 'ppb', 'NO2': 'ppb'}
+        )
+        icf.variables['O3'][:] = 3.
+        inpath = join(tdir.name, f'test_{fmt}.nc')
+        icf.save(inpath, format=fmt, verbose=0).close()
+        inpaths.append(inpath)
+    o3 = np.full((1, 1, 50, 60), 3.)
+    prof = ProfileStats(axis=1)
+    prof.update(o3)
+    stats = RunningStats()
+    stats.update(o3)
+    records = {'O3': dict(units='ppb', stats=stats, profile=prof)}
+    writesidecar(inpaths[0], records)
+    chkpaths = [inpath.replace('.nc', '.chk.nc') for inpath in inpaths]
+    for inpath, chkpath in zip(inpaths, chkpaths):
+        shutil.copy(inpath, chkpath)
+        with nc.Dataset(chkpath, mode='r+') as chkf:
+            timeindependent(chkf)
+
+    batch_timeindependent(inpaths, workers=2, fsync=True)
+    for inpath, chkpath in zip(inpaths, chkpaths):
+        assert getsize(inpath) == getsize(chkpath)
+        with nc.Dataset(inpath) as inf, nc.Dataset(chkpath) as chkf:
+            for key in ['SDATE', 'STIME', 'TSTEP']:
+                assert getattr(inf, key) == getattr(chkf, key) == 0
+            for key in chkf.variables:
+                assert np.array_equal(inf[key][:], chkf[key][:])
+    assert readsidecar(inpaths[0])['O3']['stats'].count == o3.size
+
+    # streaming NetCDF3 (numrecs is -1): records are counted from the size
+    inpath = inpaths[0].replace('.nc', '.streaming.nc')
+    icf = pnc.pncopen(
+        gdpath, format='griddesc', GDNAM='108US1', FTYPE=1,
+        SDATE=2022001, STIME=120000, TSTEP=10000, nsteps=1,
+        var_kwds={'O3': 'ppb', 'NO2': 'ppb'}
+    )
+    icf.save(inpath, format='NETCDF3_CLASSIC', verbose=0).close()
+    with open(inpath, mode='r+b') as ncf:
+        ncf.seek(4)
+        ncf.write(b'\xff' * 4)
+    batch_timeindependent([inpath])
+    with open(inpath, mode='r+b') as ncf:
+        assert ncf.read(8)[4:] == b'\xff' * 4
+        ncf.seek(4)
+        ncf.write(np.array(1, dtype='>i4').tobytes())
+    with nc.Dataset(inpath) as inf, nc.Dataset(chkpaths[0]) as chkf:
+        for key in ['SDATE', 'STIME', 'TSTEP']:
+            assert getattr(inf, key) == 0
+        assert np.array_equal(inf['TFLAG'][:], chkf['TFLAG'][:])
+
+
+def test_mmapioapi():
+    import tempfile
+    from os.path import join
+    import PseudoNetCDF as pnc
+    import numpy as np
+    import xarray as xr
+    from ..cmaq import mmapioapi
+
+    tdir = tempfile.TemporaryDirectory()
+    gdpath = join(tdir.name, 'GRIDDESC')
+    with open(gdpath, mode='w') as gdf:
+        gdf.write("""' '
+'CONUS_LCC'
+2 33.0 45.0 -97.0 -97.0 40.0
+' '
+'108US1'
+'CONUS_LCC'  -2952000.0 -2772000.0 108000.0 108000.0 60 50 1
+' '
+""")
+    for fmt in ['NETCDF3_CLASSIC', 'NETCDF3_64BIT_OFFSET', 'NETCDF4_CLASSIC']:
+        bcf = pnc.pncopen(
+            gdpath, format='griddesc', GDNAM='108US1', FTYPE=2,
+            SDATE=2022001, STIME=0, TSTEP=10000, nsteps=3,
+            var_kwds={'O3': 'ppb', 'NO2': 'ppb'}
+        )
+        bcf.variables['O3'][:] = np.random.rand(*bcf.variables['O3'].shape)
+        bcf.variables['NO2'][:] = np.arange(3)[:, None, None]
+        inpath = join(tdir.name, f'test_{fmt}.nc')
+        bcf.save(inpath, format=fmt, verbose=0).close()
+        if fmt == 'NETCDF4_CLASSIC':
+            try:
+                mmapioapi(inpath)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError('NetCDF4 cannot be memory-mapped')
+            continue
+        mf = mmapioapi(inpath)
+        with xr.open_dataset(inpath, decode_cf=False) as chkf:
+            assert mf.identical(chkf)
+        o3 = mf['O3'].values
+        assert isinstance(o3.base, np.memmap)
+        assert not o3.flags.writeable
+        assert o3.dtype == np.dtype('>f4')
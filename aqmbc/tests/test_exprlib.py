@@ -13,3 +13,164 @@ def test_exprpaths():
 def test_avail():
     from ..exprlib import avail
     assert len(avail()) > 0
+
+
+def _evalfile(exprstr, shape=(2, 3, 4)):
+    import ast
+    import builtins
+    import numpy as np
+    import PseudoNetCDF as pnc
+    from symtable import symtable
+    assigned = [
+        s.get_name() for s in symtable(exprstr, 'test', 'exec').get_symbols()
+        if s.is_assigned()
+    ]
+    names = sorted(set([
+        n.id for n in ast.walk(ast.parse(exprstr))
+        if isinstance(n, ast.Name) and n.id not in assigned and n.id != 'np'
+        and not hasattr(builtins, n.id)
+    ]))
+    f = pnc.PseudoNetCDFFile()
+    dims = ('TSTEP', 'LAY', 'PERIM')
+    for dk, dl in zip(dims, shape):
+        f.createDimension(dk, dl)
+    rng = np.random.default_rng(0)
+    for key in names:
+        f.createVariable(
+            key, 'f', dims, values=rng.random(shape, dtype='f'),
+            units='mol/mol', long_name=key
+        )
+    return f
+
+
+def _checksame(a, b):
+    import numpy as np
+    assert list(a.variables) == list(b.variables)
+    for key, va in a.variables.items():
+        vb = b.variables[key]
+        assert va.dtype == vb.dtype
+        assert va.dimensions == vb.dimensions
+        np.testing.assert_array_equal(va[...], vb[...])
+        pa = {pk: va.getncattr(pk) for pk in va.ncattrs()}
+        pb = {pk: vb.getncattr(pk) for pk in vb.ncattrs()}
+        assert sorted(pa) == sorted(pb)
+        for pk in pa:
+            assert np.all(pa[pk] == pb[pk])
+
+
+def test_compileexpr(capsys):
+    import numpy as np
+    from ..exprlib import compileexpr
+    exprstr = """
+A = B[:] * 2
+A = (C[:] * 0.5 + B[:] * 0.1) * 1e6
+A.units = 'ppmV'
+D = (C[:] * 0.5 + B[:] * 0.1) * 2 / 3.
+E = A[:] * 1
+F = -np.maximum(B[:], C[:]) + B[:, ::-1]
+G = E
+print('done')
+"""
+    f = _evalfile(exprstr)
+    func = compileexpr(exprstr)
+    # shared sum is computed once and the first A is never computed
+    assert func.source.count("'Add'") == 2
+    assert func.source.count("'Mult'") == 5
+    reff = f.eval(exprstr, inplace=False)
+    assert capsys.readouterr().out == 'done\n'
+    _checksame(reff, func(f))
+    assert capsys.readouterr().out == 'done\n'
+    assert f.variables['B'].units == 'mol/mol'
+
+    # streamed: outf has the definitions and values yields each output
+    hdrf, values = func(f, stream=True)
+    assert capsys.readouterr().out == ''
+    assert list(hdrf.variables) == list(reff.variables)
+    assert {k: len(d) for k, d in hdrf.dimensions.items()} == {
+        k: len(d) for k, d in reff.dimensions.items()
+    }
+    for key, hdrv in hdrf.variables.items():
+        refv = reff.variables[key]
+        assert hdrv.shape == (1, 1, 1)
+        assert hdrv.dtype == refv.dtype
+        assert hdrv.dimensions == refv.dimensions
+        assert hdrv.ncattrs() == refv.ncattrs()
+    streamed = []
+    for key, var in values:
+        refv = reff.variables[key]
+        np.testing.assert_array_equal(var[...], refv[...])
+        assert {k: var.getncattr(k) for k in var.ncattrs()} == {
+            k: refv.getncattr(k) for k in refv.ncattrs()
+        }
+        streamed.append(key)
+    assert capsys.readouterr().out == 'done\n'
+    # F is computed last, so it is streamed after G
+    assert sorted(streamed) == sorted(reff.variables)
+    assert streamed != list(reff.variables)
+
+    # unsupported syntax falls back to eval
+    exprstr = 'A = B[:] * 1\ndel A\nC = B[:] * 2'
+    func = compileexpr(exprstr)
+    assert func.source is None
+    _checksame(f.eval(exprstr, inplace=False), func(f))
+
+    # a missing input raises the same error as eval
+    exprstr = 'A = B[:] * ACET[:]'
+    func = compileexpr(exprstr)
+    assert func.source is not None
+    for run in [lambda: f.eval(exprstr, inplace=False), lambda: func(f)]:
+        try:
+            run()
+        except NameError as e:
+            assert str(e) == "name 'ACET' is not defined"
+        else:
+            raise AssertionError('ACET should be missing')
+
+
+def test_compileexprpaths():
+    from ..exprlib import compileexprpaths, gc14
+    exprstr = '\n'.join([open(p, 'r').read().strip() for p in gc14])
+    f = _evalfile(exprstr)
+    func = compileexprpaths(gc14)
+    assert func.source is not None
+    _checksame(f.eval(exprstr, inplace=False), func(f))
+
+
+def test_loadexprs():
+    import os
+    import pickle
+    import tempfile
+    from unittest import mock
+    from .. import exprlib
+    from ..exprlib import loadexprs, gc14
+    exprs = loadexprs(gc14)
+    assert 'AIRMOLDEN' in exprs.outputs
+    assert 'SpeciesBC_O3' in exprs.inputs
+    assert 'SpeciesBC_O3' not in exprs.outputs
+    assert exprs.text == '\n'.join([open(p).read().strip() for p in gc14])
+    # second load neither reads nor parses
+    with mock.patch('builtins.open') as mopen:
+        with mock.patch('symtable.symtable') as msym:
+            assert loadexprs(gc14) is exprs
+    assert mopen.call_count == 0
+    assert msym.call_count == 0
+    # cache can be shared with workers
+    cache = pickle.loads(pickle.dumps(exprlib.getexprcache()))
+    assert cache['exprs'][exprs.key] == exprs
+    exprlib._filecache.clear()
+    exprlib._exprcache.clear()
+    exprlib.setexprcache(cache)
+    with mock.patch('builtins.open') as mopen:
+        assert loadexprs(gc14) == exprs
+    assert mopen.call_count == 0
+    # changed file is read again
+    tdir = tempfile.TemporaryDirectory()
+    tmppath = os.path.join(tdir.name, 'test.expr')
+    with open(tmppath, 'w') as tmpf:
+        tmpf.write('A = B[:] * 1')
+    assert loadexprs([tmppath]).outputs == ('A',)
+    with open(tmppath, 'w') as tmpf:
+        tmpf.write('C = B[:] * 10')
+    st = os.stat(tmppath)
+    os.utime(tmppath, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert loadexprs([tmppath]).outputs == ('C',)
@@ -0,0 +1,70 @@
+def test_atomicwrite():
+    import tempfile
+    from os.path import join, exists
+    import os
+    from ..manifest import atomicwrite
+
+    tdir = tempfile.TemporaryDirectory()
+    outpath = join(tdir.name, 'test.txt')
+    with atomicwrite(outpath) as tmppath:
+        with open(tmppath, 'w') as outf:
+            outf.write('done')
+        assert not exists(outpath)
+    assert open(outpath).read() == 'done'
+    try:
+        with atomicwrite(outpath) as tmppath:
+            with open(tmppath, 'w') as outf:
+                outf.write('partial')
+            raise RuntimeError('crash')
+    except RuntimeError:
+        pass
+    assert open(outpath).read() == 'done'
+    assert os.listdir(tdir.name) == ['test.txt']
+
+
+def test_runcfgmanifest():
+    import tempfile
+    import os
+    from os.path import join
+    from .test_bcon import _makecase
+    from unittest import mock
+    from .. import runcfg, manifest
+    from ..manifest import readmanifest
+
+    tdir = tempfile.TemporaryDirectory()
+    cfgpath = _makecase(tdir, ndays=2)
+    manifestpath = join(tdir.name, 'manifest.json')
+    with open(cfgpath, 'a') as cfgf:
+        cfgf.write(f'\n[common]\nmanifest={manifestpath}\n')
+    results = runcfg([cfgpath])
+    assert [r['status'] for r in results] == ['ok', 'ok', 'ok']
+    records = readmanifest(manifestpath)
+    assert sorted(records) == sorted([r['outpath'] for r in results])
+    assert all([r['status'] == 'ok' for r in records.values()])
+
+    # unchanged: all reused without reading the outputs
+    chksum = mock.patch.object(
+        manifest, 'checksum', wraps=manifest.checksum
+    )
+    with chksum as chk:
+        results = runcfg([cfgpath])
+    assert [r['status'] for r in results] == ['cached', 'cached', 'cached']
+    assert chk.call_count == 0
+    newrecords = readmanifest(manifestpath)
+    for outpath, record in records.items():
+        assert newrecords[outpath]['output'] == record['output']
+
+    # new input for day 2 and a damaged output for day 1
+    inpath = join(tdir.name, 'test_input_20220102.nc')
+    os.utime(inpath, ns=(0, os.stat(inpath).st_mtime_ns + 10**9))
+    bcpath = join(tdir.name, 'test.bcon.20220101.nc')
+    with open(bcpath, 'r+b') as bcf:
+        bcf.truncate(1000)
+    results = runcfg([cfgpath])
+    assert [r['status'] for r in results] == ['ok', 'ok', 'cached']
+
+    # changed expressions: all remade
+    with open(join(tdir.name, 'test.expr'), 'a') as exprf:
+        exprf.write('O3.long_name = "O3"\n')
+    results = runcfg([cfgpath])
+    assert [r['status'] for r in results] == ['ok', 'ok', 'ok']
@@ -0,0 +1,508 @@
+def test_sigma2coeff_batch():
+    import numpy as np
+    from PseudoNetCDF.coordutil import sigma2coeff
+    from ..models.util import sigma2coeff_lin, sigma2coeff_batch
+    from ..options import vglvls
+
+    rng = np.random.default_rng(0)
+    nt, nz, nc = 2, 20, 7
+    delp = rng.uniform(0.5, 1.5, size=(nt, nz, nc))
+    edges = np.concatenate([np.zeros((nt, 1, nc)), delp], axis=1)
+    edges = np.cumsum(edges, axis=1)
+    sigma = 1.02 - 1.04 * edges / edges[:, -1:]
+    tgt = vglvls['EPA_35L']
+    for interptype, func in [
+        ('linear', sigma2coeff_lin), ('conserve', sigma2coeff)
+    ]:
+        coeff = sigma2coeff_batch(sigma, tgt, interptype=interptype)
+        assert coeff.shape == (nt, nz, tgt.size - 1, nc)
+        for ti in range(nt):
+            for ci in range(nc):
+                chk = func(sigma[ti, :, ci], tgt)
+                assert np.allclose(coeff[ti, :, :, ci], chk, atol=1e-5)
+
+
+def test_sigma2band():
+    import numpy as np
+    from PseudoNetCDF.coordutil import sigma2coeff
+    from ..models.util import sigma2band, applyband
+    from ..options import vglvls
+
+    rng = np.random.default_rng(1)
+    nt, nz, nc = 2, 88, 5
+    delp = rng.uniform(0.5, 1.5, size=(nt, nz, nc))
+    edges = np.concatenate([np.zeros((nt, 1, nc)), delp], axis=1)
+    edges = np.cumsum(edges, axis=1)
+    sigma = 1.02 - 1.04 * edges / edges[:, -1:]
+    vals = rng.uniform(size=(nt, nz, nc))
+    tgt = vglvls['EPA_35L']
+    k0, wgt = sigma2band(sigma, tgt, interptype='linear')
+    assert wgt.shape == (nt, 2, tgt.size - 1, nc)
+    k0, wgt = sigma2band(sigma, tgt, interptype='conserve')
+    assert wgt.shape[1] < nz
+    out = applyband(vals, k0, wgt)
+    for ti in range(nt):
+        for ci in range(nc):
+            coeff = sigma2coeff(sigma[ti, :, ci], tgt)
+            chk = (vals[ti, :, None, ci] * coeff).sum(0)
+            assert np.allclose(out[ti, :, ci], chk, atol=1e-5)
+
+
+def test_getweights():
+    import tempfile
+    import numpy as np
+    from ..models import util
+
+    tdir = tempfile.TemporaryDirectory()
+    calls = []
+
+    def func():
+        calls.append(1)
+        return np.ones((3, 2)), np.zeros(2, dtype='i')
+
+    sigma = np.array([1., .5, 0.])
+    vglvls = np.array([1., .4, 0.])
+    try:
+        util.setweightcache(tdir.name, maxsize=1)
+        w1 = util.getweights(sigma, vglvls, 5000., 'linear', func)
+        w2 = util.getweights(sigma, vglvls, 5000., 'linear', func)
+        assert len(calls) == 1 and w1 is w2
+        # evicts the first from memory, but it is still on disk
+        util.getweights(sigma, vglvls, 5000., 'conserve', func)
+        assert len(calls) == 2
+        w3 = util.getweights(sigma, vglvls, 5000., 'linear', func)
+        assert len(calls) == 2
+        assert isinstance(w3, tuple)
+        assert np.allclose(w3[0], w1[0]) and w3[1].dtype == w1[1].dtype
+    finally:
+        util.setweightcache(None, maxsize=16)
+
+
+def test_geoscfvarkeys():
+    import os
+    import tempfile
+    import numpy as np
+    import netCDF4
+    import PseudoNetCDF as pnc
+    from .. import models  # noqa: F401 registers geoscf
+
+    tdir = tempfile.TemporaryDirectory()
+    path = os.path.join(tdir.name, 'geoscf.nc')
+    nz = 8
+    with netCDF4.Dataset(path, 'w', format='NETCDF4_CLASSIC') as nf:
+        for dk, dl in [('time', 1), ('lev', nz), ('lat', 3), ('lon', 4)]:
+            nf.createDimension(dk, dl)
+        tv = nf.createVariable('time', 'd', ('time',))
+        tv.units = 'hours since 2023-07-15 00:00:00'
+        tv[:] = 12.5
+        nf.createVariable('lev', 'd', ('lev',))[:] = np.arange(nz)
+        nf.createVariable('lat', 'd', ('lat',))[:] = [30, 31, 32]
+        nf.createVariable('lon', 'd', ('lon',))[:] = [-100, -99, -98, -97]
+        nf.createVariable('ps', 'f', ('time', 'lat', 'lon'))[:] = 101325
+        delp = nf.createVariable('delp', 'f', ('time', 'lev', 'lat', 'lon'))
+        delp.units = 'Pa'
+        delp[:] = 100000 / nz
+        for key in ['o3', 'so4'] + [f'spc{i}' for i in range(50)]:
+            var = nf.createVariable(key, 'f', ('time', 'lev', 'lat', 'lon'))
+            var.units = 'mol/mol'
+            var[:] = np.arange(nz)[:, None, None]
+
+    vglvls = np.array([1, 0.5, 0.], dtype='f')
+    allf = pnc.pncopen(path, format='geoscf')
+    f = pnc.pncopen(path, format='geoscf', varkeys=['o3', 'PRES'])
+    assert len(allf.variables) == 58
+    assert sorted(f.variables) == sorted([
+        'time', 'lat', 'lon', 'lev', 'ps', 'delp', 'o3'
+    ])
+    outf = f.interpSigma(vglvls, vgtop=5000., varkeys=['o3'])
+    assert 'o3' in outf.variables
+    assert 'delp' not in outf.variables
+    chkf = allf.interpSigma(vglvls, vgtop=5000.)
+    assert np.allclose(outf.variables['o3'][:], chkf.variables['o3'][:])
+
+
+def _densesigma(vals, pmid, sigma, vglvls, interptype):
+    """
+    Dense reference for the interpSigma of sigma models: pressure-weighted
+    average of the reversed (surface-to-top) values using sigma2coeff_batch.
+    """
+    from ..models.util import sigma2coeff_batch
+    coeff = sigma2coeff_batch(
+        sigma[:, ::-1], vglvls, interptype=interptype, dtype='d'
+    )
+    rpmid = pmid[:, ::-1, None]
+    num = (vals[:, ::-1, None] * rpmid * coeff).sum(1)
+    return num / (rpmid * coeff).sum(1)
+
+
+def _sigmafile(path, nz, levvars, othervars):
+    """
+    Write a top-to-surface file with dimensions time, lev, ilev, lat, lon.
+    levvars and othervars map name to (dims, units, values).
+    """
+    import numpy as np
+    import netCDF4
+
+    with netCDF4.Dataset(path, 'w', format='NETCDF4_CLASSIC') as nf:
+        for dk, dl in [
+            ('time', 2), ('lev', nz), ('ilev', nz + 1), ('lat', 3),
+            ('lon', 4)
+        ]:
+            nf.createDimension(dk, dl)
+        nf.createVariable('lev', 'd', ('lev',))[:] = np.arange(nz)
+        nf.createVariable('lat', 'd', ('lat',))[:] = [30, 31, 32]
+        nf.createVariable('lon', 'd', ('lon',))[:] = [260, 261, 262, 263]
+        for key, (dims, units, vals) in {**othervars, **levvars}.items():
+            var = nf.createVariable(key, 'd', dims)
+            if units is not None:
+                var.units = units
+            var[...] = vals
+
+
+def test_waccminterp():
+    import os
+    import tempfile
+    import numpy as np
+    import PseudoNetCDF as pnc
+    from .. import models  # noqa: F401 registers waccm
+    from ..options import vglvls
+
+    tdir = tempfile.TemporaryDirectory()
+    path = os.path.join(tdir.name, 'waccm.nc')
+    rng = np.random.default_rng(0)
+    nz = 12
+    hybi = np.linspace(0, 1, nz + 1) ** 2
+    hyai = 0.005 * (1 - np.linspace(0, 1, nz + 1))
+    hybm = (hybi[1:] + hybi[:-1]) / 2
+    hyam = (hyai[1:] + hyai[:-1]) / 2
+    ps = rng.uniform(95000, 102000, size=(2, 3, 4))
+    o3 = rng.uniform(1e-8, 1e-6, size=(2, nz, 3, 4))
+    _sigmafile(path, nz, {
+        'O3': (('time', 'lev', 'lat', 'lon'), 'mol/mol', o3),
+    }, {
+        'time': (('time',), 'days since 2023-07-15 00:00:00', [0, 0.25]),
+        'P0': ((), 'Pa', 100000.),
+        'PS': (('time', 'lat', 'lon'), 'Pa', ps),
+        'hyam': (('lev',), None, hyam), 'hybm': (('lev',), None, hybm),
+        'hyai': (('ilev',), None, hyai), 'hybi': (('ilev',), None, hybi),
+    })
+    tgt = vglvls['EPA_35L']
+    vgtop = 5000.
+    f = pnc.pncopen(path, format='waccm')
+    outf = f.interpSigma(tgt, vgtop=vgtop, interptype='linear')
+    ps4 = ps[:, None]
+    pmid = ps4 * hybm[:, None, None] + 1e5 * hyam[:, None, None]
+    pedges = ps4 * hybi[:, None, None] + 1e5 * hyai[:, None, None]
+    sigma = (pedges - vgtop) / (ps4 - vgtop)
+    # waccm always uses the mass conserving weights
+    chk = _densesigma(o3, pmid, sigma, tgt, 'conserve')
+    outv = outf.variables['O3']
+    assert outv.dimensions == ('time', 'lev', 'lat', 'lon')
+    assert outv.shape == (2, tgt.size - 1, 3, 4)
+    assert outv.units == 'mol/mol'
+    assert np.allclose(outv[:], chk, rtol=1e-5)
+    assert np.allclose(outf.VGLVLS, tgt) and outf.VGTOP == vgtop
+    assert 'hyam' not in outf.variables
+    assert np.allclose(outf.variables['PS'][:], ps)
+
+
+def test_raqmsinterp():
+    import os
+    import tempfile
+    import numpy as np
+    import PseudoNetCDF as pnc
+    from .. import models  # noqa: F401 registers raqms
+    from ..options import vglvls
+
+    tdir = tempfile.TemporaryDirectory()
+    path = os.path.join(tdir.name, 'raqms.nc')
+    rng = np.random.default_rng(1)
+    nz = 12
+    psfc = rng.uniform(950, 1020, size=(2, 3, 4))
+    frac = rng.uniform(0.5, 1.5, size=(2, nz, 3, 4))
+    delp = (psfc[:, None] - 1) * frac / frac.sum(1, keepdims=True)
+    pedges = np.concatenate(
+        [np.ones((2, 1, 3, 4)), 1 + np.cumsum(delp, axis=1)], axis=1
+    )
+    pdash = (pedges[:, 1:] + pedges[:, :-1]) / 2
+    o3 = rng.uniform(1e-8, 1e-6, size=(2, nz, 3, 4))
+    lvdims = ('time', 'lev', 'lat', 'lon')
+    _sigmafile(path, nz, {
+        'o3vmr': (lvdims, 'mol/mol', o3),
+        'delp': (lvdims, 'hPa', delp),
+        'pdash': (lvdims, 'hPa', pdash),
+    }, {
+        'IDATE': (('time',), None, [2023071500, 2023071506]),
+        'psfc': (('time', 'lat', 'lon'), 'hPa', psfc),
+    })
+    tgt = vglvls['EPA_35L']
+    vgtop = 5000.
+    f = pnc.pncopen(path, format='raqms')
+    sigma = (pedges * 100 - vgtop) / (psfc[:, None] * 100 - vgtop)
+    for interptype in ['linear', 'conserve']:
+        outf = f.interpSigma(tgt, vgtop=vgtop, interptype=interptype)
+        chk = _densesigma(o3, pdash * 100, sigma, tgt, interptype)
+        outv = outf.variables['o3vmr']
+        assert outv.dimensions == lvdims
+        assert outv.shape == (2, tgt.size - 1, 3, 4)
+        assert outv.units == 'mol/mol'
+        assert np.allclose(outv[:], chk, rtol=1e-5)
+        assert np.allclose(outf.VGLVLS, tgt) and outf.VGTOP == vgtop
+
+
+def test_geoscfinterp():
+    import os
+    import tempfile
+    import numpy as np
+    import PseudoNetCDF as pnc
+    from .. import models  # noqa: F401 registers geoscf
+    from ..options import vglvls
+
+    tdir = tempfile.TemporaryDirectory()
+    path = os.path.join(tdir.name, 'geoscf.nc')
+    rng = np.random.default_rng(2)
+    nz = 12
+    ps = rng.uniform(95000, 102000, size=(2, 3, 4))
+    frac = rng.uniform(0.5, 1.5, size=(2, nz, 3, 4))
+    delp = (ps[:, None] - 1000) * frac / frac.sum(1, keepdims=True)
+    o3 = rng.uniform(1e-8, 1e-6, size=(2, nz, 3, 4))
+    lvdims = ('time', 'lev', 'lat', 'lon')
+    _sigmafile(path, nz, {
+        'o3': (lvdims, 'mol/mol', o3),
+        'delp': (lvdims, 'Pa', delp),
+    }, {
+        'time': (('time',), 'hours since 2023-07-15 00:00:00', [0, 6]),
+        'ps': (('time', 'lat', 'lon'), 'Pa', ps),
+    })
+    tgt = vglvls['EPA_35L']
+    vgtop = 5000.
+    f = pnc.pncopen(path, format='geoscf')
+    pedges = np.concatenate(
+        [np.full((2, 1, 3, 4), 1000.), 1000 + np.cumsum(delp, axis=1)],
+        axis=1
+    )
+    pmid = (pedges[:, 1:] + pedges[:, :-1]) / 2
+    sigma = (pedges - vgtop) / (ps[:, None] - vgtop)
+    for interptype in ['linear', 'conserve']:
+        outf = f.interpSigma(tgt, vgtop=vgtop, interptype=interptype)
+        chk = _densesigma(o3, pmid, sigma, tgt, interptype)
+        outv = outf.variables['o3']
+        assert outv.dimensions == lvdims
+        assert outv.shape == (2, tgt.size - 1, 3, 4)
+        assert np.allclose(outv[:], chk, rtol=1e-5)
+        assert np.allclose(outf.VGLVLS, tgt) and outf.VGTOP == vgtop
+
+
+def _serve(files, failures):
+    """
+    Local HTTP server for files (name: bytes) that supports Range. failures
+    maps name to a list of modes used by successive requests: 'drop' sends
+    half of the body and closes, 503 returns an error.
+    """
+    import threading
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            name = self.path.lstrip('/')
+            rng = self.headers.get('Range')
+            requests.append((name, rng))
+            mode = None
+            if len(failures.get(name, [])) > 0:
+                mode = failures[name].pop(0)
+            if name not in files:
+                self.send_error(404)
+                return
+            if mode == 503:
+                self.send_error(503)
+                return
+            body = files[name]
+            start = 0 if rng is None else int(rng[6:].split('-')[0])
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(body)}')
+                self.end_headers()
+                return
+            self.send_response(200 if rng is None else 206)
+            if rng is not None:
+                crange = f'bytes {start}-{len(body) - 1}/{len(body)}'
+                self.send_header('Content-Range', crange)
+            self.send_header('Content-Length', str(len(body) - start))
+            self.end_headers()
+            part = body[start:]
+            if mode == 'drop':
+                self.wfile.write(part[:len(part) // 2])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self.wfile.write(part)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, requests
+
+
+def test_download():
+    import os
+    import hashlib
+    import tempfile
+    from os.path import join
+    from ..models.download import download, urllibtransport
+
+    files = {f'f{i}.nc': os.urandom(100000 + i) for i in range(4)}
+    failures = {'f0.nc': ['drop', 'drop'], 'f1.nc': [503]}
+    server, requests = _serve(files, failures)
+    root = f'http://127.0.0.1:{server.server_address[1]}'
+    tdir = tempfile.TemporaryDirectory()
+    try:
+        names = sorted(files)
+        dests = [join(tdir.name, 'SRC', name) for name in names]
+        checksums = [
+            'sha256:' + hashlib.sha256(files[name]).hexdigest()
+            for name in names
+        ]
+        download(
+            [f'{root}/{name}' for name in names], dests, checksums=checksums,
+            workers=2, backoff=0, transport=urllibtransport, verbose=0
+        )
+        for name, dest in zip(names, dests):
+            assert open(dest, 'rb').read() == files[name]
+        assert sorted(os.listdir(join(tdir.name, 'SRC'))) == names
+        # dropped connections resume where they stopped
+        f0ranges = [rng for name, rng in requests if name == 'f0.nc']
+        assert f0ranges[0] is None
+        assert all(rng.startswith('bytes=') for rng in f0ranges[1:])
+        assert len(f0ranges) == 3
+
+        # existing files are not requested again
+        nreq = len(requests)
+        download(
+            [f'{root}/{name}' for name in names], dests, backoff=0,
+            transport=urllibtransport, verbose=0
+        )
+        assert len(requests) == nreq
+
+        # a bad checksum never becomes dest
+        baddest = join(tdir.name, 'bad.nc')
+        try:
+            download(
+                [f'{root}/f2.nc'], [baddest], checksums=['md5:0'], retries=1,
+                backoff=0, transport=urllibtransport, verbose=0
+            )
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError('checksum should fail')
+        assert not os.path.exists(baddest)
+    finally:
+        server.shutdown()
+
+
+def _geoscfsource(root, ntimes=6):
+    """Local stand-ins for the GEOS-CF OpenDAP met, chm and xgc datasets"""
+    import numpy as np
+    import pandas as pd
+    import xarray as xr
+
+    time = pd.date_range('2023-04-15T00:30', periods=ntimes, freq='1h')
+    coords = dict(
+        time=time, lev=np.arange(1., 4.), lat=np.arange(0., 70., .5),
+        lon=np.arange(-150., -40., .5)
+    )
+    shape = tuple(len(v) for v in coords.values())
+    dims = tuple(coords)
+    rng = np.random.default_rng(0)
+    keys = {
+        'met': ['zl', 'airdens', 'ps', 'delp', 'q', 't'], 'chm': ['o3'],
+        'xgc': ['so4']
+    }
+    for prefix, varkeys in keys.items():
+        data_vars = {}
+        for key in varkeys:
+            vals = rng.random(shape, dtype='f')
+            if key == 'ps':
+                data_vars[key] = (dims[:1] + dims[2:], vals[:, 0])
+            else:
+                data_vars[key] = (dims, vals)
+        ds = xr.Dataset(data_vars, coords=coords)
+        ds.to_netcdf(f'{root}/{prefix}_tavg_1hr_g1440x721_v36')
+
+
+def test_download_window():
+    import tempfile
+    import numpy as np
+    import xarray as xr
+    from unittest import mock
+    from ..models import geoscf
+    from ..options import getmetaf
+
+    tdir = tempfile.TemporaryDirectory()
+    _geoscfsource(tdir.name)
+    srcf = xr.open_dataset(f'{tdir.name}/chm_tavg_1hr_g1440x721_v36')
+    dates = ['2023-04-15T00:30', '2023-04-15T01:30', '2023-04-15T02:30']
+    kwds = dict(
+        sleep=0, backoff=0, rooturl=tdir.name, verbose=0, chmvars=['o3']
+    )
+
+    # full window; 2 hours per request and failures are retried
+    fetchone = geoscf._fetchone
+    calls = []
+
+    def flaky(*args):
+        calls.append(args[0])
+        if len(calls) <= 2:
+            raise OSError('503 Service Unavailable')
+        return fetchone(*args)
+
+    opendataset = xr.open_dataset
+    with mock.patch.object(geoscf, '_fetchone', flaky):
+        with mock.patch.object(
+            xr, 'open_dataset', wraps=opendataset
+        ) as opened:
+            paths = geoscf.download_window(
+                '12US1', dates, outroot=f'{tdir.name}/FULL', batch=2,
+                workers=1, **kwds
+            )
+    # 3 groups x 2 requests + 2 failures
+    assert len(calls) == 8
+    # met and xgc metadata, then each dataset once for all requests
+    assert opened.call_count == 5
+    assert len(geoscf._opened) == 0
+    assert len(paths) == 3
+    for t, path in zip(dates, paths):
+        outf = xr.open_dataset(path)
+        chkf = srcf.sel(time=[t], lon=outf.lon, lat=outf.lat)
+        assert np.array_equal(outf['o3'].values, chkf['o3'].values)
+        assert outf.time.values[0] == np.datetime64(t)
+        assert sorted(outf.data_vars) == sorted(
+            ['zl', 'airdens', 'ps', 'delp', 'q', 't', 'o3', 'so4']
+        )
+        fullf = outf
+
+    # perimeter bands from concurrent requests
+    paths = geoscf.download_window(
+        '12US1', dates, outroot=f'{tdir.name}/PERIM', batch=3, workers=4,
+        perimeter=True, nsplit=4, **kwds
+    )
+    outf = xr.open_dataset(paths[-1])
+    assert outf.o3.shape == fullf.o3.shape
+    o3 = outf.o3.values
+    chk = fullf.o3.values
+    isband = ~np.isnan(o3)
+    assert np.array_equal(o3[isband], chk[isband])
+    assert isband.sum() < 0.5 * isband.size
+    # source cells of the perimeter are in the band
+    metaf = getmetaf(bctype='bcon', gdnam='12US1')
+    i = outf.indexes['lon'].get_indexer(
+        metaf.variables['longitude'][:], method='nearest'
+    )
+    j = outf.indexes['lat'].get_indexer(
+        metaf.variables['latitude'][:], method='nearest'
+    )
+    assert isband[:, :, j, i].all()
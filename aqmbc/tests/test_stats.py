@@ -0,0 +1,221 @@
+def test_runningstats():
+    import numpy as np
+    from ..stats import RunningStats
+
+    rng = np.random.default_rng(0)
+    vals = np.exp(rng.normal(-20, 3, size=(6, 5, 101))).astype('f')
+    vals[0, 0, :3] = 0
+    vals[1, 1, :2] *= -1
+    stats = RunningStats(alpha=0.01)
+    for ti in range(vals.shape[0]):
+        stats.update(vals[ti])
+    half1 = RunningStats(alpha=0.01).update(vals[:2])
+    half2 = RunningStats(alpha=0.01).update(vals[2:])
+    merged = half1.merge(half2)
+    chk = RunningStats.fromdict(stats.todict())
+    for s in [stats, merged, chk]:
+        assert s.count == vals.size
+        assert np.isclose(s.mean, vals.mean(dtype='d'), rtol=1e-12)
+        assert np.isclose(s.std, vals.std(dtype='d'), rtol=1e-12)
+        assert s.min == vals.min() and s.max == vals.max()
+        assert np.isclose(s.median, np.median(vals), rtol=0.01)
+        assert s.sketch.zeros == 3
+    assert np.isclose(
+        stats.sketch.quantile(0), vals.min(), rtol=0.01
+    )
+    assert np.isnan(RunningStats().median)
+
+
+def test_makestats():
+    import tempfile
+    from os.path import join
+    import numpy as np
+    import PseudoNetCDF as pnc
+    from ..report import makestats, summarize
+
+    tdir = tempfile.TemporaryDirectory()
+    gdpath = join(tdir.name, 'GRIDDESC')
+    with open(gdpath, mode='w') as gdf:
+        gdf.write("""' '
+'CONUS_LCC'
+2 33.0 45.0 -97.0 -97.0 40.0
+' '
+'108US1'
+'CONUS_LCC'  -2952000.0 -2772000.0 108000.0 108000.0 60 50 1
+' '
+""")
+    rng = np.random.default_rng(0)
+    paths = []
+    allvals = []
+    for d in range(3):
+        path = join(tdir.name, f'test_{d}.nc')
+        bcf = pnc.pncopen(
+            gdpath, format='griddesc', GDNAM='108US1', FTYPE=2,
+            SDATE=2022001 + d, STIME=0, TSTEP=10000, nsteps=4 + d,
+            var_kwds={'O3': 'ppb'}
+        )
+        vals = rng.lognormal(d, 1, size=bcf.variables['O3'].shape)
+        bcf.variables['O3'][:] = vals
+        bcf.save(path, verbose=0).close()
+        paths.append(path)
+        allvals.append(bcf.variables['O3'][:].ravel())
+    statdf = makestats(paths)
+    for path, vals in zip(paths, allvals):
+        row = statdf.loc[(path, 'O3')]
+        assert row['count'] == vals.size
+        assert np.isclose(row['mean'], vals.mean(dtype='d'))
+        assert np.isclose(row['std'], vals.std(dtype='d'))
+        assert np.isclose(row['median'], np.median(vals), rtol=0.005)
+    allvals = np.concatenate(allvals)
+    overall = summarize(statdf).loc[('Overall', 'O3')]
+    assert overall['count'] == allvals.size
+    assert np.isclose(overall['mean'], allvals.mean(dtype='d'))
+    assert np.isclose(overall['std'], allvals.std(dtype='d'))
+    assert overall['min'] == allvals.min()
+    assert overall['max'] == allvals.max()
+    assert np.isclose(overall['median'], np.median(allvals), rtol=0.005)
+    # without merged stats (e.g., from csv), mean and std are still exact
+    statdf.attrs.pop('stats')
+    overall = summarize(statdf).loc[('Overall', 'O3')]
+    assert np.isclose(overall['std'], allvals.std(dtype='d'))
+
+
+def test_sidecar():
+    import os
+    import tempfile
+    from os.path import join
+    import numpy as np
+    from .test_bcon import _makecase
+    from .. import runcfg
+    from ..report import makestats, make_vertprof, reportfromcfg
+    from ..stats import sidecarpath, readsidecar
+
+    tdir = tempfile.TemporaryDirectory()
+    cfgpath = _makecase(tdir, ndays=2)
+    with open(cfgpath, 'a') as cfgf:
+        cfgf.write(f"""
+[REPORT]
+standardfigs=N
+summary={tdir.name}/report/summary.csv
+vprofmean={tdir.name}/report/mean.nc
+vprofmin={tdir.name}/report/min.nc
+vprofmax={tdir.name}/report/max.nc
+""")
+    runcfg([cfgpath])
+    paths = [
+        join(tdir.name, f'test.bcon.2022010{d}.nc') for d in [1, 2]
+    ]
+    for path in paths:
+        records = readsidecar(path)
+        assert records['O3']['units'] == 'hi'
+        assert records['O3']['profile'].count.shape == (4,)
+    metadf = makestats(paths)
+    datadf = makestats(paths, sidecar=False)
+    draftdf = makestats(paths, draft=True)
+    for key in ['mean', 'std', 'min', 'max', 'median', 'count']:
+        assert np.allclose(metadf[key], datadf[key], rtol=1e-6)
+        assert np.allclose(draftdf[key], datadf[key], rtol=1e-6)
+    metaprof = make_vertprof(paths, func=['mean', 'min', 'max'])
+    dataprof = make_vertprof(
+        paths, func=['mean', 'min', 'max'], sidecar=False
+    )
+    assert metaprof['O3'].dims == dataprof['O3'].dims
+    assert np.allclose(metaprof['O3'], dataprof['O3'], rtol=1e-6)
+
+    # stale sidecars are ignored
+    assert os.path.exists(sidecarpath(paths[0]))
+    with open(paths[0], 'ab') as outf:
+        outf.write(b'\0')
+    assert readsidecar(paths[0]) is None
+
+    reportfromcfg([cfgpath])
+    for key in ['summary.csv', 'mean.nc', 'min.nc', 'max.nc']:
+        assert os.path.exists(join(tdir.name, 'report', key))
+
+
+def test_makereport(capsys):
+    import os
+    import tempfile
+    from os.path import join
+    import numpy as np
+    from .test_bcon import _makecase
+    from .. import runcfg
+    from ..report import makestats, make_vertprof, makereport, reportfromcfg
+
+    tdir = tempfile.TemporaryDirectory()
+    cfgpath = _makecase(tdir, ndays=3)
+    with open(cfgpath, 'a') as cfgf:
+        cfgf.write(f"""
+[common]
+workers=2
+
+[REPORT]
+standardfigs=N
+summary={tdir.name}/summary.csv
+vprofmean={tdir.name}/mean.nc
+vprofmin={tdir.name}/min.nc
+vprofmax={tdir.name}/max.nc
+""")
+    runcfg([cfgpath], workers=1)
+    paths = [
+        join(tdir.name, f'test.bcon.2022010{d}.nc') for d in [1, 2, 3]
+    ]
+    funcs = ['mean', 'min', 'max', 'median']
+    statdf, vprofs = makereport(
+        paths, funcs=funcs, workers=2, sidecar=False
+    )
+    chkdf = makestats(paths, sidecar=False)
+    assert statdf.index.equals(chkdf.index)
+    assert np.allclose(statdf['mean'], chkdf['mean'])
+    assert np.isclose(
+        statdf.attrs['stats']['O3'].mean, chkdf.attrs['stats']['O3'].mean
+    )
+    for funcstr in funcs:
+        chkprof = make_vertprof(paths, func=funcstr, sidecar=False)
+        assert vprofs[funcstr]['O3'].dims == ('TSTEP', 'LAY')
+        assert np.allclose(vprofs[funcstr]['O3'], chkprof['O3'])
+        assert (vprofs[funcstr].TSTEP == chkprof.TSTEP).all()
+
+    # only new or changed files are processed
+    cachedir = join(tdir.name, 'cache')
+    statdf, vprofs = makereport(paths, cachedir=cachedir)
+    assert len(os.listdir(cachedir)) == 3
+    pstat = os.stat(paths[1])
+    os.utime(paths[1], ns=(pstat.st_atime_ns, pstat.st_mtime_ns + 10**9))
+    capsys.readouterr()
+    chkdf, chkprofs = makereport(paths, cachedir=cachedir, verbose=1)
+    out = capsys.readouterr().out
+    assert 'Using 2 of 3 cached results' in out
+    assert paths[1] in out and paths[0] not in out
+    assert len(os.listdir(cachedir)) == 3
+    assert np.allclose(statdf['mean'], chkdf['mean'])
+    assert np.allclose(vprofs['max']['O3'], chkprofs['max']['O3'])
+
+    reportfromcfg([cfgpath])
+    os.remove(join(tdir.name, 'min.nc'))
+    reportfromcfg([cfgpath])
+    assert os.path.exists(join(tdir.name, 'min.nc'))
+    assert len(os.listdir(join(tdir.name, 'reportcache'))) == 3
+
+
+def test_scanvar():
+    import numpy as np
+    import xarray as xr
+    from ..report import _scanvar
+
+    rng = np.random.default_rng(1)
+    vals = rng.lognormal(size=(7, 4, 30)).astype('f')
+    vals[2, 1, 3] = np.nan
+    var = xr.DataArray(vals, dims=('TSTEP', 'LAY', 'PERIM'))
+    funcs = ['mean', 'min', 'max', 'median']
+    # 2 times per chunk for mean, min and max
+    vstats, vprof = _scanvar(var, funcs=funcs[:3], chunkbytes=2 * 4 * 30 * 4)
+    assert vstats.count == vals.size - 1
+    assert np.isclose(vstats.mean, np.nanmean(vals, dtype='d'))
+    chk = var.mean(('TSTEP', 'PERIM'))
+    assert np.allclose(vprof[0], chk, rtol=1e-6)
+    assert np.allclose(vprof[1], var.min(('TSTEP', 'PERIM')))
+    assert np.allclose(vprof[2], var.max(('TSTEP', 'PERIM')))
+    vstats, vprof = _scanvar(var, dostats=False, funcs=funcs)
+    assert vstats is None
+    assert np.allclose(vprof[3], var.median(('TSTEP', 'PERIM')))
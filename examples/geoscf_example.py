@@ -23,8 +23,10 @@ gdnam = '12US1'
 dates = ['2023-04-15T12:30', '2023-07-15T12:30']
 # Typical downloading takes ~4 minutes per hour of source data
 # For the tutorial, we only download 'o3' and 'so4' to make it fast.
+# perimeter=True requests only bands around the BCON perimeter. For many
+# consecutive hours, batch=6 requests 6 hours at a time.
 aqmbc.models.geoscf.download_window(
-    gdnam, dates,
+    gdnam, dates, perimeter=True,
     chmvars=['o3', 'so4'], xgcvars=[]  # for full run, comment out this line
 )
 
@@ -27,7 +27,7 @@ setuptools.setup(
         "Development Status :: 2 - Pre-Alpha",
         "Operating System :: OS Independent",
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.9',
     install_requires=["pyproj", "PseudoNetCDF", "netcdf4", "xarray", "pandas"],
     include_package_data=True,
     zip_safe=False,
@@ -0,0 +1,82 @@
+"""
+Benchmark exprlib.compileexpr against PseudoNetCDFFile.eval (the path used
+by bcon.translate) for an expression chain.
+
+By default, the chain is exprlib.gc14 (gcnc_airmolden, gc14_to_cb6r5,
+gc14_to_cb6mp, and gc14_to_ae7) and every input variable is random data
+shaped like one day of hourly 12US1 BCON (24 times, 35 layers, 1520 PERIM
+cells). Outputs are checked for equality.
+
+Example:
+
+    python util/bench_exprlib.py --repeat 5
+"""
+import argparse
+import ast
+import time
+from symtable import symtable
+import numpy as np
+import PseudoNetCDF as pnc
+from aqmbc import exprlib
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--ntimes', default=24, type=int)
+parser.add_argument('--nlay', default=35, type=int)
+parser.add_argument('--nperim', default=1520, type=int)
+parser.add_argument('--repeat', default=3, type=int)
+parser.add_argument(
+    '--chain', default='gc14',
+    choices=['gc12', 'gc12_soas', 'gc14', 'gc14_soas', 'raqms']
+)
+args = parser.parse_args()
+
+exprpaths = getattr(exprlib, args.chain)
+exprstr = '\n'.join([open(p, 'r').read().strip() for p in exprpaths])
+assigned = [
+    s.get_name() for s in symtable(exprstr, 'bench', 'exec').get_symbols()
+    if s.is_assigned()
+]
+inkeys = sorted(set([
+    n.id for n in ast.walk(ast.parse(exprstr))
+    if isinstance(n, ast.Name) and n.id not in assigned and n.id != 'np'
+]))
+
+shape = (args.ntimes, args.nlay, args.nperim)
+dims = ('TSTEP', 'LAY', 'PERIM')
+rng = np.random.default_rng(0)
+f = pnc.PseudoNetCDFFile()
+for dk, dl in zip(dims, shape):
+    f.createDimension(dk, dl)
+for key in inkeys:
+    f.createVariable(
+        key, 'f', dims, values=rng.random(shape, dtype='f'), units='mol/mol'
+    )
+
+t0 = time.time()
+func = exprlib.compileexpr(exprstr)
+t1 = time.time()
+tcompile = t1 - t0
+
+teval = []
+tcomp = []
+for i in range(args.repeat):
+    t0 = time.time()
+    evalf = f.eval(exprstr, inplace=False)
+    t1 = time.time()
+    compf = func(f)
+    t2 = time.time()
+    teval.append(t1 - t0)
+    tcomp.append(t2 - t1)
+
+for key, ev in evalf.variables.items():
+    np.testing.assert_array_equal(ev[...], compf.variables[key][...])
+
+nstmt = len(ast.parse(exprstr).body)
+nops = func.source.count('_binop(') + func.source.count('_unary(')
+ninplace = nops - func.source.count(', None)')
+print(f'chain: {args.chain}; {nstmt} statements; {len(inkeys)} inputs')
+print(f'outputs: {len(evalf.variables)}; shape {shape}')
+print(f'compiled: {nops} operations ({ninplace} in place)')
+print(f'compile: {tcompile:.3f}s')
+print(f'eval: {min(teval):.3f}s; compiled: {min(tcomp):.3f}s')
+print(f'speedup: {min(teval) / min(tcomp):.2f}x; outputs are identical')
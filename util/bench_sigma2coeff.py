@@ -0,0 +1,75 @@
+"""
+Benchmark sigma2coeff_batch against the per-column np.ndindex loop that the
+model readers (geoscf, raqms, waccm) used in interpSigma.
+
+By default, the column set is sized like a 12US1 ICON (299 x 459) with a
+GEOS-CF-like 72 layer source interpolated to the EPA 35 layer structure. The
+loop is timed on a random sample of columns and scaled to the full set. The
+memory of dense weights is compared to the banded weights from sigma2band.
+
+Example:
+
+    python util/bench_sigma2coeff.py --interptype conserve
+"""
+import argparse
+import time
+import numpy as np
+from PseudoNetCDF.coordutil import sigma2coeff
+from aqmbc.models.util import sigma2coeff_lin, sigma2coeff_batch, sigma2band
+from aqmbc.options import vglvls
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--nrows', default=299, type=int)
+parser.add_argument('--ncols', default=459, type=int)
+parser.add_argument('--nlev', default=72, type=int, help='source layers')
+parser.add_argument('--vgnam', default='EPA_35L', choices=sorted(vglvls))
+parser.add_argument(
+    '--interptype', default='linear', choices=['linear', 'conserve']
+)
+parser.add_argument(
+    '--loopsample', default=2000, type=int,
+    help='number of columns used to time the loop'
+)
+args = parser.parse_args()
+
+rng = np.random.default_rng(0)
+shape = (1, args.nlev, args.nrows, args.ncols)
+# surface-to-top edges with random layer thickness; extends beyond 1 and 0
+# like source models that do not share the CMAQ surface and top.
+delp = rng.uniform(0.5, 1.5, size=shape)
+edges = np.concatenate([np.zeros(shape[:1] + (1,) + shape[2:]), delp], axis=1)
+edges = np.cumsum(edges, axis=1)
+sigma = 1.02 - 1.04 * edges / edges[:, -1:]
+tgt = vglvls[args.vgnam]
+ncells = args.nrows * args.ncols
+
+t0 = time.time()
+coeff = sigma2coeff_batch(sigma, tgt, interptype=args.interptype)
+t1 = time.time()
+tbatch = t1 - t0
+
+colfunc = {'linear': sigma2coeff_lin, 'conserve': sigma2coeff}
+colfunc = colfunc[args.interptype]
+nsample = min(args.loopsample, ncells)
+sample = rng.choice(ncells, size=nsample, replace=False)
+ridx, cidx = np.unravel_index(sample, shape[2:])
+t0 = time.time()
+maxdiff = 0
+for ri, ci in zip(ridx, cidx):
+    loopcoeff = colfunc(sigma[0, :, ri, ci], tgt)
+    maxdiff = max(maxdiff, np.abs(loopcoeff - coeff[0, :, :, ri, ci]).max())
+t1 = time.time()
+tloop = (t1 - t0) / nsample * ncells
+
+print(f'columns: {ncells}; source layers {args.nlev}; {args.interptype}')
+print(f'batch: {tbatch:.2f}s')
+print(f'loop (est from {nsample} columns): {tloop:.2f}s')
+print(f'speedup: {tloop / tbatch:.1f}x; max abs diff: {maxdiff:.2e}')
+
+t0 = time.time()
+k0, wgt = sigma2band(sigma, tgt, interptype=args.interptype)
+t1 = time.time()
+densemb = coeff.nbytes / 1024**2
+bandmb = (k0.nbytes + wgt.nbytes) / 1024**2
+print(f'band: {t1 - t0:.2f}s; width {wgt.shape[1]}')
+print(f'memory: dense {densemb:.0f}MB; band {bandmb:.0f}MB')